@@ -26,6 +26,14 @@ def create_app(config_name='default'):
     # 初始化数据库
     init_database()
     
+    # 继续投递上次未完成的推送
+    from services.outbox import outbox_dispatcher
+    outbox_dispatcher.start()
+    
+    # 读回上次运行遗留的实时消息溢出记录
+    from services.ingest_service import ingest_pipeline
+    ingest_pipeline.start()
+    
     # 配置日志
     setup_logging()
     
@@ -0,0 +1,119 @@
+"""
+基准测试：WAL模式 + 单写线程 对比 默认回滚日志模式
+模拟多个采集线程并发写入消息，同时测量消息列表查询（/api/data/messages 所用的
+DataService.get_messages）的延迟分位数
+
+用法: python -m benchmarks.bench_database_wal [--writers 4] [--messages 2000] [--readers 2]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from database.db import Database
+from database.init_db import init_database
+from database.models import Group, Message
+from services.data_service import DataService
+
+def percentile(values, pct):
+    """计算分位数"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[index]
+
+def run(wal_mode, writers, messages_per_writer, readers):
+    """在指定模式下运行一轮测试"""
+    workdir = tempfile.mkdtemp(prefix='bench_wal_')
+    Config.DATABASE_PATH = os.path.join(workdir, 'bench.db')
+    Config.DATABASE_WAL_MODE = wal_mode
+    Database.shutdown()
+    
+    init_database()
+    Group.create(task_id=1, telegram_id=1, title='bench')
+    group_id = Group.get_by_telegram_id(1)['id']
+    
+    errors = []
+    latencies = []
+    done = threading.Event()
+    
+    def writer(index):
+        try:
+            base = index * messages_per_writer
+            for i in range(messages_per_writer):
+                Message.create(
+                    group_id=group_id,
+                    telegram_message_id=base + i,
+                    sender_id=index,
+                    sender_name=f'writer{index}',
+                    content=f'message {base + i}',
+                    message_date=f'2024-01-01T00:{(i // 60) % 60:02d}:{i % 60:02d}'
+                )
+        except Exception as e:
+            errors.append(e)
+        finally:
+            Database.close_connection()
+    
+    def reader():
+        try:
+            while not done.is_set():
+                start = time.perf_counter()
+                DataService.get_messages({}, page=1, page_size=50)
+                latencies.append(time.perf_counter() - start)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            Database.close_connection()
+    
+    writer_threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    reader_threads = [threading.Thread(target=reader) for _ in range(readers)]
+    
+    start = time.perf_counter()
+    for t in reader_threads + writer_threads:
+        t.start()
+    for t in writer_threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    for t in reader_threads:
+        t.join()
+    
+    total = Message.count()
+    Database.shutdown()
+    shutil.rmtree(workdir, ignore_errors=True)
+    
+    return {
+        'mode': 'WAL + 单写线程' if wal_mode else '默认模式',
+        'inserted': total,
+        'inserts_per_sec': total / elapsed if elapsed else 0,
+        'queries': len(latencies),
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'errors': len(errors),
+        'first_error': str(errors[0]) if errors else ''
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='数据库WAL模式基准测试')
+    parser.add_argument('--writers', type=int, default=4, help='并发采集线程数')
+    parser.add_argument('--messages', type=int, default=2000, help='每个线程写入的消息数')
+    parser.add_argument('--readers', type=int, default=2, help='并发查询线程数')
+    args = parser.parse_args()
+    
+    for wal_mode in (False, True):
+        result = run(wal_mode, args.writers, args.messages, args.readers)
+        print(f"[{result['mode']}] 写入 {result['inserted']} 条, "
+              f"{result['inserts_per_sec']:.0f} 条/秒 | "
+              f"查询 {result['queries']} 次, p50 {result['p50_ms']:.2f}ms, p99 {result['p99_ms']:.2f}ms | "
+              f"错误 {result['errors']} {result['first_error']}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+基准测试：从多页机器人回复中提取群组链接
+对比 旧实现（三个正则各扫描一遍 + 列表去重）与 单次扫描的合并正则 + 集合去重
+
+用法: python -m benchmarks.bench_link_extraction [--pages 50] [--links-per-page 60] [--repeat 5]
+"""
+
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.link_extractor import extract_links
+
+def legacy_extract(messages):
+    """旧实现（原 TelegramService.extract_group_links）"""
+    links = []
+    patterns = [
+        r'https?://t\.me/([a-zA-Z0-9_]+)',
+        r'@([a-zA-Z0-9_]+)',
+        r't\.me/joinchat/([a-zA-Z0-9_-]+)'
+    ]
+    
+    for msg in messages:
+        text = msg.get('text', '')
+        for pattern in patterns:
+            matches = re.findall(pattern, text)
+            for match in matches:
+                if match not in links:
+                    links.append(match)
+    
+    return links
+
+def random_name(rng):
+    return ''.join(rng.choice(string.ascii_letters + '_') for _ in range(rng.randint(6, 20)))
+
+def build_pages(pages, links_per_page, seed=42):
+    """生成多页搜索结果：每行一个群组（标题 + 链接 + 成员数），各页之间有约三成重复"""
+    rng = random.Random(seed)
+    pool = [random_name(rng) for _ in range(pages * links_per_page * 7 // 10)]
+    messages = []
+    for page in range(pages):
+        lines = [f'🔍 搜索结果 第{page + 1}页']
+        for i in range(links_per_page):
+            name = rng.choice(pool)
+            style = i % 4
+            if style == 0:
+                link = f'https://t.me/{name}'
+            elif style == 1:
+                link = f'@{name}'
+            elif style == 2:
+                link = f't.me/joinchat/{name}'
+            else:
+                link = f'https://t.me/{name}/{rng.randint(1, 99999)}'
+            lines.append(f'{i + 1}. {name.title()} 交流群 👥 {rng.randint(100, 99999)} {link}')
+        messages.append({'text': '\n'.join(lines)})
+    return messages
+
+def measure(func, messages, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(messages)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description='链接提取基准测试')
+    parser.add_argument('--pages', type=int, default=50, help='回复页数')
+    parser.add_argument('--links-per-page', type=int, default=60, help='每页链接数')
+    parser.add_argument('--repeat', type=int, default=5, help='重复次数（取最快一次）')
+    args = parser.parse_args()
+    
+    for pages in sorted({1, 10, args.pages}):
+        messages = build_pages(pages, args.links_per_page)
+        size_kb = sum(len(m['text'].encode()) for m in messages) / 1024
+        
+        legacy_time, legacy_links = measure(legacy_extract, messages, args.repeat)
+        new_time, new_links = measure(extract_links, messages, args.repeat)
+        
+        print(f"{pages:>3} 页 ({size_kb:7.1f} KB): "
+              f"旧实现 {legacy_time * 1000:8.2f} ms ({len(legacy_links)} 个) | "
+              f"新实现 {new_time * 1000:6.2f} ms ({len(new_links)} 个) | "
+              f"{legacy_time / new_time:5.1f}x")
+
+if __name__ == '__main__':
+    main()
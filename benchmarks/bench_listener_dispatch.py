@@ -0,0 +1,75 @@
+"""
+基准测试：实时监听的更新分发开销与监听群组数的关系
+对比 每个群组注册一个 NewMessage(chats=...) 处理器（每条更新都要逐个检查所有处理器的过滤条件）
+与 每个客户端一个分发处理器（按会话ID查字典）
+
+用法: python -m benchmarks.bench_listener_dispatch [--updates 20000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telethon.tl.types import PeerChannel
+from services.telegram_service import TelegramService
+
+class FakeMessage:
+    """只包含分发所需字段的消息"""
+    
+    def __init__(self, channel_id):
+        self.peer_id = PeerChannel(channel_id)
+
+class FakeEvent:
+    def __init__(self, channel_id):
+        self.message = FakeMessage(channel_id)
+
+def bench_per_group_handlers(group_ids, events):
+    """旧方式：每个群组一个处理器，每条更新依次检查所有处理器的 chats 过滤条件"""
+    handlers = [({group_id}, None) for group_id in group_ids]
+    start = time.perf_counter()
+    matched = 0
+    for event in events:
+        chat_id = event.message.peer_id.channel_id
+        for chats, _ in handlers:
+            if chat_id in chats:
+                matched += 1
+    return time.perf_counter() - start, matched
+
+def bench_dispatcher(group_ids, events):
+    """新方式：单个分发处理器按会话ID查字典"""
+    service = TelegramService()
+    service.listeners[1] = {group_id: object() for group_id in group_ids}
+    start = time.perf_counter()
+    matched = 0
+    for event in events:
+        if service._route_update(1, event) is not None:
+            matched += 1
+    return time.perf_counter() - start, matched
+
+def main():
+    parser = argparse.ArgumentParser(description='实时监听分发基准测试')
+    parser.add_argument('--updates', type=int, default=20000, help='模拟的更新条数')
+    args = parser.parse_args()
+    
+    for group_count in (10, 100, 1000, 5000):
+        group_ids = list(range(1000000, 1000000 + group_count))
+        # 一半更新来自监听的群组，一半来自其他会话
+        events = [
+            FakeEvent(random.choice(group_ids) if i % 2 else 9000000 + i)
+            for i in range(args.updates)
+        ]
+        
+        legacy_time, legacy_matched = bench_per_group_handlers(group_ids, events)
+        dispatch_time, dispatch_matched = bench_dispatcher(group_ids, events)
+        assert legacy_matched == dispatch_matched
+        
+        print(f"群组数 {group_count:>5}: "
+              f"每群组处理器 {legacy_time / args.updates * 1e6:8.2f} µs/条 | "
+              f"单分发处理器 {dispatch_time / args.updates * 1e6:6.2f} µs/条")
+
+if __name__ == '__main__':
+    main()
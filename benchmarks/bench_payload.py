@@ -0,0 +1,119 @@
+"""
+基准测试：推送数据转换和请求体编码
+对比 旧实现（每条消息合并默认映射、遍历字段并用 hasattr 探测日期类型，再由 requests 编码JSON）
+与 按任务预先整理的转换函数 + 紧凑JSON / gzip / msgpack 编码
+
+用法: python -m benchmarks.bench_payload [--messages 20000] [--batch 100] [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.payload import compile_payload, msgpack
+
+PARAM_MAPPING = {'content': 'text', 'sender_name': 'user', 'message_date': 'timestamp', 'group_id': 'chat_id'}
+
+def legacy_build_request_data(message, param_mapping):
+    """旧实现（原 APIService._build_request_data）"""
+    data = {}
+    
+    default_mapping = {
+        'content': 'content',
+        'sender_id': 'sender_id',
+        'sender_name': 'sender_name',
+        'message_date': 'message_date',
+        'media_type': 'media_type'
+    }
+    
+    mapping = {**default_mapping, **param_mapping}
+    
+    for source_key, target_key in mapping.items():
+        if source_key in message:
+            value = message[source_key]
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            data[target_key] = value
+    
+    return data
+
+def build_messages(count):
+    """实时监听的消息：一半日期为datetime（直接推送），一半为字符串（从发件箱读出）"""
+    return [
+        {
+            'message_id': i,
+            'group_id': -1001234567890,
+            'content': f'第{i}条消息 新人进群请看置顶 https://t.me/example_{i % 97}',
+            'sender_id': 5000000000 + i % 300,
+            'sender_name': f'user_{i % 300}',
+            'message_date': datetime(2024, 1, 1, 12, i % 60) if i % 2 else '2024-01-01T12:00:00',
+            'media_type': None if i % 5 else 'photo'
+        }
+        for i in range(count)
+    ]
+
+def measure(func, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description='推送数据转换和编码基准测试')
+    parser.add_argument('--messages', type=int, default=20000, help='消息数')
+    parser.add_argument('--batch', type=int, default=100, help='批量推送时每批条数')
+    parser.add_argument('--repeat', type=int, default=5, help='重复次数（取最快一次）')
+    args = parser.parse_args()
+    
+    messages = build_messages(args.messages)
+    api_config = {'url': 'http://localhost/', 'param_mapping': PARAM_MAPPING}
+    codec = compile_payload(api_config)
+    
+    # 转换
+    legacy_time, legacy_records = measure(
+        lambda: [legacy_build_request_data(m, PARAM_MAPPING) for m in messages], args.repeat
+    )
+    compiled_time, records = measure(lambda: [codec.transform(m) for m in messages], args.repeat)
+    assert records == legacy_records
+    print(f"转换 {args.messages} 条: 旧实现 {legacy_time / args.messages * 1e6:5.2f} us/条 | "
+          f"新实现 {compiled_time / args.messages * 1e6:5.2f} us/条 | {legacy_time / compiled_time:4.1f}x")
+    
+    # 单条请求体：旧实现为 requests 的 json= 参数（json.dumps 默认分隔符，非ASCII转义）
+    legacy_time, legacy_bodies = measure(
+        lambda: [json.dumps(legacy_build_request_data(m, PARAM_MAPPING)).encode('utf-8') for m in messages],
+        args.repeat
+    )
+    new_time, bodies = measure(lambda: [codec.encode(codec.transform(m))[0] for m in messages], args.repeat)
+    print(f"转换+编码单条: 旧实现 {legacy_time / args.messages * 1e6:5.2f} us/条 "
+          f"{sum(map(len, legacy_bodies)) / args.messages:6.1f} 字节/条 | "
+          f"新实现 {new_time / args.messages * 1e6:5.2f} us/条 "
+          f"{sum(map(len, bodies)) / args.messages:6.1f} 字节/条 | {legacy_time / new_time:4.1f}x")
+    
+    # 批量请求体的各种编码
+    batches = [records[i:i + args.batch] for i in range(0, len(records), args.batch)]
+    variants = [('json', None), ('json', 'gzip')]
+    if msgpack is not None:
+        variants += [('msgpack', None), ('msgpack', 'gzip')]
+    else:
+        print('未安装 msgpack，跳过 msgpack 编码')
+    
+    print(f"批量编码（每批 {args.batch} 条）:")
+    for encoding, compression in variants:
+        batch_codec = compile_payload({**api_config, 'encoding': encoding, 'compression': compression})
+        elapsed, encoded = measure(
+            lambda: [batch_codec.encode_batch(batch, 'array')[0] for batch in batches], args.repeat
+        )
+        name = encoding + (f'+{compression}' if compression else '')
+        print(f"  {name:<13}: {elapsed / args.messages * 1e6:5.2f} us/条 | "
+              f"{sum(map(len, encoded)) / args.messages:6.1f} 字节/条")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+基准测试：API推送吞吐量
+在本地启动一个模拟 webhook 服务（可设置响应延迟），对比
+旧实现（逐条调用模块级 requests.post，每条消息新建连接、同步等待）与
+PushClient.deliver（共享连接池 + 每个推送地址限定并发的非阻塞推送）以及 PushClient 批量推送（--batch-size 条一个请求）
+
+用法: python -m benchmarks.bench_push_client [--messages 500] [--latency-ms 20] [--per-endpoint 8]
+                                            [--batch-size 100] [--batch-format array|ndjson]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from database.db import Database
+from database.init_db import init_database
+from database.models import APILog
+from benchmarks.bench_payload import legacy_build_request_data
+from services.push_client import PushClient
+
+class StubWebhook(BaseHTTPRequestHandler):
+    """模拟webhook：读取请求体，延迟 latency 秒后返回200；支持keep-alive"""
+    protocol_version = 'HTTP/1.1'
+    # 响应头和响应体分两次写出，keep-alive连接上需关闭Nagle算法，否则每个请求多出约40ms的延迟确认
+    disable_nagle_algorithm = True
+    latency = 0.0
+    requests = 0
+    messages = 0
+    connections = 0
+    lock = threading.Lock()
+    
+    def setup(self):
+        super().setup()
+        with StubWebhook.lock:
+            StubWebhook.connections += 1
+    
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.headers.get('Content-Type', '').startswith('application/x-ndjson'):
+            count = body.count(b'\n')
+        else:
+            payload = json.loads(body)
+            count = len(payload) if isinstance(payload, list) else 1
+        with StubWebhook.lock:
+            StubWebhook.requests += 1
+            StubWebhook.messages += count
+        if self.latency:
+            time.sleep(self.latency)
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+def build_messages(count):
+    return [
+        {
+            'content': f'benchmark message {i} ' + 'x' * 200,
+            'sender_id': 1000 + i % 50,
+            'sender_name': f'user{i % 50}',
+            'message_date': '2024-01-01T00:00:00',
+            'media_type': None
+        }
+        for i in range(count)
+    ]
+
+def legacy_push(messages, api_config):
+    """旧实现：每条消息调用模块级 requests.post 并同步写日志"""
+    for i, message in enumerate(messages):
+        data = legacy_build_request_data(message, {})
+        response = requests.post(api_config['url'], json=data, timeout=Config.API_TIMEOUT)
+        APILog.create(
+            task_id=1, message_id=i, url=api_config['url'], method='POST', request_data=data,
+            status_code=response.status_code, response=response.text, success=response.status_code < 400
+        )
+
+def pooled_push(messages, api_config, per_endpoint):
+    """PushClient.deliver（发件箱的投递方式）：全部提交到推送loop后等待完成（api_config 带 batch_size 时为批量推送）"""
+    client = PushClient(per_endpoint=per_endpoint)
+    loop = client.loop()
+    submitted = time.perf_counter()
+    futures = [
+        asyncio.run_coroutine_threadsafe(client.deliver(message, api_config, 1, i), loop)
+        for i, message in enumerate(messages)
+    ]
+    handoff = time.perf_counter() - submitted
+    failed = sum(1 for future in futures if not future.result()[0])
+    return handoff, failed
+
+def measure(label, func, messages):
+    StubWebhook.requests = StubWebhook.messages = StubWebhook.connections = 0
+    start = time.perf_counter()
+    extra = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label}: {elapsed:6.2f} s | {len(messages) / elapsed:8.1f} 条/秒 | "
+          f"{StubWebhook.messages} 条 / {StubWebhook.requests} 个请求 / {StubWebhook.connections} 个TCP连接", end='')
+    if extra:
+        handoff, failed = extra
+        print(f" | 提交耗时 {handoff * 1000:.1f} ms | 失败 {failed}", end='')
+    print()
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='API推送吞吐量基准测试')
+    parser.add_argument('--messages', type=int, default=500, help='推送消息数')
+    parser.add_argument('--latency-ms', type=float, default=20, help='模拟webhook的响应延迟（毫秒）')
+    parser.add_argument('--per-endpoint', type=int, default=Config.API_CONCURRENCY_PER_ENDPOINT,
+                        help='每个推送地址的并发数')
+    parser.add_argument('--batch-size', type=int, default=100, help='批量推送每个请求的消息数')
+    parser.add_argument('--batch-format', choices=['array', 'ndjson'], default='array', help='批量推送的请求体格式')
+    args = parser.parse_args()
+    
+    Config.DATABASE_PATH = os.path.join(tempfile.mkdtemp(prefix='bench_push_'), 'bench.db')
+    Database.shutdown()
+    init_database()
+    
+    StubWebhook.latency = args.latency_ms / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubWebhook)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_config = {'url': f'http://127.0.0.1:{server.server_address[1]}/webhook', 'method': 'POST'}
+    
+    messages = build_messages(args.messages)
+    print(f"{args.messages} 条消息，webhook延迟 {args.latency_ms} ms，每个地址并发 {args.per_endpoint}")
+    batch_config = {**api_config, 'batch_size': args.batch_size, 'batch_format': args.batch_format}
+    legacy = measure('旧实现      ', lambda: legacy_push(messages, api_config), messages)
+    pooled = measure('PushClient  ', lambda: pooled_push(messages, api_config, args.per_endpoint), messages)
+    batched = measure(f'批量({args.batch_size:>4}条)',
+                      lambda: pooled_push(messages, batch_config, args.per_endpoint), messages)
+    print(f"加速比: PushClient {legacy / pooled:.1f}x | 批量 {legacy / batched:.1f}x")
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
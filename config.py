@@ -14,6 +14,12 @@ class Config:
     
     # 数据库配置
     DATABASE_PATH = os.getenv('DATABASE_PATH', 'data/telegram_collector.db')
+    # WAL模式：开启后所有写操作由单独的写线程串行提交，读操作使用各线程独立连接
+    DATABASE_WAL_MODE = os.getenv('DATABASE_WAL_MODE', 'false').lower() == 'true'
+    DATABASE_CACHE_SIZE_KB = int(os.getenv('DATABASE_CACHE_SIZE_KB', 65536))
+    DATABASE_MMAP_SIZE = int(os.getenv('DATABASE_MMAP_SIZE', 268435456))
+    DATABASE_BUSY_TIMEOUT_MS = int(os.getenv('DATABASE_BUSY_TIMEOUT_MS', 5000))
+    DATABASE_WRITE_QUEUE_SIZE = int(os.getenv('DATABASE_WRITE_QUEUE_SIZE', 10000))
     
     # Telegram配置
     TELEGRAM_API_ID = os.getenv('TELEGRAM_API_ID')
@@ -34,14 +40,83 @@ class Config:
     # 分页配置
     PAGE_SIZE = 50
     
+    # 导出配置（每次从数据库读取的行数）
+    EXPORT_CHUNK_SIZE = 1000
+    
     # API推送配置
     API_TIMEOUT = 30
     API_MAX_RETRIES = 3
     API_RETRY_DELAY = [1, 3, 5]
+    # 推送并发：每个推送地址同时进行的请求数，以及全部地址合计（也是连接池大小）
+    API_CONCURRENCY_PER_ENDPOINT = int(os.getenv('API_CONCURRENCY_PER_ENDPOINT', 8))
+    API_CONCURRENCY_TOTAL = int(os.getenv('API_CONCURRENCY_TOTAL', 32))
+    # 批量推送（api_config.batch_size > 1）未指定 linger_ms 时，凑批最多等待的毫秒数
+    API_BATCH_LINGER_MS = int(os.getenv('API_BATCH_LINGER_MS', 200))
+    # 推送配置 compression=gzip 时，请求体达到多少字节才压缩（小请求体压缩后反而更大），以及压缩级别
+    API_GZIP_MIN_BYTES = int(os.getenv('API_GZIP_MIN_BYTES', 512))
+    API_GZIP_LEVEL = 6
+    # 推送地址熔断：最近 WINDOW 秒内请求数不少于 MIN_REQUESTS 且异常（5xx/429/超时/超过 SLOW_CALL 秒）比例
+    # 达到 ERROR_RATE 时暂停该地址 OPEN_SECONDS 秒，期间消息留在发件箱，之后先放行少量试探请求
+    CIRCUIT_WINDOW = int(os.getenv('CIRCUIT_WINDOW', 30))
+    CIRCUIT_MIN_REQUESTS = int(os.getenv('CIRCUIT_MIN_REQUESTS', 10))
+    CIRCUIT_ERROR_RATE = float(os.getenv('CIRCUIT_ERROR_RATE', 0.5))
+    CIRCUIT_SLOW_CALL = float(os.getenv('CIRCUIT_SLOW_CALL', 10))
+    CIRCUIT_OPEN_SECONDS = int(os.getenv('CIRCUIT_OPEN_SECONDS', 30))
+    CIRCUIT_HALF_OPEN_PROBES = 1
+    CIRCUIT_HALF_OPEN_TIMEOUT = 60  # 试探请求超过该秒数仍没有结果时重新熔断（不再一直等待）
+    # 每个推送地址的并发上限随响应情况在 MIN 和 API_CONCURRENCY_PER_ENDPOINT 之间自动调整
+    API_CONCURRENCY_MIN = 1
+    # 推送发件箱：失败重试间隔从 BASE 秒起指数增长（上限 MAX 秒，带随机抖动），入箱超过 MAX_AGE 秒仍失败的移入死信表
+    OUTBOX_BACKOFF_BASE = float(os.getenv('OUTBOX_BACKOFF_BASE', 2))
+    OUTBOX_BACKOFF_MAX = float(os.getenv('OUTBOX_BACKOFF_MAX', 600))
+    OUTBOX_MAX_AGE = int(os.getenv('OUTBOX_MAX_AGE', 86400))
+    OUTBOX_MAX_IN_FLIGHT = 1000  # 同时投递中的最大条数
+    OUTBOX_LEASE = 120  # 领取后多少秒内未记录结果（如进程中断）则重新投递
+    OUTBOX_POLL_INTERVAL = 1.0  # 检查到期重试记录的间隔（秒）
     
     # 任务配置
     MAX_PAGINATION_PAGES = 10
+    # 机器人回复等待：总超时（秒）和静默期（秒，收到回复后这段时间内无新消息/编辑即视为回复完成）
+    BOT_REPLY_TIMEOUT = float(os.getenv('BOT_REPLY_TIMEOUT', 15))
+    BOT_REPLY_QUIET_PERIOD = float(os.getenv('BOT_REPLY_QUIET_PERIOD', 0.8))
+    # 翻页时单页等待机器人编辑/回复的超时（秒）
+    BOT_PAGE_TIMEOUT = float(os.getenv('BOT_PAGE_TIMEOUT', 8))
     MESSAGE_FETCH_LIMIT = 1000
+    # Telegram调用限速：每个账号每类方法的 (每秒请求数, 突发数)，遇到FloodWait时自动降速
+    TELEGRAM_RATE_LIMITS = {
+        'resolve': (0.5, 3),   # 解析用户名/链接（get_entity）
+        'join': (1 / 30, 1),   # 加入群组
+        'history': (3, 5),     # 拉取消息（每页100条）
+        'send': (0.5, 2),      # 给机器人发消息
+        'click': (0.5, 2)      # 点击机器人按钮
+    }
+    TELEGRAM_RATE_PROBE_AFTER = 20  # 降速后连续成功多少次再试探提速
+    TELEGRAM_FLOOD_WAIT_MAX = int(os.getenv('TELEGRAM_FLOOD_WAIT_MAX', 300))  # 超过该秒数的FloodWait不再等待，直接报错
+    TELEGRAM_FLOOD_RETRIES = 3
+    # 实体解析缓存有效期（秒）：解析成功的用户名/链接，以及不存在的链接（负缓存）
+    ENTITY_CACHE_TTL = int(os.getenv('ENTITY_CACHE_TTL', 7 * 86400))
+    ENTITY_CACHE_NEGATIVE_TTL = int(os.getenv('ENTITY_CACHE_NEGATIVE_TTL', 86400))
+    # 已入库群组的信息超过该秒数才重新从Telegram获取（机器人搜索模式）
+    GROUP_REFRESH_AGE = int(os.getenv('GROUP_REFRESH_AGE', 7 * 86400))
+    # 多账号执行：健康度最低时领取下一项工作前的退避秒数，连续失败多少次后本次任务停用该账号
+    ACCOUNT_POOL_BACKOFF = 10
+    ACCOUNT_POOL_MAX_FAILURES = 3
+    # 多机器人搜索：同一账号向同一机器人两次发送的最小间隔（秒），机器人连续失败多少次后跳过剩余关键词
+    BOT_MIN_INTERVAL = float(os.getenv('BOT_MIN_INTERVAL', 2))
+    BOT_POOL_MAX_FAILURES = 3
+    # 直接采集的并发群组数：每个账号的上限和所有任务合计的上限
+    COLLECT_CONCURRENCY_PER_ACCOUNT = int(os.getenv('COLLECT_CONCURRENCY_PER_ACCOUNT', 4))
+    COLLECT_CONCURRENCY_TOTAL = int(os.getenv('COLLECT_CONCURRENCY_TOTAL', 16))
+    
+    # 批量入库配置（达到条数或等待时间任一阈值即写入）
+    INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', 500))
+    INGEST_FLUSH_INTERVAL = float(os.getenv('INGEST_FLUSH_INTERVAL', 1.0))
+    
+    # 实时消息入库队列配置
+    INGEST_QUEUE_SIZE = int(os.getenv('INGEST_QUEUE_SIZE', 10000))
+    INGEST_BACKPRESSURE = os.getenv('INGEST_BACKPRESSURE', 'block')  # block, drop_oldest 或 spill
+    INGEST_SPILL_PATH = os.getenv('INGEST_SPILL_PATH', 'data/ingest_spill.ndjson')
+    INGEST_RETRY_DELAY = [0.5, 2, 5]  # 实时消息入库失败后的重试间隔（秒），仍失败时写入溢出文件稍后重新入库
     
     @staticmethod
     def init_app():
@@ -1,22 +1,143 @@
+import atexit
+import queue
 import sqlite3
 import threading
+from concurrent.futures import Future
 from contextlib import contextmanager
 from config import Config
 
+class _DatabaseWriter:
+    """单写线程：WAL模式下所有写操作经队列串行执行，并合并提交"""
+    
+    # 每次提交最多合并的写操作数
+    MAX_BATCH = 256
+    
+    def __init__(self, db_path, maxsize=0):
+        self.db_path = db_path
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._ready = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error:
+            raise self._error
+    
+    def submit(self, func):
+        """提交写操作 func(conn)，阻塞等待其所在事务提交后返回结果"""
+        if threading.current_thread() is self._thread:
+            # 写线程内部的嵌套调用直接执行，避免自己等待自己
+            return func(self._conn)
+        
+        future = Future()
+        self._queue.put((func, future))
+        return future.result()
+    
+    def stop(self):
+        """停止写线程（处理完已排队的写操作后退出）"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+    
+    def _run(self):
+        try:
+            self._conn = Database._connect(self.db_path, isolation_level=None)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+        except Exception as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+        
+        running = True
+        while running:
+            jobs = [self._queue.get()]
+            # 一次取出队列中已积压的写操作，合并到同一个事务中提交
+            while len(jobs) < self.MAX_BATCH:
+                try:
+                    jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            if None in jobs:
+                running = False
+                jobs = [job for job in jobs if job is not None]
+            if jobs:
+                self._commit_batch(jobs)
+        
+        self._conn.close()
+    
+    def _commit_batch(self, jobs):
+        """在一个事务中执行一批写操作，每个操作用保存点隔离失败"""
+        conn = self._conn
+        results = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for func, future in jobs:
+                conn.execute('SAVEPOINT job')
+                try:
+                    result = func(conn)
+                    conn.execute('RELEASE job')
+                    results.append((future, result, None))
+                except Exception as e:
+                    conn.execute('ROLLBACK TO job')
+                    conn.execute('RELEASE job')
+                    results.append((future, None, e))
+            conn.execute('COMMIT')
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            for func, future in jobs:
+                future.set_exception(e)
+            return
+        
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
 class Database:
     """数据库连接管理类"""
     
     _local = threading.local()
+    _writer = None
+    _writer_lock = threading.Lock()
+    
+    @staticmethod
+    def _connect(db_path, **kwargs):
+        """创建连接并应用性能相关的PRAGMA"""
+        conn = sqlite3.connect(db_path, check_same_thread=False, **kwargs)
+        conn.row_factory = sqlite3.Row
+        if Config.DATABASE_WAL_MODE:
+            conn.execute(f'PRAGMA busy_timeout={int(Config.DATABASE_BUSY_TIMEOUT_MS)}')
+            # 负数表示以KB为单位
+            conn.execute(f'PRAGMA cache_size=-{int(Config.DATABASE_CACHE_SIZE_KB)}')
+            conn.execute(f'PRAGMA mmap_size={int(Config.DATABASE_MMAP_SIZE)}')
+            conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+    
+    @classmethod
+    def _get_writer(cls):
+        """获取写线程（懒加载）"""
+        if cls._writer is None:
+            with cls._writer_lock:
+                if cls._writer is None:
+                    cls._writer = _DatabaseWriter(
+                        Config.DATABASE_PATH,
+                        maxsize=Config.DATABASE_WRITE_QUEUE_SIZE
+                    )
+        return cls._writer
     
     @classmethod
     def get_connection(cls):
         """获取数据库连接（线程安全）"""
         if not hasattr(cls._local, 'connection'):
-            cls._local.connection = sqlite3.connect(
-                Config.DATABASE_PATH,
-                check_same_thread=False
-            )
-            cls._local.connection.row_factory = sqlite3.Row
+            if Config.DATABASE_WAL_MODE:
+                # 先启动写线程，确保数据库已切换到WAL再打开读连接
+                cls._get_writer()
+            cls._local.connection = cls._connect(Config.DATABASE_PATH)
         return cls._local.connection
     
     @classmethod
@@ -41,9 +162,40 @@ class Database:
             cls._local.connection.close()
             delattr(cls._local, 'connection')
     
+    @classmethod
+    def shutdown(cls):
+        """关闭当前线程的连接并停止写线程"""
+        cls.close_connection()
+        with cls._writer_lock:
+            if cls._writer is not None:
+                cls._writer.stop()
+                cls._writer = None
+    
+    @classmethod
+    def transaction(cls, func):
+        """在单个写事务中执行 func(conn) 并返回其结果"""
+        if Config.DATABASE_WAL_MODE:
+            return cls._get_writer().submit(func)
+        
+        conn = cls.get_connection()
+        try:
+            result = func(conn)
+            conn.commit()
+            return result
+        except Exception as e:
+            conn.rollback()
+            raise e
+    
     @classmethod
     def execute(cls, query, params=None):
         """执行SQL语句"""
+        if Config.DATABASE_WAL_MODE:
+            def write(conn):
+                cursor = conn.execute(query, params or ())
+                # 写连接由所有线程共享，INSERT OR IGNORE 被忽略时 lastrowid 可能属于其他写操作
+                return cursor.lastrowid if cursor.rowcount != 0 else None
+            return cls._get_writer().submit(write)
+        
         with cls.get_cursor() as cursor:
             if params:
                 cursor.execute(query, params)
@@ -72,3 +224,5 @@ class Database:
                 cursor.execute(query)
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
+
+atexit.register(Database.shutdown)
@@ -1,5 +1,175 @@
 from database.db import Database
 
+# 消息全文索引：外部内容表 + trigram 分词（支持中文等无空格文本的子串检索），由触发器同步
+FTS_SCHEMA = [
+    '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+            content,
+            sender_name,
+            content='messages',
+            content_rowid='id',
+            tokenize='trigram'
+        )
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+            INSERT INTO messages_fts(rowid, content, sender_name)
+            VALUES (new.id, new.content, new.sender_name);
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+            INSERT INTO messages_fts(messages_fts, rowid, content, sender_name)
+            VALUES ('delete', old.id, old.content, old.sender_name);
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF content, sender_name ON messages BEGIN
+            INSERT INTO messages_fts(messages_fts, rowid, content, sender_name)
+            VALUES ('delete', old.id, old.content, old.sender_name);
+            INSERT INTO messages_fts(rowid, content, sender_name)
+            VALUES (new.id, new.content, new.sender_name);
+        END
+    '''
+]
+
+def init_fts():
+    """
+    创建消息全文索引及同步触发器，SQLite不支持FTS5 trigram时返回False
+    索引表为新建时根据已有消息重建（否则升级前的消息搜不到，删除/修改触发器也会操作不存在的索引行）
+    """
+    try:
+        existing = Database.fetchone(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+        )
+        for query in FTS_SCHEMA:
+            Database.execute(query)
+        if existing is None:
+            Database.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+        return True
+    except Exception as e:
+        print(f"[WARN] 全文索引不可用（需要SQLite 3.34+ 并启用FTS5），消息搜索将使用LIKE: {str(e)}")
+        return False
+
+# 统计汇总表：写入消息时由触发器增量维护，统计接口只需读取 O(天数 + 群组数) 行
+STATS_TABLES = ['stats_daily', 'stats_group_totals', 'stats_media_types']
+
+STATS_SCHEMA = [
+    '''
+        CREATE TABLE IF NOT EXISTS stats_daily (
+            date DATE NOT NULL,
+            group_id INTEGER NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (date, group_id)
+        )
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS stats_group_totals (
+            group_id INTEGER PRIMARY KEY,
+            count INTEGER NOT NULL DEFAULT 0
+        )
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS stats_media_types (
+            media_type VARCHAR(50) PRIMARY KEY,
+            count INTEGER NOT NULL DEFAULT 0
+        )
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS messages_stats_ai AFTER INSERT ON messages BEGIN
+            INSERT INTO stats_group_totals (group_id, count) VALUES (new.group_id, 1)
+            ON CONFLICT(group_id) DO UPDATE SET count = count + 1;
+            INSERT INTO stats_media_types (media_type, count) VALUES (COALESCE(new.media_type, 'other'), 1)
+            ON CONFLICT(media_type) DO UPDATE SET count = count + 1;
+            INSERT INTO stats_daily (date, group_id, count)
+            SELECT DATE(new.message_date), new.group_id, 1 WHERE DATE(new.message_date) IS NOT NULL
+            ON CONFLICT(date, group_id) DO UPDATE SET count = count + 1;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS messages_stats_ad AFTER DELETE ON messages BEGIN
+            UPDATE stats_group_totals SET count = count - 1 WHERE group_id = old.group_id;
+            UPDATE stats_media_types SET count = count - 1 WHERE media_type = COALESCE(old.media_type, 'other');
+            UPDATE stats_daily SET count = count - 1
+            WHERE date = DATE(old.message_date) AND group_id = old.group_id;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS messages_stats_au AFTER UPDATE OF group_id, media_type, message_date ON messages BEGIN
+            UPDATE stats_group_totals SET count = count - 1 WHERE group_id = old.group_id;
+            UPDATE stats_media_types SET count = count - 1 WHERE media_type = COALESCE(old.media_type, 'other');
+            UPDATE stats_daily SET count = count - 1
+            WHERE date = DATE(old.message_date) AND group_id = old.group_id;
+            INSERT INTO stats_group_totals (group_id, count) VALUES (new.group_id, 1)
+            ON CONFLICT(group_id) DO UPDATE SET count = count + 1;
+            INSERT INTO stats_media_types (media_type, count) VALUES (COALESCE(new.media_type, 'other'), 1)
+            ON CONFLICT(media_type) DO UPDATE SET count = count + 1;
+            INSERT INTO stats_daily (date, group_id, count)
+            SELECT DATE(new.message_date), new.group_id, 1 WHERE DATE(new.message_date) IS NOT NULL
+            ON CONFLICT(date, group_id) DO UPDATE SET count = count + 1;
+        END
+    '''
+]
+
+def rebuild_stats():
+    """根据 messages 表全量重建统计汇总表（单事务，期间的新写入不会丢失）"""
+    def rebuild(conn):
+        for table in STATS_TABLES:
+            conn.execute(f'DELETE FROM {table}')
+        conn.execute('''
+            INSERT INTO stats_group_totals (group_id, count)
+            SELECT group_id, COUNT(*) FROM messages GROUP BY group_id
+        ''')
+        conn.execute('''
+            INSERT INTO stats_media_types (media_type, count)
+            SELECT COALESCE(media_type, 'other'), COUNT(*) FROM messages GROUP BY COALESCE(media_type, 'other')
+        ''')
+        conn.execute('''
+            INSERT INTO stats_daily (date, group_id, count)
+            SELECT DATE(message_date), group_id, COUNT(*) FROM messages
+            WHERE DATE(message_date) IS NOT NULL
+            GROUP BY DATE(message_date), group_id
+        ''')
+    
+    Database.transaction(rebuild)
+
+def init_stats():
+    """创建统计汇总表和触发器，汇总表为新建时根据已有消息回填"""
+    placeholders = ', '.join('?' * len(STATS_TABLES))
+    existing = Database.fetchall(
+        f"SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ({placeholders})",
+        tuple(STATS_TABLES)
+    )
+    
+    for query in STATS_SCHEMA:
+        Database.execute(query)
+    
+    if len(existing) < len(STATS_TABLES):
+        rebuild_stats()
+
+def init_group_links():
+    """创建已知群组链接索引表，新建时用已有群组的用户名回填"""
+    existing = Database.fetchone(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'group_links'"
+    )
+    
+    # 规范化链接（与 EntityCache.normalize 一致）→ 群组 telegram_id
+    Database.execute('''
+        CREATE TABLE IF NOT EXISTS group_links (
+            link VARCHAR(255) PRIMARY KEY,
+            telegram_id BIGINT NOT NULL,
+            refreshed_at DATETIME NOT NULL
+        )
+    ''')
+    Database.execute('CREATE INDEX IF NOT EXISTS idx_group_links_telegram_id ON group_links(telegram_id)')
+    
+    if not existing:
+        Database.execute('''
+            INSERT OR IGNORE INTO group_links (link, telegram_id, refreshed_at)
+            SELECT 'username:' || LOWER(username), telegram_id, REPLACE(created_at, ' ', 'T')
+            FROM groups WHERE username IS NOT NULL AND username != ''
+        ''')
+
 def init_database():
     """初始化数据库表结构"""
     
@@ -30,6 +200,8 @@ def init_database():
             message_regex TEXT,
             collect_mode VARCHAR(20) DEFAULT 'both',
             history_limit INTEGER DEFAULT 1000,
+            multi_account BOOLEAN DEFAULT 0,
+            bot_concurrency INTEGER DEFAULT 1,
             pagination_config TEXT,
             api_config TEXT,
             status VARCHAR(20) DEFAULT 'pending',
@@ -89,12 +261,94 @@ def init_database():
         )
     ''')
     
+    # 历史同步检查点表（每个群组的高水位和未完成回填的进度）
+    Database.execute('''
+        CREATE TABLE IF NOT EXISTS sync_checkpoints (
+            group_id INTEGER PRIMARY KEY,
+            last_message_id BIGINT DEFAULT 0,
+            backfill_offset_id BIGINT DEFAULT 0,
+            backfill_count INTEGER DEFAULT 0,
+            backfill_done BOOLEAN DEFAULT 0,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (group_id) REFERENCES groups(id)
+        )
+    ''')
+    
+    # 实体解析缓存表（用户名/链接 → 实体，access_hash 按账号区分；resolved=0 为不存在的链接）
+    Database.execute('''
+        CREATE TABLE IF NOT EXISTS resolved_entities (
+            account_id INTEGER NOT NULL,
+            key VARCHAR(255) NOT NULL,
+            resolved BOOLEAN DEFAULT 1,
+            entity_id BIGINT,
+            access_hash BIGINT,
+            entity_type VARCHAR(20),
+            title VARCHAR(255),
+            username VARCHAR(100),
+            member_count INTEGER,
+            joined BOOLEAN DEFAULT 0,
+            error TEXT,
+            expires_at DATETIME NOT NULL,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (account_id, key)
+        )
+    ''')
+    
+    # 推送发件箱：待推送的消息，由后台分发器投递，失败后按退避时间重试
+    Database.execute('''
+        CREATE TABLE IF NOT EXISTS push_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id INTEGER NOT NULL,
+            message_id INTEGER,
+            idempotency_key VARCHAR(100) NOT NULL UNIQUE,
+            payload TEXT NOT NULL,
+            attempts INTEGER DEFAULT 0,
+            next_attempt_at DATETIME NOT NULL,
+            last_status INTEGER,
+            last_error TEXT,
+            created_at DATETIME NOT NULL
+        )
+    ''')
+    
+    # 推送死信表：超过最长重试时间仍未推送成功的消息，可重放
+    Database.execute('''
+        CREATE TABLE IF NOT EXISTS push_dead_letters (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id INTEGER NOT NULL,
+            message_id INTEGER,
+            idempotency_key VARCHAR(100) NOT NULL,
+            payload TEXT NOT NULL,
+            attempts INTEGER DEFAULT 0,
+            last_status INTEGER,
+            last_error TEXT,
+            created_at DATETIME NOT NULL,
+            dead_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
     # 创建索引
     Database.execute('CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status)')
     Database.execute('CREATE INDEX IF NOT EXISTS idx_groups_telegram_id ON groups(telegram_id)')
     Database.execute('CREATE INDEX IF NOT EXISTS idx_messages_group_id ON messages(group_id)')
     Database.execute('CREATE INDEX IF NOT EXISTS idx_messages_date ON messages(message_date)')
     Database.execute('CREATE INDEX IF NOT EXISTS idx_api_logs_task_id ON api_logs(task_id)')
+    # 游标分页索引（SQLite二级索引隐含rowid，即 (created_at, id) 有序）
+    Database.execute('CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks(created_at)')
+    Database.execute('CREATE INDEX IF NOT EXISTS idx_groups_created_at ON groups(created_at)')
+    Database.execute('CREATE INDEX IF NOT EXISTS idx_api_logs_task_created ON api_logs(task_id, created_at)')
+    # 消息按日期游标分页（message_date 可能为NULL，按空字符串排序）
+    Database.execute("CREATE INDEX IF NOT EXISTS idx_messages_date_key ON messages(COALESCE(message_date, ''))")
+    Database.execute('CREATE INDEX IF NOT EXISTS idx_push_outbox_next ON push_outbox(next_attempt_at)')
+    Database.execute('CREATE INDEX IF NOT EXISTS idx_push_dead_letters_task ON push_dead_letters(task_id, id)')
+    
+    # 消息全文索引
+    init_fts()
+    
+    # 统计汇总表
+    init_stats()
+    
+    # 已知群组链接索引
+    init_group_links()
     
     print("[OK] 数据库初始化完成")
 
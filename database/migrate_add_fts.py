@@ -0,0 +1,35 @@
+"""
+数据库迁移脚本：添加消息全文索引（FTS5）
+运行此脚本以为现有数据库创建索引并回填已有消息
+"""
+
+from database.db import Database
+from database.init_db import init_fts
+
+def migrate():
+    """创建 messages_fts 全文索引和同步触发器（索引表为新建时 init_fts 会根据已有消息重建索引内容）"""
+    
+    try:
+        if not init_fts():
+            print("❌ 当前SQLite不支持FTS5 trigram分词，跳过")
+            return
+        print("✅ 全文索引表和触发器已就绪")
+        
+        Database.execute("INSERT INTO messages_fts(messages_fts) VALUES ('optimize')")
+        
+        total = Database.fetchone("SELECT COUNT(*) as count FROM messages")['count']
+        print(f"✅ 已索引 {total} 条消息")
+        
+        print("\n✅ 数据库迁移完成！")
+    
+    except Exception as e:
+        print(f"❌ 迁移失败: {str(e)}")
+        raise
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("数据库迁移：添加消息全文索引")
+    print("=" * 60)
+    print()
+    
+    migrate()
@@ -0,0 +1,37 @@
+"""
+数据库迁移脚本：添加多账号执行字段
+运行此脚本以更新现有数据库
+"""
+
+from database.db import Database
+
+def migrate():
+    """添加 multi_account 字段到 tasks 表"""
+    
+    try:
+        columns = [col['name'] for col in Database.fetchall("PRAGMA table_info(tasks)")]
+        
+        # 添加 multi_account 字段
+        if 'multi_account' not in columns:
+            print("添加 multi_account 字段...")
+            Database.execute("""
+                ALTER TABLE tasks
+                ADD COLUMN multi_account BOOLEAN DEFAULT 0
+            """)
+            print("✅ multi_account 字段添加成功")
+        else:
+            print("ℹ️  multi_account 字段已存在")
+        
+        print("\n✅ 数据库迁移完成！")
+    
+    except Exception as e:
+        print(f"❌ 迁移失败: {str(e)}")
+        raise
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("数据库迁移：添加多账号执行")
+    print("=" * 60)
+    print()
+    
+    migrate()
@@ -0,0 +1,57 @@
+"""
+数据库迁移脚本：检查任务推送配置
+参数映射的目标字段现在必须是字符串，此脚本把已有任务中的数字/布尔目标改写为原来推送时的字段名，
+并列出仍然无效的推送配置（这些任务的推送会直接进入死信表，修正后可重放）
+"""
+
+import json
+from database.db import Database
+from database.models import Task
+from services.payload import CONST_KEY, compile_payload
+
+def _json_key(target):
+    """原实现推送时 json.dumps 对非字符串字段名的转换结果（如 1 → "1"，True → "true"）"""
+    return next(iter(json.loads(json.dumps({target: None}))))
+
+def migrate():
+    """改写非字符串的目标字段并校验所有任务的推送配置"""
+    
+    try:
+        tasks = Database.fetchall("SELECT id, name, api_config FROM tasks WHERE api_config IS NOT NULL")
+        fixed = invalid = 0
+        for task in tasks:
+            api_config = json.loads(task['api_config'])
+            if not api_config:
+                continue
+            
+            param_mapping = api_config.get('param_mapping') or {}
+            changed = {
+                source: _json_key(target) for source, target in param_mapping.items()
+                if source != CONST_KEY and isinstance(target, (int, float))
+            }
+            if changed:
+                api_config['param_mapping'] = {**param_mapping, **changed}
+                Task.update(task['id'], api_config=api_config)
+                fixed += 1
+                print(f"✅ 任务{task['id']}（{task['name']}）: 目标字段改为字符串 {changed}")
+            
+            try:
+                compile_payload(api_config)
+            except ValueError as e:
+                invalid += 1
+                print(f"❌ 任务{task['id']}（{task['name']}）推送配置无效: {str(e)}")
+        
+        print(f"\n共 {len(tasks)} 个任务配置了推送，改写 {fixed} 个，无效 {invalid} 个")
+        print("\n✅ 数据库迁移完成！")
+    
+    except Exception as e:
+        print(f"❌ 迁移失败: {str(e)}")
+        raise
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("数据库迁移：检查任务推送配置")
+    print("=" * 60)
+    print()
+    
+    migrate()
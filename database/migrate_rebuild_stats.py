@@ -0,0 +1,35 @@
+"""
+数据库迁移脚本：重建统计汇总表
+运行此脚本以创建统计汇总表，并根据现有消息重新计算
+"""
+
+from database.db import Database
+from database.init_db import init_stats, rebuild_stats
+
+def migrate():
+    """创建 stats_* 汇总表和触发器，并全量重建统计数据"""
+    
+    try:
+        init_stats()
+        print("✅ 统计汇总表和触发器已就绪")
+        
+        print("重建统计数据...")
+        rebuild_stats()
+        
+        groups = Database.fetchone("SELECT COUNT(*) as count FROM stats_group_totals")['count']
+        days = Database.fetchone("SELECT COUNT(DISTINCT date) as count FROM stats_daily")['count']
+        print(f"✅ 已汇总 {groups} 个群组、{days} 天的消息")
+        
+        print("\n✅ 数据库迁移完成！")
+    
+    except Exception as e:
+        print(f"❌ 迁移失败: {str(e)}")
+        raise
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("数据库迁移：重建统计汇总表")
+    print("=" * 60)
+    print()
+    
+    migrate()
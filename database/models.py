@@ -1,7 +1,45 @@
+import base64
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 from database.db import Database
 
+# 单条SQL中 IN 查询的参数个数上限（SQLite默认变量上限为999）
+_SQL_PARAM_CHUNK = 500
+
+def _new_ids(keys, existing, inserted):
+    """对比插入前后的记录，返回与 keys 一一对应的新记录ID（已存在或批内重复的为None）"""
+    result = []
+    seen = set(existing)
+    for key in keys:
+        if key in seen:
+            result.append(None)
+        else:
+            seen.add(key)
+            result.append(inserted.get(key))
+    return result
+
+def encode_cursor(*values):
+    """把排序键编码为不透明的翻页游标"""
+    raw = json.dumps(values, ensure_ascii=False, default=str).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """解析翻页游标，返回 (排序值, id)，格式错误时抛出 ValueError"""
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(cursor + padding))
+        return sort_value, int(row_id)
+    except Exception:
+        raise ValueError(f'无效的翻页游标: {cursor}')
+
+def keyset_page(rows, page_size, sort_key):
+    """截取游标分页结果（查询时多取一条用于判断是否还有下一页），返回 (rows, next_cursor)"""
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    last = rows[-1]
+    return rows, encode_cursor(last[sort_key], last['id'])
+
 class Account:
     """账号模型"""
     
@@ -77,13 +115,14 @@ class Task:
     @staticmethod
     def create(account_id, name, task_type='bot_search', bot_username=None, search_keywords=None,
                target_groups=None, group_regex=None, message_regex=None, collect_mode='both', 
-               history_limit=1000, pagination_config=None, api_config=None):
+               history_limit=1000, pagination_config=None, api_config=None, multi_account=False,
+               bot_concurrency=1):
         """创建任务"""
         query = '''
             INSERT INTO tasks (account_id, name, task_type, bot_username, search_keywords,
                              target_groups, group_regex, message_regex, collect_mode, 
-                             history_limit, pagination_config, api_config)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                             history_limit, pagination_config, api_config, multi_account, bot_concurrency)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         '''
         search_keywords_json = json.dumps(search_keywords) if search_keywords else None
         target_groups_json = json.dumps(target_groups) if target_groups else None
@@ -93,7 +132,7 @@ class Task:
         return Database.execute(query, (
             account_id, name, task_type, bot_username, search_keywords_json,
             target_groups_json, group_regex, message_regex, collect_mode, 
-            history_limit, pagination_json, api_json
+            history_limit, pagination_json, api_json, 1 if multi_account else 0, bot_concurrency or 1
         ))
     
     @staticmethod
@@ -107,11 +146,19 @@ class Task:
         return task
     
     @staticmethod
-    def get_all(page=1, page_size=50):
-        """获取所有任务（分页）"""
-        offset = (page - 1) * page_size
-        query = 'SELECT * FROM tasks ORDER BY created_at DESC LIMIT ? OFFSET ?'
-        tasks = Database.fetchall(query, (page_size, offset))
+    def get_all(page=1, page_size=50, cursor=None):
+        """获取所有任务（分页），传入 cursor 时按 (created_at, id) 游标翻页"""
+        if cursor:
+            created_at, task_id = decode_cursor(cursor)
+            query = '''
+                SELECT * FROM tasks WHERE (created_at, id) < (?, ?)
+                ORDER BY created_at DESC, id DESC LIMIT ?
+            '''
+            tasks = Database.fetchall(query, (created_at, task_id, page_size))
+        else:
+            offset = (page - 1) * page_size
+            query = 'SELECT * FROM tasks ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?'
+            tasks = Database.fetchall(query, (page_size, offset))
         
         for task in tasks:
             task['pagination_config'] = json.loads(task['pagination_config']) if task['pagination_config'] else {}
@@ -124,7 +171,7 @@ class Task:
         """更新任务"""
         allowed_fields = ['name', 'task_type', 'bot_username', 'search_keywords', 'target_groups', 
                          'group_regex', 'message_regex', 'collect_mode', 'history_limit', 
-                         'pagination_config', 'api_config', 'status']
+                         'pagination_config', 'api_config', 'multi_account', 'bot_concurrency', 'status']
         
         updates = []
         values = []
@@ -171,6 +218,55 @@ class Group:
         '''
         return Database.execute(query, (task_id, telegram_id, title, username, description, member_count))
     
+    @staticmethod
+    def create_many(groups):
+        """批量创建群组记录（单事务），返回与输入一一对应的新记录ID，已存在的为None"""
+        if not groups:
+            return []
+        
+        query = '''
+            INSERT OR IGNORE INTO groups (task_id, telegram_id, title, username, description, member_count)
+            VALUES (?, ?, ?, ?, ?, ?)
+        '''
+        rows = [(
+            group['task_id'], group['telegram_id'], group.get('title'), group.get('username'),
+            group.get('description'), group.get('member_count', 0)
+        ) for group in groups]
+        telegram_ids = [group['telegram_id'] for group in groups]
+        
+        def lookup(conn):
+            ids = {}
+            for i in range(0, len(telegram_ids), _SQL_PARAM_CHUNK):
+                chunk = telegram_ids[i:i + _SQL_PARAM_CHUNK]
+                placeholders = ', '.join('?' * len(chunk))
+                cursor = conn.execute(
+                    f'SELECT id, telegram_id FROM groups WHERE telegram_id IN ({placeholders})', chunk
+                )
+                ids.update((row[1], row[0]) for row in cursor)
+            return ids
+        
+        def insert(conn):
+            existing = lookup(conn)
+            conn.executemany(query, rows)
+            return _new_ids(telegram_ids, existing, lookup(conn))
+        
+        return Database.transaction(insert)
+    
+    @staticmethod
+    def update_metadata_many(groups):
+        """按 telegram_id 批量更新已有群组的标题、用户名和成员数"""
+        if not groups:
+            return
+        
+        query = '''
+            UPDATE groups SET title = ?, username = ?, member_count = ?
+            WHERE telegram_id = ?
+        '''
+        rows = [(
+            group.get('title'), group.get('username'), group.get('member_count', 0), group['telegram_id']
+        ) for group in groups]
+        Database.transaction(lambda conn: conn.executemany(query, rows))
+    
     @staticmethod
     def get_by_telegram_id(telegram_id):
         """根据Telegram ID获取群组"""
@@ -178,14 +274,19 @@ class Group:
         return Database.fetchone(query, (telegram_id,))
     
     @staticmethod
-    def get_all(filters=None, page=1, page_size=50):
-        """获取所有群组（分页）"""
+    def get_all(filters=None, page=1, page_size=50, cursor=None):
+        """获取所有群组（分页），传入 cursor 时按 (created_at, id) 游标翻页"""
         offset = (page - 1) * page_size
         query = 'SELECT * FROM groups'
         params = []
+        conditions = []
+        
+        if cursor:
+            conditions.append('(created_at, id) < (?, ?)')
+            params.extend(decode_cursor(cursor))
+            offset = 0
         
         if filters:
-            conditions = []
             if filters.get('task_id'):
                 conditions.append('task_id = ?')
                 params.append(filters['task_id'])
@@ -193,15 +294,26 @@ class Group:
                 conditions.append('(title LIKE ? OR username LIKE ?)')
                 keyword = f"%{filters['keyword']}%"
                 params.extend([keyword, keyword])
-            
-            if conditions:
-                query += ' WHERE ' + ' AND '.join(conditions)
         
-        query += ' ORDER BY created_at DESC LIMIT ? OFFSET ?'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        
+        query += ' ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?'
         params.extend([page_size, offset])
         
         return Database.fetchall(query, tuple(params))
     
+    @staticmethod
+    def iter_all(filters=None, chunk_size=1000):
+        """按游标分块遍历全部群组（每块一次短查询，不长时间占用读事务）"""
+        cursor = None
+        while True:
+            rows = Group.get_all(filters, page_size=chunk_size, cursor=cursor)
+            yield from rows
+            if len(rows) < chunk_size:
+                break
+            cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+    
     @staticmethod
     def count(filters=None):
         """获取群组总数"""
@@ -242,66 +354,296 @@ class Message:
         ))
     
     @staticmethod
-    def get_all(filters=None, page=1, page_size=50):
-        """获取所有消息（分页）"""
-        offset = (page - 1) * page_size
+    def create_many(messages, push_task_ids=None):
+        """
+        批量创建消息记录（单事务），返回与输入一一对应的新记录ID，已存在的为None
+        push_task_ids 与 messages 一一对应（任务ID或None），新插入且有任务ID的消息在同一事务中写入推送发件箱，
+        不会出现消息已入库但没有进入发件箱的情况
+        """
+        if not messages:
+            return []
+        
         query = '''
-            SELECT m.*, g.title as group_title, g.username as group_username
-            FROM messages m
-            LEFT JOIN groups g ON m.group_id = g.id
+            INSERT OR IGNORE INTO messages 
+            (group_id, telegram_message_id, sender_id, sender_name, content, media_type, message_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
         '''
+        rows = [(
+            msg['group_id'], msg['telegram_message_id'], msg.get('sender_id'), msg.get('sender_name'),
+            msg.get('content'), msg.get('media_type', 'text'), msg.get('message_date')
+        ) for msg in messages]
+        keys = [(msg['group_id'], msg['telegram_message_id']) for msg in messages]
+        
+        # 按群组归类，便于用 IN 查询已存在的消息
+        ids_by_group = {}
+        for group_id, telegram_message_id in keys:
+            ids_by_group.setdefault(group_id, []).append(telegram_message_id)
+        
+        def lookup(conn):
+            ids = {}
+            for group_id, telegram_message_ids in ids_by_group.items():
+                for i in range(0, len(telegram_message_ids), _SQL_PARAM_CHUNK):
+                    chunk = telegram_message_ids[i:i + _SQL_PARAM_CHUNK]
+                    placeholders = ', '.join('?' * len(chunk))
+                    cursor = conn.execute(f'''
+                        SELECT id, telegram_message_id FROM messages
+                        WHERE group_id = ? AND telegram_message_id IN ({placeholders})
+                    ''', (group_id, *chunk))
+                    ids.update(((group_id, row[1]), row[0]) for row in cursor)
+            return ids
+        
+        def insert(conn):
+            existing = lookup(conn)
+            conn.executemany(query, rows)
+            ids = _new_ids(keys, existing, lookup(conn))
+            if push_task_ids:
+                Outbox.insert_many(conn, [
+                    (task_id, msg, new_id)
+                    for msg, task_id, new_id in zip(messages, push_task_ids, ids) if task_id and new_id
+                ])
+            return ids
+        
+        return Database.transaction(insert)
+    
+    # 全文索引（trigram）最短可检索的关键词长度
+    FTS_MIN_KEYWORD_LENGTH = 3
+    _fts_available = None
+    
+    # 按日期排序的键（与 idx_messages_date_key 索引的表达式一致）
+    _SORT_KEY = "COALESCE(m.message_date, '')"
+    
+    @staticmethod
+    def fts_available():
+        """检查消息全文索引是否存在"""
+        if Message._fts_available is None:
+            result = Database.fetchone(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+            )
+            Message._fts_available = result is not None
+        return Message._fts_available
+    
+    @staticmethod
+    def _use_fts(filters):
+        """关键词长度足够且全文索引可用时使用FTS检索，否则回退到LIKE"""
+        keyword = filters.get('keyword') if filters else None
+        return bool(keyword) and len(keyword) >= Message.FTS_MIN_KEYWORD_LENGTH and Message.fts_available()
+    
+    @staticmethod
+    def _build_conditions(filters, use_fts):
+        """构建过滤条件"""
+        conditions = []
         params = []
         
         if filters:
-            conditions = []
             if filters.get('group_id'):
                 conditions.append('m.group_id = ?')
                 params.append(filters['group_id'])
             if filters.get('keyword'):
-                conditions.append('m.content LIKE ?')
-                params.append(f"%{filters['keyword']}%")
+                if use_fts:
+                    # 作为短语匹配，避免关键词中的FTS语法字符被解析
+                    conditions.append('messages_fts MATCH ?')
+                    params.append('"' + filters['keyword'].replace('"', '""') + '"')
+                else:
+                    conditions.append('m.content LIKE ?')
+                    params.append(f"%{filters['keyword']}%")
             if filters.get('start_date'):
                 conditions.append('m.message_date >= ?')
                 params.append(filters['start_date'])
             if filters.get('end_date'):
                 conditions.append('m.message_date <= ?')
                 params.append(filters['end_date'])
-            
-            if conditions:
-                query += ' WHERE ' + ' AND '.join(conditions)
         
-        query += ' ORDER BY m.message_date DESC LIMIT ? OFFSET ?'
+        return conditions, params
+    
+    @staticmethod
+    def get_all(filters=None, page=1, page_size=50, order_by='date', cursor=None):
+        """
+        获取所有消息（分页）
+        order_by='rank' 时按关键词相关度排序；传入 cursor 时按 (message_date, id) 游标翻页
+        """
+        offset = (page - 1) * page_size
+        use_fts = Message._use_fts(filters)
+        
+        if use_fts:
+            query = '''
+                SELECT m.*, g.title as group_title, g.username as group_username,
+                       snippet(messages_fts, 0, '<mark>', '</mark>', '...', 16) as snippet
+                FROM messages_fts
+                JOIN messages m ON m.id = messages_fts.rowid
+                LEFT JOIN groups g ON m.group_id = g.id
+            '''
+        else:
+            query = '''
+                SELECT m.*, g.title as group_title, g.username as group_username
+                FROM messages m
+                LEFT JOIN groups g ON m.group_id = g.id
+            '''
+        
+        conditions, params = Message._build_conditions(filters, use_fts)
+        if cursor:
+            # message_date 为NULL的消息按空字符串排在最后（行值与NULL比较永远不成立，会被跳过）
+            # 单独的 <= 条件让SQLite可以按 idx_messages_date_key 定位起点
+            sort_value, row_id = decode_cursor(cursor)
+            sort_value = '' if sort_value is None else sort_value
+            conditions.append(f'{Message._SORT_KEY} <= ? AND ({Message._SORT_KEY}, m.id) < (?, ?)')
+            params.extend([sort_value, sort_value, row_id])
+            offset = 0
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        
+        if use_fts and order_by == 'rank' and not cursor:
+            query += ' ORDER BY bm25(messages_fts) LIMIT ? OFFSET ?'
+        else:
+            query += f' ORDER BY {Message._SORT_KEY} DESC, m.id DESC LIMIT ? OFFSET ?'
         params.extend([page_size, offset])
         
         return Database.fetchall(query, tuple(params))
     
+    @staticmethod
+    def iter_all(filters=None, chunk_size=1000):
+        """按游标分块遍历全部消息（每块一次短查询，不长时间占用读事务）"""
+        cursor = None
+        while True:
+            rows = Message.get_all(filters, page_size=chunk_size, cursor=cursor)
+            yield from rows
+            if len(rows) < chunk_size:
+                break
+            cursor = encode_cursor(rows[-1]['message_date'], rows[-1]['id'])
+    
     @staticmethod
     def count(filters=None):
         """获取消息总数"""
-        query = 'SELECT COUNT(*) as count FROM messages m'
-        params = []
+        use_fts = Message._use_fts(filters)
+        if use_fts:
+            query = '''
+                SELECT COUNT(*) as count
+                FROM messages_fts
+                JOIN messages m ON m.id = messages_fts.rowid
+            '''
+        else:
+            query = 'SELECT COUNT(*) as count FROM messages m'
         
-        if filters:
-            conditions = []
-            if filters.get('group_id'):
-                conditions.append('m.group_id = ?')
-                params.append(filters['group_id'])
-            if filters.get('keyword'):
-                conditions.append('m.content LIKE ?')
-                params.append(f"%{filters['keyword']}%")
-            if filters.get('start_date'):
-                conditions.append('m.message_date >= ?')
-                params.append(filters['start_date'])
-            if filters.get('end_date'):
-                conditions.append('m.message_date <= ?')
-                params.append(filters['end_date'])
-            
-            if conditions:
-                query += ' WHERE ' + ' AND '.join(conditions)
+        conditions, params = Message._build_conditions(filters, use_fts)
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
         
         result = Database.fetchone(query, tuple(params) if params else None)
         return result['count'] if result else 0
 
+class GroupLink:
+    """已知群组链接索引模型（规范化链接 → 群组）"""
+    
+    @staticmethod
+    def get_known(links, max_age):
+        """
+        查询已入库的链接，返回 {link: 记录}
+        记录包含 group_id、telegram_id、refreshed_at，以及是否超过 max_age 秒需要刷新（stale）
+        """
+        links = list(links)
+        threshold = (datetime.now() - timedelta(seconds=max_age)).isoformat()
+        known = {}
+        for i in range(0, len(links), _SQL_PARAM_CHUNK):
+            chunk = links[i:i + _SQL_PARAM_CHUNK]
+            placeholders = ', '.join('?' * len(chunk))
+            query = f'''
+                SELECT gl.link, gl.telegram_id, gl.refreshed_at, g.id AS group_id, g.title
+                FROM group_links gl JOIN groups g ON g.telegram_id = gl.telegram_id
+                WHERE gl.link IN ({placeholders})
+            '''
+            for row in Database.fetchall(query, chunk):
+                row['stale'] = row['refreshed_at'] < threshold
+                known[row['link']] = row
+        return known
+    
+    @staticmethod
+    def save_many(pairs):
+        """批量保存 (link, telegram_id)，刷新时间记为当前时间"""
+        if not pairs:
+            return
+        
+        now = datetime.now().isoformat()
+        query = '''
+            INSERT OR REPLACE INTO group_links (link, telegram_id, refreshed_at)
+            VALUES (?, ?, ?)
+        '''
+        rows = [(link, telegram_id, now) for link, telegram_id in pairs]
+        Database.transaction(lambda conn: conn.executemany(query, rows))
+
+class SyncCheckpoint:
+    """历史同步检查点模型"""
+    
+    @staticmethod
+    def get(group_id):
+        """获取群组的同步检查点"""
+        query = 'SELECT * FROM sync_checkpoints WHERE group_id = ?'
+        return Database.fetchone(query, (group_id,))
+    
+    @staticmethod
+    def save(group_id, last_message_id, backfill_offset_id, backfill_count, backfill_done):
+        """保存同步检查点，高水位只增不减"""
+        query = '''
+            INSERT INTO sync_checkpoints (group_id, last_message_id, backfill_offset_id,
+                                          backfill_count, backfill_done, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(group_id) DO UPDATE SET
+                last_message_id = MAX(last_message_id, excluded.last_message_id),
+                backfill_offset_id = excluded.backfill_offset_id,
+                backfill_count = excluded.backfill_count,
+                backfill_done = excluded.backfill_done,
+                updated_at = excluded.updated_at
+        '''
+        Database.execute(query, (
+            group_id, last_message_id, backfill_offset_id, backfill_count,
+            backfill_done, datetime.now().isoformat()
+        ))
+    
+    @staticmethod
+    def delete(group_id):
+        """删除检查点（下次采集重新回填）"""
+        query = 'DELETE FROM sync_checkpoints WHERE group_id = ?'
+        Database.execute(query, (group_id,))
+
+class ResolvedEntity:
+    """实体解析缓存模型"""
+    
+    @staticmethod
+    def get(account_id, key):
+        """获取未过期的缓存记录"""
+        query = '''
+            SELECT * FROM resolved_entities
+            WHERE account_id = ? AND key = ? AND expires_at > ?
+        '''
+        return Database.fetchone(query, (account_id, key, datetime.now().isoformat()))
+    
+    @staticmethod
+    def save(account_id, key, ttl, resolved=True, entity_id=None, access_hash=None, entity_type=None,
+             title=None, username=None, member_count=None, joined=False, error=None):
+        """保存缓存记录，ttl 为有效秒数"""
+        now = datetime.now()
+        query = '''
+            INSERT OR REPLACE INTO resolved_entities (account_id, key, resolved, entity_id, access_hash,
+                                                      entity_type, title, username, member_count,
+                                                      joined, error, expires_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        '''
+        Database.execute(query, (
+            account_id, key, 1 if resolved else 0, entity_id, access_hash, entity_type,
+            title, username, member_count, 1 if joined else 0, error,
+            (now + timedelta(seconds=ttl)).isoformat(), now.isoformat()
+        ))
+    
+    @staticmethod
+    def set_joined(account_id, entity_id):
+        """标记账号已加入该实体"""
+        query = 'UPDATE resolved_entities SET joined = 1 WHERE account_id = ? AND entity_id = ?'
+        Database.execute(query, (account_id, entity_id))
+    
+    @staticmethod
+    def delete_expired():
+        """删除过期记录"""
+        query = 'DELETE FROM resolved_entities WHERE expires_at <= ?'
+        Database.execute(query, (datetime.now().isoformat(),))
+
 class APILog:
     """API日志模型"""
     
@@ -322,18 +664,195 @@ class APILog:
         ))
     
     @staticmethod
-    def get_by_task(task_id, page=1, page_size=50):
-        """获取任务的API日志"""
-        offset = (page - 1) * page_size
+    def create_many(logs):
+        """批量创建API日志（单事务），logs 为与 create 参数同名的dict列表"""
+        if not logs:
+            return
+        
         query = '''
-            SELECT * FROM api_logs 
-            WHERE task_id = ? 
-            ORDER BY created_at DESC 
-            LIMIT ? OFFSET ?
+            INSERT INTO api_logs (task_id, message_id, url, method, request_data,
+                                status_code, response, success)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         '''
-        logs = Database.fetchall(query, (task_id, page_size, offset))
+        rows = [(
+            log['task_id'], log.get('message_id'), log['url'], log['method'],
+            json.dumps(log['request_data']) if log.get('request_data') else None,
+            log.get('status_code'), log.get('response'), log.get('success', False)
+        ) for log in logs]
+        
+        Database.transaction(lambda conn: conn.executemany(query, rows))
+    
+    @staticmethod
+    def get_by_task(task_id, page=1, page_size=50, cursor=None):
+        """获取任务的API日志，传入 cursor 时按 (created_at, id) 游标翻页"""
+        if cursor:
+            created_at, log_id = decode_cursor(cursor)
+            query = '''
+                SELECT * FROM api_logs 
+                WHERE task_id = ? AND (created_at, id) < (?, ?)
+                ORDER BY created_at DESC, id DESC 
+                LIMIT ?
+            '''
+            logs = Database.fetchall(query, (task_id, created_at, log_id, page_size))
+        else:
+            offset = (page - 1) * page_size
+            query = '''
+                SELECT * FROM api_logs 
+                WHERE task_id = ? 
+                ORDER BY created_at DESC, id DESC 
+                LIMIT ? OFFSET ?
+            '''
+            logs = Database.fetchall(query, (task_id, page_size, offset))
         
         for log in logs:
             log['request_data'] = json.loads(log['request_data']) if log['request_data'] else {}
         
         return logs
+
+def _json_default(obj):
+    """消息序列化：日期时间转为ISO字符串"""
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Type {type(obj)} not serializable")
+
+class Outbox:
+    """推送发件箱模型"""
+    
+    @staticmethod
+    def idempotency_key(task_id, message_id):
+        """幂等键：同一任务的同一条消息只推送一次，重试和重放都使用同一个键"""
+        return f'{task_id}:{message_id}'
+    
+    @staticmethod
+    def enqueue_many(deliveries):
+        """批量加入发件箱，deliveries 为 [(task_id, 消息dict, 消息ID)]，已在发件箱中的消息忽略"""
+        if not deliveries:
+            return
+        
+        Database.transaction(lambda conn: Outbox.insert_many(conn, deliveries))
+    
+    @staticmethod
+    def insert_many(conn, deliveries):
+        """在调用方的事务中加入发件箱（见 Message.create_many）"""
+        if not deliveries:
+            return
+        
+        now = datetime.now().isoformat()
+        query = '''
+            INSERT OR IGNORE INTO push_outbox (task_id, message_id, idempotency_key, payload,
+                                               next_attempt_at, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        '''
+        rows = [(
+            task_id, message_id, Outbox.idempotency_key(task_id, message_id),
+            json.dumps(message, ensure_ascii=False, default=_json_default), now, now
+        ) for task_id, message, message_id in deliveries]
+        conn.executemany(query, rows)
+    
+    @staticmethod
+    def claim_due(limit, lease):
+        """
+        领取到期的记录：把 next_attempt_at 推后 lease 秒（租约）后返回，投递期间不会被再次领取；
+        进程中断时租约到期后自动重新投递（进程内仍在投递的记录由 OutboxDispatcher 跳过，相当于续租）
+        """
+        now = datetime.now()
+        lease_until = (now + timedelta(seconds=lease)).isoformat()
+        
+        def claim(conn):
+            rows = conn.execute(
+                'SELECT * FROM push_outbox WHERE next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?',
+                (now.isoformat(), limit)
+            ).fetchall()
+            conn.executemany(
+                'UPDATE push_outbox SET next_attempt_at = ? WHERE id = ?',
+                [(lease_until, row['id']) for row in rows]
+            )
+            return [dict(row) for row in rows]
+        
+        return Database.transaction(claim)
+    
+    @staticmethod
+    def finish_many(delivered=(), retries=(), dead=()):
+        """
+        批量记录投递结果（单事务）：
+        delivered 为已成功的ID；retries 为 [(ID, 已尝试次数, 下次时间, 状态码, 错误)]；
+        dead 为 [(ID, 已尝试次数, 状态码, 错误)]，移入死信表
+        """
+        def finish(conn):
+            conn.executemany('DELETE FROM push_outbox WHERE id = ?', [(outbox_id,) for outbox_id in delivered])
+            conn.executemany('''
+                UPDATE push_outbox SET attempts = ?, next_attempt_at = ?, last_status = ?, last_error = ?
+                WHERE id = ?
+            ''', [
+                (attempts, next_attempt_at.isoformat(), status, error, outbox_id)
+                for outbox_id, attempts, next_attempt_at, status, error in retries
+            ])
+            conn.executemany('''
+                INSERT INTO push_dead_letters (task_id, message_id, idempotency_key, payload,
+                                               attempts, last_status, last_error, created_at)
+                SELECT task_id, message_id, idempotency_key, payload, ?, ?, ?, created_at
+                FROM push_outbox WHERE id = ?
+            ''', [(attempts, status, error, outbox_id) for outbox_id, attempts, status, error in dead])
+            conn.executemany('DELETE FROM push_outbox WHERE id = ?', [(row[0],) for row in dead])
+        
+        Database.transaction(finish)
+    
+    @staticmethod
+    def stats():
+        """待推送数、已到期数和最早一条的入队时间"""
+        query = '''
+            SELECT COUNT(*) AS pending,
+                   SUM(CASE WHEN next_attempt_at <= ? THEN 1 ELSE 0 END) AS due,
+                   SUM(CASE WHEN attempts > 0 THEN 1 ELSE 0 END) AS retrying,
+                   MIN(created_at) AS oldest
+            FROM push_outbox
+        '''
+        stats = Database.fetchone(query, (datetime.now().isoformat(),))
+        stats['due'] = stats['due'] or 0
+        stats['retrying'] = stats['retrying'] or 0
+        stats['dead_letters'] = Database.fetchone('SELECT COUNT(*) as count FROM push_dead_letters')['count']
+        return stats
+
+class DeadLetter:
+    """推送死信模型"""
+    
+    @staticmethod
+    def get_by_task(task_id, page=1, page_size=50):
+        """获取任务的死信（最新的在前）"""
+        offset = (page - 1) * page_size
+        query = '''
+            SELECT * FROM push_dead_letters WHERE task_id = ?
+            ORDER BY id DESC LIMIT ? OFFSET ?
+        '''
+        letters = Database.fetchall(query, (task_id, page_size, offset))
+        for letter in letters:
+            letter['payload'] = json.loads(letter['payload'])
+        return letters
+    
+    @staticmethod
+    def count_by_task(task_id):
+        """统计任务的死信数"""
+        query = 'SELECT COUNT(*) as count FROM push_dead_letters WHERE task_id = ?'
+        return Database.fetchone(query, (task_id,))['count']
+    
+    @staticmethod
+    def replay(task_id, ids=None):
+        """把任务的死信（ids 为空时全部）放回发件箱立即重新推送，返回重放的条数"""
+        now = datetime.now().isoformat()
+        condition = 'task_id = ?'
+        params = [task_id]
+        if ids:
+            condition += f" AND id IN ({', '.join('?' * len(ids))})"
+            params.extend(ids)
+        
+        def replay(conn):
+            # 重放视为新的投递：重新计算最长重试时间，幂等键不变
+            conn.execute(f'''
+                INSERT OR IGNORE INTO push_outbox (task_id, message_id, idempotency_key, payload,
+                                                   next_attempt_at, created_at)
+                SELECT task_id, message_id, idempotency_key, payload, ?, ?
+                FROM push_dead_letters WHERE {condition}
+            ''', [now, now] + params)
+            return conn.execute(f'DELETE FROM push_dead_letters WHERE {condition}', params).rowcount
+        
+        return Database.transaction(replay)
@@ -1,5 +1,4 @@
 from flask import Blueprint, request, jsonify
-import asyncio
 from database.models import Account
 from services.telegram_service import telegram_service
 
@@ -13,15 +12,10 @@ def get_accounts():
         
         # 检查每个账号的登录状态
         for account in accounts:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                is_logged_in = loop.run_until_complete(
-                    telegram_service.is_logged_in(account['id'])
-                )
-                account['is_logged_in'] = is_logged_in
-            finally:
-                loop.close()
+            account['is_logged_in'] = telegram_service.run(
+                account['id'],
+                telegram_service.is_logged_in(account['id'])
+            )
         
         return jsonify({
             'code': 200,
@@ -54,14 +48,9 @@ def add_account():
         # 创建账号记录（不设置为活跃）
         account_id = Account.create(api_id, api_hash, phone)
         
-        # 异步登录 - 不关闭loop，让后续验证使用
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        # 保存loop到telegram_service，供后续使用
-        telegram_service._loops[account_id] = loop
-        
-        result = loop.run_until_complete(
+        # 在账号专用的event loop上登录，客户端常驻供后续验证使用
+        result = telegram_service.run(
+            account_id,
             telegram_service.login(account_id, api_id, api_hash, phone)
         )
         
@@ -69,20 +58,17 @@ def add_account():
             result['account_id'] = account_id
             return jsonify({'code': 200, 'message': result['message'], 'data': result})
         else:
-            # 登录失败，关闭loop并删除账号
-            loop.close()
-            if account_id in telegram_service._loops:
-                del telegram_service._loops[account_id]
+            # 登录失败，释放客户端并删除账号
+            telegram_service.release(account_id)
             Account.delete(account_id)
             return jsonify({'code': 500, 'message': result['message']}), 500
-            
+    
     except Exception as e:
         import traceback
         traceback.print_exc()
         # 出错时清理
-        if 'account_id' in locals() and account_id in telegram_service._loops:
-            telegram_service._loops[account_id].close()
-            del telegram_service._loops[account_id]
+        if 'account_id' in locals():
+            telegram_service.release(account_id)
         return jsonify({'code': 500, 'message': f'添加账号失败: {str(e)}'}), 500
 
 @auth_bp.route('/accounts/<int:account_id>/verify', methods=['POST'])
@@ -105,25 +91,24 @@ def verify_account(account_id):
         
         logger.info(f"账号ID: {account_id}, 手机号: {phone}, 验证码: {'有' if code else '无'}, 密码: {'有' if password else '无'}")
         
-        # 使用login时创建的同一个loop
-        if account_id not in telegram_service._loops:
-            logger.error("event loop不存在，请重新登录")
+        # 使用login时创建的同一个客户端
+        if account_id not in telegram_service.clients:
+            logger.error("客户端不存在，请重新登录")
             return jsonify({'code': 400, 'message': '会话已过期，请重新添加账号'}), 400
         
-        loop = telegram_service._loops[account_id]
-        asyncio.set_event_loop(loop)
-        
         if password:
             # 验证两步验证密码
             logger.info("开始验证两步验证密码")
-            result = loop.run_until_complete(
+            result = telegram_service.run(
+                account_id,
                 telegram_service.verify_password(account_id, password)
             )
             logger.info(f"密码验证结果: {result}")
         elif code:
             # 验证登录码
             logger.info("开始验证登录码")
-            result = loop.run_until_complete(
+            result = telegram_service.run(
+                account_id,
                 telegram_service.verify_code(account_id, phone, code)
             )
             logger.info(f"验证码验证结果: {result}")
@@ -132,32 +117,25 @@ def verify_account(account_id):
             return jsonify({'code': 400, 'message': '验证码或密码不能为空'}), 400
         
         if result['status'] == 'success':
-            logger.info("验证成功，关闭loop")
-            # 验证成功，关闭loop
-            loop.close()
-            del telegram_service._loops[account_id]
+            logger.info("验证成功，客户端保持常驻")
             return jsonify({'code': 200, 'message': result['message']})
         elif result['status'] == 'password_required':
-            logger.info("需要两步验证密码，保持loop")
-            # 需要密码，保持loop不关闭
+            logger.info("需要两步验证密码，保持客户端连接")
             return jsonify({'code': 200, 'message': result['message'], 'data': {'password_required': True}})
         else:
             logger.error(f"验证失败: {result['message']}")
-            # 验证失败，关闭loop并删除账号
-            loop.close()
-            del telegram_service._loops[account_id]
+            # 验证失败，释放客户端并删除账号
+            telegram_service.release(account_id)
             Account.delete(account_id)
             return jsonify({'code': 500, 'message': result['message']}), 500
-            
+    
     except Exception as e:
         import traceback
         error_trace = traceback.format_exc()
         logger.error(f"验证异常: {error_trace}")
         print(f"验证异常详情:\n{error_trace}")
-        # 出错时关闭loop并删除账号
-        if account_id in telegram_service._loops:
-            telegram_service._loops[account_id].close()
-            del telegram_service._loops[account_id]
+        # 出错时释放客户端并删除账号
+        telegram_service.release(account_id)
         Account.delete(account_id)
         return jsonify({'code': 500, 'message': f'验证失败: {str(e)}'}), 500
 
@@ -170,14 +148,10 @@ def activate_account(account_id):
             return jsonify({'code': 404, 'message': '账号不存在'}), 404
         
         # 检查是否已登录
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            is_logged_in = loop.run_until_complete(
-                telegram_service.is_logged_in(account_id)
-            )
-        finally:
-            loop.close()
+        is_logged_in = telegram_service.run(
+            account_id,
+            telegram_service.is_logged_in(account_id)
+        )
         
         if not is_logged_in:
             return jsonify({'code': 400, 'message': '账号未登录，无法设置为活跃'}), 400
@@ -198,20 +172,13 @@ def delete_account(account_id):
         if not account:
             return jsonify({'code': 404, 'message': '账号不存在'}), 404
         
-        # 如果有保存的loop，先关闭
-        if account_id in telegram_service._loops:
-            telegram_service._loops[account_id].close()
-            del telegram_service._loops[account_id]
-        
-        # 登出并删除client
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+        # 登出并释放客户端和event loop
         try:
-            loop.run_until_complete(telegram_service.logout(account_id))
+            telegram_service.run(account_id, telegram_service.logout(account_id))
         except:
             pass
         finally:
-            loop.close()
+            telegram_service.release(account_id)
         
         # 删除账号记录
         Account.delete(account_id)
@@ -229,14 +196,10 @@ def status():
         account = Account.get_active()
         
         if account:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                is_logged_in = loop.run_until_complete(
-                    telegram_service.is_logged_in(account['id'])
-                )
-            finally:
-                loop.close()
+            is_logged_in = telegram_service.run(
+                account['id'],
+                telegram_service.is_logged_in(account['id'])
+            )
         else:
             is_logged_in = False
         
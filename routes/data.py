@@ -1,8 +1,14 @@
-from flask import Blueprint, request, jsonify, send_file
+import zlib
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from services.data_service import DataService
 
 data_bp = Blueprint('data', __name__, url_prefix='/api/data')
 
+def _include_total(cursor):
+    """游标分页默认不统计总数，可通过 include_total=1 开启"""
+    default = 'false' if cursor is not None else 'true'
+    return request.args.get('include_total', default).lower() in ('1', 'true')
+
 @data_bp.route('/groups', methods=['GET'])
 def get_groups():
     """获取群组列表"""
@@ -10,6 +16,7 @@ def get_groups():
     page_size = request.args.get('page_size', 50, type=int)
     task_id = request.args.get('task_id', type=int)
     keyword = request.args.get('keyword')
+    cursor = request.args.get('cursor')
     
     filters = {}
     if task_id:
@@ -17,7 +24,10 @@ def get_groups():
     if keyword:
         filters['keyword'] = keyword
     
-    result = DataService.get_groups(filters, page, page_size)
+    try:
+        result = DataService.get_groups(filters, page, page_size, cursor, _include_total(cursor))
+    except ValueError as e:
+        return jsonify({'code': 400, 'message': str(e)}), 400
     
     return jsonify({
         'code': 200,
@@ -33,6 +43,7 @@ def get_messages():
     keyword = request.args.get('keyword')
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
+    cursor = request.args.get('cursor')
     
     filters = {}
     if group_id:
@@ -44,7 +55,10 @@ def get_messages():
     if end_date:
         filters['end_date'] = end_date
     
-    result = DataService.get_messages(filters, page, page_size)
+    try:
+        result = DataService.get_messages(filters, page, page_size, cursor, _include_total(cursor))
+    except ValueError as e:
+        return jsonify({'code': 400, 'message': str(e)}), 400
     
     return jsonify({
         'code': 200,
@@ -70,7 +84,7 @@ def search():
 def export():
     """导出数据"""
     data_type = request.args.get('type', 'messages')  # groups or messages
-    format_type = request.args.get('format', 'csv')  # csv or json
+    format_type = request.args.get('format', 'csv')  # csv, json or ndjson
     
     # 获取过滤条件
     filters = {}
@@ -80,13 +94,39 @@ def export():
         filters['task_id'] = int(request.args.get('task_id'))
     if request.args.get('keyword'):
         filters['keyword'] = request.args.get('keyword')
+    if request.args.get('start_date'):
+        filters['start_date'] = request.args.get('start_date')
+    if request.args.get('end_date'):
+        filters['end_date'] = request.args.get('end_date')
     
-    filepath = DataService.export_data(data_type, format_type, filters)
+    export = DataService.export_data(data_type, format_type, filters)
     
-    if not filepath:
+    if not export:
         return jsonify({'code': 400, 'message': '导出失败'}), 400
     
-    return send_file(filepath, as_attachment=True)
+    content, filename, mimetype = export
+    headers = {
+        'Content-Disposition': f'attachment; filename={filename}',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    }
+    
+    # 可选gzip压缩（客户端支持时）
+    body = (chunk.encode('utf-8') for chunk in content)
+    if request.args.get('gzip', '').lower() in ('1', 'true') and 'gzip' in request.accept_encodings:
+        body = _gzip_stream(body)
+        headers['Content-Encoding'] = 'gzip'
+    
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
+
+def _gzip_stream(chunks):
+    """逐块gzip压缩，每块同步刷新以便客户端尽快收到数据"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
 
 @data_bp.route('/statistics', methods=['GET'])
 def statistics():
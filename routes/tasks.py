@@ -1,8 +1,11 @@
 from flask import Blueprint, request, jsonify
-import asyncio
-from database.models import Task, Account
+from database.models import Task, Account, DeadLetter, keyset_page
 from services.task_service import task_service
 from services.telegram_service import telegram_service
+from services.ingest_service import ingest_pipeline
+from services.push_client import push_client
+from services.outbox import outbox_dispatcher
+from services.payload import compile_payload
 
 tasks_bp = Blueprint('tasks', __name__, url_prefix='/api/tasks')
 
@@ -11,17 +14,30 @@ def get_tasks():
     """获取任务列表"""
     page = request.args.get('page', 1, type=int)
     page_size = request.args.get('page_size', 50, type=int)
+    cursor = request.args.get('cursor')
+    
+    # 游标分页
+    if cursor is not None:
+        try:
+            tasks, next_cursor = keyset_page(
+                Task.get_all(page_size=page_size + 1, cursor=cursor), page_size, 'created_at'
+            )
+        except ValueError as e:
+            return jsonify({'code': 400, 'message': str(e)}), 400
+        _attach_account_phone(tasks)
+        return jsonify({
+            'code': 200,
+            'data': {
+                'tasks': tasks,
+                'page_size': page_size,
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
+            }
+        })
     
     tasks = Task.get_all(page, page_size)
     total = Task.count()
-    
-    # 为每个任务添加账号信息
-    for task in tasks:
-        account = Account.get_by_id(task['account_id'])
-        if account:
-            task['account_phone'] = account['phone']
-        else:
-            task['account_phone'] = '未知'
+    _attach_account_phone(tasks)
     
     return jsonify({
         'code': 200,
@@ -34,6 +50,15 @@ def get_tasks():
         }
     })
 
+def _attach_account_phone(tasks):
+    """为每个任务添加账号信息"""
+    for task in tasks:
+        account = Account.get_by_id(task['account_id'])
+        if account:
+            task['account_phone'] = account['phone']
+        else:
+            task['account_phone'] = '未知'
+
 @tasks_bp.route('', methods=['POST'])
 def create_task():
     """创建任务"""
@@ -45,6 +70,10 @@ def create_task():
         if not data.get(field):
             return jsonify({'code': 400, 'message': f'{field}不能为空'}), 400
     
+    error = _check_api_config(data.get('api_config'))
+    if error:
+        return jsonify({'code': 400, 'message': error}), 400
+    
     # 获取账号ID（如果指定了account_id则使用指定的，否则使用活跃账号）
     account_id = data.get('account_id')
     if account_id:
@@ -71,7 +100,9 @@ def create_task():
         collect_mode=data.get('collect_mode', 'both'),
         history_limit=data.get('history_limit', 1000),
         pagination_config=data.get('pagination_config'),
-        api_config=data.get('api_config')
+        api_config=data.get('api_config'),
+        multi_account=bool(data.get('multi_account')),
+        bot_concurrency=data.get('bot_concurrency', 1)
     )
     
     return jsonify({
@@ -80,6 +111,16 @@ def create_task():
         'data': {'task_id': task_id}
     })
 
+def _check_api_config(api_config):
+    """校验推送配置（参数映射、请求体格式、压缩方式），返回错误信息"""
+    if not api_config:
+        return None
+    try:
+        compile_payload(api_config)
+    except ValueError as e:
+        return f'推送配置错误: {str(e)}'
+    return None
+
 @tasks_bp.route('/<int:task_id>', methods=['GET'])
 def get_task(task_id):
     """获取任务详情"""
@@ -106,6 +147,10 @@ def update_task(task_id):
         return jsonify({'code': 400, 'message': '请先停止任务'}), 400
     
     data = request.json
+    error = _check_api_config(data.get('api_config'))
+    if error:
+        return jsonify({'code': 400, 'message': error}), 400
+    
     Task.update(task_id, **data)
     
     return jsonify({
@@ -175,6 +220,87 @@ def get_task_status(task_id):
         'data': status
     })
 
+@tasks_bp.route('/<int:task_id>/dead-letters', methods=['GET'])
+def get_dead_letters(task_id):
+    """获取任务推送失败（超过最长重试时间）的死信"""
+    page = request.args.get('page', 1, type=int)
+    page_size = request.args.get('page_size', 50, type=int)
+    
+    letters = DeadLetter.get_by_task(task_id, page, page_size)
+    total = DeadLetter.count_by_task(task_id)
+    
+    return jsonify({
+        'code': 200,
+        'data': {
+            'dead_letters': letters,
+            'total': total,
+            'page': page,
+            'page_size': page_size,
+            'total_pages': (total + page_size - 1) // page_size
+        }
+    })
+
+@tasks_bp.route('/<int:task_id>/dead-letters/replay', methods=['POST'])
+def replay_dead_letters(task_id):
+    """重放死信：放回推送发件箱重新推送（可指定 ids，不指定时重放该任务全部死信）"""
+    task = Task.get_by_id(task_id)
+    
+    if not task:
+        return jsonify({'code': 404, 'message': '任务不存在'}), 404
+    
+    data = request.json or {}
+    count = DeadLetter.replay(task_id, data.get('ids'))
+    if count:
+        outbox_dispatcher.notify()
+    
+    return jsonify({
+        'code': 200,
+        'message': f'已重放 {count} 条消息',
+        'data': {'replayed': count}
+    })
+
+@tasks_bp.route('/ingest-metrics', methods=['GET'])
+def get_ingest_metrics():
+    """获取实时消息入库队列指标（队列深度、延迟、丢弃/溢出数）"""
+    return jsonify({
+        'code': 200,
+        'data': ingest_pipeline.metrics()
+    })
+
+@tasks_bp.route('/push-stats', methods=['GET'])
+def get_push_stats():
+    """获取API推送状态（推送客户端的进行中/成功/失败数、各推送地址的并发占用和熔断状态，发件箱积压和死信数）"""
+    return jsonify({
+        'code': 200,
+        'data': {
+            **push_client.stats(),
+            'outbox': outbox_dispatcher.stats()
+        }
+    })
+
+@tasks_bp.route('/push-circuits', methods=['GET'])
+def get_push_circuits():
+    """获取各推送地址的熔断状态（closed/open/half_open）、自适应并发上限和最近的异常比例"""
+    return jsonify({
+        'code': 200,
+        'data': push_client.circuit_stats()
+    })
+
+@tasks_bp.route('/rate-limits', methods=['GET'])
+def get_rate_limits():
+    """获取各账号Telegram调用限速状态（当前速率、FloodWait次数、剩余暂停时间）"""
+    return jsonify({
+        'code': 200,
+        'data': telegram_service.rate_limiter.stats()
+    })
+
+@tasks_bp.route('/entity-cache', methods=['GET'])
+def get_entity_cache_stats():
+    """获取用户名/链接解析缓存的命中统计"""
+    return jsonify({
+        'code': 200,
+        'data': telegram_service.entity_cache.stats()
+    })
 
 @tasks_bp.route('/available-accounts', methods=['GET'])
 def get_available_accounts():
@@ -185,14 +311,10 @@ def get_available_accounts():
         
         for account in accounts:
             # 检查登录状态
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                is_logged_in = loop.run_until_complete(
-                    telegram_service.is_logged_in(account['id'])
-                )
-            finally:
-                loop.close()
+            is_logged_in = telegram_service.run(
+                account['id'],
+                telegram_service.is_logged_in(account['id'])
+            )
             
             if is_logged_in:
                 available_accounts.append({
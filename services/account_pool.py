@@ -0,0 +1,92 @@
+import asyncio
+import socket
+from telethon.errors import FloodWaitError
+from config import Config
+from database.models import Account
+from services.telegram_service import telegram_service
+
+def is_account_error(error):
+    """判断异常是否由账号本身引起（限流、断线、客户端不可用），这类错误换账号重试可能成功"""
+    while error is not None:
+        if isinstance(error, (FloodWaitError, ConnectionError, socket.timeout, asyncio.TimeoutError)):
+            return True
+        if '客户端未初始化' in str(error):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+class AccountPool:
+    """
+    多账号执行池 - 记录本次任务中每个账号的健康度
+    账号领取下一项工作前需等待：剩余FloodWait时间与按健康度计算的退避取较大者；
+    连续账号级失败过多的账号在本次任务中停用，其工作由其他账号接手
+    """
+    
+    def __init__(self, account_ids):
+        self.account_ids = list(account_ids)
+        self.states = {
+            account_id: {'health': 1.0, 'failures': 0, 'disabled': False, 'succeeded': 0, 'failed': 0}
+            for account_id in self.account_ids
+        }
+    
+    @classmethod
+    async def create(cls, account_id, multi_account=False):
+        """创建账号池：单账号模式只包含任务账号，多账号模式包含所有已登录账号（任务账号优先）"""
+        if not multi_account:
+            return cls([account_id])
+        
+        candidates = [account_id] + [
+            account['id'] for account in Account.get_all() if account['id'] != account_id
+        ]
+        
+        async def check(candidate):
+            try:
+                return await telegram_service.is_logged_in(candidate)
+            except Exception:
+                return False
+        
+        logged_in = await asyncio.gather(*(check(candidate) for candidate in candidates))
+        return cls([candidate for candidate, ok in zip(candidates, logged_in) if ok])
+    
+    @property
+    def active(self):
+        """未停用的账号"""
+        return [account_id for account_id in self.account_ids if not self.states[account_id]['disabled']]
+    
+    def wait_time(self, account_id, method):
+        """账号领取下一项工作前需要等待的秒数，账号已停用时返回None"""
+        state = self.states[account_id]
+        if state['disabled']:
+            return None
+        # 有其他账号可用时，健康度低的账号延后领取，把工作让给健康的账号
+        backoff = (1 - state['health']) * Config.ACCOUNT_POOL_BACKOFF if len(self.active) > 1 else 0
+        return max(telegram_service.rate_limiter.blocked_for(account_id, method), backoff)
+    
+    def record_success(self, account_id):
+        """记录一次成功，逐步恢复健康度"""
+        state = self.states[account_id]
+        state['health'] += (1 - state['health']) * 0.2
+        state['failures'] = 0
+        state['succeeded'] += 1
+    
+    def record_failure(self, account_id, error):
+        """记录一次失败，返回是否为账号级错误（需要转移给其他账号）"""
+        state = self.states[account_id]
+        state['failed'] += 1
+        if not is_account_error(error):
+            return False
+        
+        state['health'] = max(0.1, state['health'] / 2)
+        state['failures'] += 1
+        # 只剩一个账号时不停用，避免任务无账号可用
+        if state['failures'] >= Config.ACCOUNT_POOL_MAX_FAILURES and len(self.active) > 1:
+            state['disabled'] = True
+            print(f"[账号池] 账号{account_id}连续失败{state['failures']}次，本次任务停用")
+        return True
+    
+    def stats(self):
+        """各账号的健康度和成功/失败数"""
+        return {
+            account_id: {**state, 'health': round(state['health'], 2)}
+            for account_id, state in self.states.items()
+        }
@@ -1,112 +1,64 @@
 import requests
-import time
+import threading
+from requests.adapters import HTTPAdapter
 from config import Config
-from database.models import APILog
+
+_session = None
+_session_lock = threading.Lock()
 
 class APIService:
-    """API推送服务"""
-    
-    @staticmethod
-    def push_data(message, api_config, task_id, message_id=None):
-        """推送数据到外部API"""
-        if not api_config or not api_config.get('url'):
-            return False
-        
-        url = api_config['url']
-        method = api_config.get('method', 'POST').upper()
-        param_mapping = api_config.get('param_mapping', {})
-        
-        # 构建请求数据
-        request_data = APIService._build_request_data(message, param_mapping)
-        
-        # 发送请求（带重试）
-        success, status_code, response = APIService._send_with_retry(
-            url, method, request_data
-        )
-        
-        # 记录日志
-        APILog.create(
-            task_id=task_id,
-            message_id=message_id,
-            url=url,
-            method=method,
-            request_data=request_data,
-            status_code=status_code,
-            response=response,
-            success=success
-        )
-        
-        return success
+    """API推送的HTTP会话和单次请求（推送、重试和日志见 PushClient）"""
     
     @staticmethod
-    def _build_request_data(message, param_mapping):
-        """构建请求数据"""
-        data = {}
-        
-        # 默认映射
-        default_mapping = {
-            'content': 'content',
-            'sender_id': 'sender_id',
-            'sender_name': 'sender_name',
-            'message_date': 'message_date',
-            'media_type': 'media_type'
-        }
-        
-        # 合并用户自定义映射
-        mapping = {**default_mapping, **param_mapping}
-        
-        # 映射数据
-        for source_key, target_key in mapping.items():
-            if source_key in message:
-                value = message[source_key]
-                # 处理日期时间
-                if hasattr(value, 'isoformat'):
-                    value = value.isoformat()
-                data[target_key] = value
-        
-        return data
+    def session():
+        """共享的HTTP会话：连接池复用TCP/TLS连接（keep-alive），池大小与推送总并发一致"""
+        global _session
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_maxsize=Config.API_CONCURRENCY_TOTAL)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+            return _session
     
     @staticmethod
-    def _send_with_retry(url, method, data):
-        """发送请求（带重试机制）"""
-        max_retries = Config.API_MAX_RETRIES
-        retry_delays = Config.API_RETRY_DELAY
+    def _send_once(url, method, data, headers=None):
+        """
+        发送一次请求，返回 (是否成功, 状态码, 响应内容)
+        data 为已编码的请求体（bytes，headers 中带 Content-Type，见 services.payload）时原样发送，
+        否则GET作为查询参数、POST作为JSON发送
+        """
+        session = APIService.session()
+        try:
+            if isinstance(data, bytes):
+                response = session.request(
+                    method,
+                    url,
+                    data=data,
+                    headers=headers,
+                    timeout=Config.API_TIMEOUT
+                )
+            elif method == 'GET':
+                response = session.get(
+                    url,
+                    params=data,
+                    headers=headers,
+                    timeout=Config.API_TIMEOUT
+                )
+            else:  # POST
+                response = session.post(
+                    url,
+                    json=data,
+                    headers=headers,
+                    timeout=Config.API_TIMEOUT
+                )
+            
+            # 4xx或5xx视为失败
+            return response.status_code < 400, response.status_code, response.text
         
-        for attempt in range(max_retries):
-            try:
-                if method == 'GET':
-                    response = requests.get(
-                        url,
-                        params=data,
-                        timeout=Config.API_TIMEOUT
-                    )
-                else:  # POST
-                    response = requests.post(
-                        url,
-                        json=data,
-                        timeout=Config.API_TIMEOUT
-                    )
-                
-                # 检查响应状态
-                if response.status_code < 400:
-                    return True, response.status_code, response.text
-                else:
-                    # 4xx或5xx错误
-                    if attempt < max_retries - 1:
-                        time.sleep(retry_delays[attempt])
-                        continue
-                    return False, response.status_code, response.text
-                    
-            except requests.exceptions.Timeout:
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delays[attempt])
-                    continue
-                return False, None, 'Request timeout'
-                
-            except requests.exceptions.RequestException as e:
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delays[attempt])
-                    continue
-                return False, None, str(e)
+        except requests.exceptions.Timeout:
+            return False, None, 'Request timeout'
         
-        return False, None, 'Max retries exceeded'
+        except requests.exceptions.RequestException as e:
+            return False, None, str(e)
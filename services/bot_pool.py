@@ -0,0 +1,80 @@
+import asyncio
+from config import Config
+from services.account_pool import is_account_error
+
+def parse_bots(bot_username):
+    """解析任务的机器人配置：多个机器人用逗号或换行分隔，按出现顺序去重"""
+    bots = {}
+    for bot in (bot_username or '').replace('\n', ',').split(','):
+        bot = bot.strip()
+        if bot:
+            bots.setdefault(bot.lstrip('@').lower(), bot)
+    return list(bots.values())
+
+class BotPool:
+    """
+    搜索机器人池 - 分别记录每个机器人的搜索结果和响应情况
+    同一账号对同一机器人的两次发送之间至少间隔 BOT_MIN_INTERVAL 秒；
+    连续无回复/出错过多的机器人判定为失效，剩余关键词自动跳过
+    """
+    
+    def __init__(self, bots):
+        self.bots = list(bots)
+        self.states = {
+            bot: {
+                'searched': 0, 'failed': 0, 'skipped': 0, 'links': 0, 'new_links': 0,
+                'latency': 0.0, 'failures': 0, 'disabled': False, 'last_error': None
+            }
+            for bot in self.bots
+        }
+        self._seen = set()
+        self._next_send = {}  # {(bot, account_id): 下次允许发送的时间}
+    
+    def is_disabled(self, bot):
+        return self.states[bot]['disabled']
+    
+    async def pace(self, bot, account_id):
+        """按机器人限速：等到该账号可以再次向该机器人发送"""
+        loop = asyncio.get_running_loop()
+        key = (bot, account_id)
+        wait = self._next_send.get(key, 0) - loop.time()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self._next_send[key] = loop.time() + Config.BOT_MIN_INTERVAL
+    
+    def record_success(self, bot, links, latency):
+        """记录一次搜索结果，返回其中首次出现（其他机器人/关键词都未找到过）的链接数"""
+        state = self.states[bot]
+        new_links = [link for link in links if link not in self._seen]
+        self._seen.update(new_links)
+        state['latency'] += latency
+        state['searched'] += 1
+        state['links'] += len(links)
+        state['new_links'] += len(new_links)
+        state['failures'] = 0
+        return len(new_links)
+    
+    def record_failure(self, bot, error):
+        """记录一次失败；账号级错误（限流、断线）不计入机器人"""
+        if is_account_error(error):
+            return
+        state = self.states[bot]
+        state['failed'] += 1
+        state['failures'] += 1
+        state['last_error'] = str(error)
+        if state['failures'] >= Config.BOT_POOL_MAX_FAILURES and not state['disabled']:
+            state['disabled'] = True
+            print(f"[机器人池] {bot} 连续失败{state['failures']}次，跳过剩余关键词")
+    
+    def record_skipped(self, bot):
+        self.states[bot]['skipped'] += 1
+    
+    def stats(self):
+        """各机器人的搜索数、链接数、平均响应时间和状态"""
+        return {
+            bot: {
+                **{key: value for key, value in state.items() if key != 'latency'},
+                'avg_latency': round(state['latency'] / state['searched'], 2) if state['searched'] else None
+            }
+            for bot, state in self.states.items()
+        }
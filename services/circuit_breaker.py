@@ -0,0 +1,144 @@
+import time
+from collections import deque
+from config import Config
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+# 熔断期间未发送的请求返回的响应内容（状态码为None）
+CIRCUIT_OPEN = 'Circuit open'
+
+def is_endpoint_failure(status_code, latency):
+    """推送地址本身异常：超时/连接失败、5xx、429 或响应过慢；其他4xx是请求数据的问题，不计入"""
+    return (
+        status_code is None or status_code >= 500 or status_code == 429
+        or latency >= Config.CIRCUIT_SLOW_CALL
+    )
+
+class CircuitBreaker:
+    """
+    单个推送地址的熔断器和自适应并发上限（AIMD）
+    
+    closed：正常放行；最近 CIRCUIT_WINDOW 秒内请求数不少于 CIRCUIT_MIN_REQUESTS 且异常比例达到
+    CIRCUIT_ERROR_RATE 时熔断
+    open：CIRCUIT_OPEN_SECONDS 秒内不发送请求，之后进入 half_open
+    half_open：只放行 CIRCUIT_HALF_OPEN_PROBES 个试探请求，成功则恢复，失败或超过
+    CIRCUIT_HALF_OPEN_TIMEOUT 秒仍没有结果则重新熔断
+    
+    并发上限：出现异常时减半（同一批在途请求只减一次），每连续成功"当前上限"次加一，
+    在 API_CONCURRENCY_MIN 和 max_limit 之间调整
+    只在推送loop中使用（单线程访问，无需加锁）
+    """
+    
+    def __init__(self, limiter, max_limit):
+        self.limiter = limiter  # 该推送地址的 ConcurrencyLimiter
+        self.max_limit = max_limit
+        self.min_limit = min(Config.API_CONCURRENCY_MIN, max_limit)
+        self.state = CLOSED
+        self.open_until = 0
+        self.half_opened_at = 0
+        self.probes = 0
+        self.window = deque()  # [(完成时间, 是否异常)]
+        self.window_failures = 0
+        self.successes = 0
+        self.decreased_at = 0
+        self.trips = 0
+        self.rejected = 0
+        self.last_error = None
+    
+    def retry_after(self):
+        """熔断中还需等待的秒数（0表示可以尝试发送）"""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.open_until - time.monotonic())
+    
+    def allow(self):
+        """发送前调用：是否放行（half_open 时占用一个试探名额）"""
+        if self.state == OPEN:
+            if time.monotonic() < self.open_until:
+                self.rejected += 1
+                return False
+            self.state = HALF_OPEN
+            self.half_opened_at = time.monotonic()
+            self.probes = 0
+        if self.state == HALF_OPEN:
+            if self.probes >= Config.CIRCUIT_HALF_OPEN_PROBES:
+                if time.monotonic() - self.half_opened_at >= Config.CIRCUIT_HALF_OPEN_TIMEOUT:
+                    # 试探请求迟迟没有结果：重新熔断，到期后重新试探
+                    self.last_error = 'half-open probe timeout'
+                    self._trip(time.monotonic())
+                self.rejected += 1
+                return False
+            self.probes += 1
+        return True
+    
+    def release_probe(self, started):
+        """已放行的请求被取消（没有结果）时调用：归还 half_open 的试探名额"""
+        if self.state == HALF_OPEN and started >= self.half_opened_at:
+            self.probes = max(0, self.probes - 1)
+    
+    def record(self, started, status_code, latency, error=None):
+        """请求完成后调用：started 为开始发送的 time.monotonic()"""
+        now = time.monotonic()
+        failed = is_endpoint_failure(status_code, latency)
+        if failed:
+            self.last_error = f'{status_code}: {error}'[:200] if status_code else str(error)[:200]
+        self._adjust_limit(started, now, failed)
+        
+        if self.state == HALF_OPEN:
+            if started < self.half_opened_at:
+                return  # 熔断前发出的请求，不作为试探结果
+            self.probes -= 1
+            if failed:
+                self._trip(now)
+            else:
+                self._close()
+        elif self.state == CLOSED:
+            self.window.append((now, failed))
+            self.window_failures += failed
+            while self.window[0][0] < now - Config.CIRCUIT_WINDOW:
+                self.window_failures -= self.window.popleft()[1]
+            if (len(self.window) >= Config.CIRCUIT_MIN_REQUESTS
+                    and self.window_failures / len(self.window) >= Config.CIRCUIT_ERROR_RATE):
+                self._trip(now)
+    
+    def _adjust_limit(self, started, now, failed):
+        limit = self.limiter.limit
+        if failed:
+            self.successes = 0
+            if started >= self.decreased_at and limit > self.min_limit:
+                self.limiter.set_limit(max(self.min_limit, limit // 2))
+                self.decreased_at = now
+        else:
+            self.successes += 1
+            if limit < self.max_limit and self.successes >= limit:
+                self.limiter.set_limit(limit + 1)
+                self.successes = 0
+    
+    def _trip(self, now):
+        self.state = OPEN
+        self.open_until = now + Config.CIRCUIT_OPEN_SECONDS
+        self.window.clear()
+        self.window_failures = 0
+        self.trips += 1
+        print(f"[熔断] 推送地址异常，暂停 {Config.CIRCUIT_OPEN_SECONDS} 秒: {self.last_error}")
+    
+    def _close(self):
+        self.state = CLOSED
+        self.window.clear()
+        self.window_failures = 0
+    
+    def stats(self):
+        window = len(self.window)
+        return {
+            'state': self.state,
+            'retry_after': round(self.retry_after(), 1),
+            'limit': self.limiter.limit,
+            'max_limit': self.max_limit,
+            'active': self.limiter.active,
+            'waiting': self.limiter.waiting,
+            'window_requests': window,
+            'error_rate': round(self.window_failures / window, 2) if window else 0.0,
+            'trips': self.trips,
+            'rejected': self.rejected,
+            'last_error': self.last_error
+        }
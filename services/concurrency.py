@@ -0,0 +1,114 @@
+import asyncio
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+
+class ConcurrencyLimiter:
+    """
+    异步信号量 - 可在多个线程的多个event loop之间共享
+    （asyncio.Semaphore 只能在创建它的loop中使用，而每个任务运行在各自线程的loop上）
+    """
+    
+    def __init__(self, limit):
+        self.limit = max(int(limit), 1)
+        self.active = 0
+        self._waiters = deque()  # [[loop, future, 是否已获得名额]]
+        self._lock = threading.Lock()
+    
+    async def acquire(self):
+        """获取一个名额，名额用完时排队等待（先到先得）"""
+        with self._lock:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                return
+            loop = asyncio.get_running_loop()
+            waiter = [loop, loop.create_future(), False]
+            self._waiters.append(waiter)
+        
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = waiter[2]
+                if not granted:
+                    self._waiters.remove(waiter)
+            if granted:
+                # 取消时名额已转交过来，继续转交给下一个等待者
+                self.release()
+            raise
+    
+    def release(self):
+        """释放名额，有等待者时直接转交（上限调低后运行数超出上限时不转交）"""
+        with self._lock:
+            if not self._waiters or self.active > self.limit:
+                self.active -= 1
+                return
+            waiter = self._waiters.popleft()
+            waiter[2] = True
+        loop, future = waiter[0], waiter[1]
+        loop.call_soon_threadsafe(self._wake, future)
+    
+    def set_limit(self, limit):
+        """调整名额上限：调高时立即放行排队者，调低时等运行中的释放后生效"""
+        granted = []
+        with self._lock:
+            self.limit = max(int(limit), 1)
+            while self._waiters and self.active < self.limit:
+                waiter = self._waiters.popleft()
+                waiter[2] = True
+                self.active += 1
+                granted.append(waiter)
+        for loop, future, _ in granted:
+            loop.call_soon_threadsafe(self._wake, future)
+    
+    @staticmethod
+    def _wake(future):
+        if not future.done():
+            future.set_result(None)
+    
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+    
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+class KeyedConcurrencyLimiter:
+    """按key（如账号）分别限制并发数，同时受一个全局总并发上限约束"""
+    
+    def __init__(self, per_key, total):
+        self.per_key = per_key
+        self.total = ConcurrencyLimiter(total)
+        self._limiters = {}
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """获取key对应的限制器"""
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = self._limiters[key] = ConcurrencyLimiter(self.per_key)
+            return limiter
+    
+    @asynccontextmanager
+    async def slot(self, key):
+        """先占用key的名额再占用全局名额，避免已满的key排队时占住全局名额"""
+        async with self.get(key):
+            async with self.total:
+                yield
+    
+    def stats(self):
+        """各key及全局的运行/排队数"""
+        with self._lock:
+            limiters = dict(self._limiters)
+        return {
+            'total': {'active': self.total.active, 'waiting': self.total.waiting, 'limit': self.total.limit},
+            'keys': {
+                key: {'active': limiter.active, 'waiting': limiter.waiting, 'limit': limiter.limit}
+                for key, limiter in limiters.items()
+            }
+        }
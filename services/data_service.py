@@ -1,19 +1,24 @@
 import csv
+import io
 import json
-import os
 from datetime import datetime, timedelta
-from database.models import Group, Message
+from database.models import Group, Message, keyset_page
 from config import Config
 
 class DataService:
     """数据管理服务"""
     
     @staticmethod
-    def get_groups(filters=None, page=1, page_size=None):
-        """获取群组列表"""
+    def get_groups(filters=None, page=1, page_size=None, cursor=None, include_total=True):
+        """获取群组列表（cursor 不为 None 时使用游标分页）"""
         if page_size is None:
             page_size = Config.PAGE_SIZE
         
+        if cursor is not None:
+            rows = Group.get_all(filters, page_size=page_size + 1, cursor=cursor)
+            total = Group.count(filters) if include_total else None
+            return DataService._cursor_result(rows, page_size, 'created_at', total)
+        
         groups = Group.get_all(filters, page, page_size)
         total = Group.count(filters)
         
@@ -26,11 +31,16 @@ class DataService:
         }
     
     @staticmethod
-    def get_messages(filters=None, page=1, page_size=None):
-        """获取消息列表"""
+    def get_messages(filters=None, page=1, page_size=None, cursor=None, include_total=True):
+        """获取消息列表（cursor 不为 None 时使用游标分页）"""
         if page_size is None:
             page_size = Config.PAGE_SIZE
         
+        if cursor is not None:
+            rows = Message.get_all(filters, page_size=page_size + 1, cursor=cursor)
+            total = Message.count(filters) if include_total else None
+            return DataService._cursor_result(rows, page_size, 'message_date', total)
+        
         messages = Message.get_all(filters, page, page_size)
         total = Message.count(filters)
         
@@ -42,6 +52,20 @@ class DataService:
             'total_pages': (total + page_size - 1) // page_size
         }
     
+    @staticmethod
+    def _cursor_result(rows, page_size, sort_key, total=None):
+        """构建游标分页结果，total 为 None 表示未统计总数"""
+        data, next_cursor = keyset_page(rows, page_size, sort_key)
+        result = {
+            'data': data,
+            'page_size': page_size,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
+        }
+        if total is not None:
+            result['total'] = total
+        return result
+    
     @staticmethod
     def search(keyword, filters=None):
         """搜索数据"""
@@ -53,8 +77,8 @@ class DataService:
         # 搜索群组
         groups = Group.get_all(filters, page=1, page_size=20)
         
-        # 搜索消息
-        messages = Message.get_all(filters, page=1, page_size=20)
+        # 搜索消息（按相关度排序，带高亮摘要）
+        messages = Message.get_all(filters, page=1, page_size=20, order_by='rank')
         
         return {
             'groups': groups,
@@ -63,20 +87,26 @@ class DataService:
     
     @staticmethod
     def export_data(data_type, format_type, filters=None):
-        """导出数据"""
+        """导出数据，返回 (内容生成器, 文件名, MIME类型)，参数无效时返回None"""
         if data_type == 'groups':
-            data = Group.get_all(filters, page=1, page_size=10000)
+            rows = Group.iter_all(filters, chunk_size=Config.EXPORT_CHUNK_SIZE)
         elif data_type == 'messages':
-            data = Message.get_all(filters, page=1, page_size=10000)
+            rows = Message.iter_all(filters, chunk_size=Config.EXPORT_CHUNK_SIZE)
         else:
             return None
         
-        if format_type == 'csv':
-            return ExportService.to_csv(data, data_type)
-        elif format_type == 'json':
-            return ExportService.to_json(data, data_type)
-        else:
+        writers = {
+            'csv': (ExportService.iter_csv, 'text/csv; charset=utf-8'),
+            'json': (ExportService.iter_json, 'application/json; charset=utf-8'),
+            'ndjson': (ExportService.iter_ndjson, 'application/x-ndjson; charset=utf-8')
+        }
+        if format_type not in writers:
             return None
+        
+        writer, mimetype = writers[format_type]
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = f'{data_type}_{timestamp}.{format_type}'
+        return writer(rows, data_type), filename, mimetype
     
     @staticmethod
     def get_statistics():
@@ -84,52 +114,72 @@ class DataService:
         return StatisticsService.get_all_stats()
 
 class ExportService:
-    """导出服务"""
+    """导出服务 - 以生成器流式输出，内存占用与结果大小无关"""
+    
+    # 每输出多少行产出一次数据块
+    FLUSH_ROWS = 500
+    
+    @staticmethod
+    def _json_serial(obj):
+        """处理日期时间"""
+        if isinstance(obj, datetime):
+            return obj.isoformat()
+        raise TypeError(f"Type {type(obj)} not serializable")
     
     @staticmethod
-    def to_csv(data, data_type):
+    def iter_csv(rows, data_type):
         """导出为CSV"""
-        if not data:
-            return None
-        
-        # 创建临时文件
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'{data_type}_{timestamp}.csv'
-        filepath = os.path.join('data', filename)
-        
-        with open(filepath, 'w', newline='', encoding='utf-8-sig') as f:
-            if data_type == 'groups':
-                fieldnames = ['id', 'title', 'username', 'description', 'member_count', 'created_at']
-            else:  # messages
-                fieldnames = ['id', 'group_title', 'sender_name', 'content', 'media_type', 'message_date']
-            
-            writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
-            writer.writeheader()
-            writer.writerows(data)
-        
-        return filepath
+        if data_type == 'groups':
+            fieldnames = ['id', 'title', 'username', 'description', 'member_count', 'created_at']
+        else:  # messages
+            fieldnames = ['id', 'group_title', 'sender_name', 'content', 'media_type', 'message_date']
+        
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction='ignore')
+        # 带BOM，方便Excel识别UTF-8
+        buffer.write('\ufeff')
+        writer.writeheader()
+        yield buffer.getvalue()
+        
+        count = 0
+        for row in rows:
+            if count == 0:
+                buffer.seek(0)
+                buffer.truncate()
+            writer.writerow(row)
+            count += 1
+            if count >= ExportService.FLUSH_ROWS:
+                yield buffer.getvalue()
+                count = 0
+        if count:
+            yield buffer.getvalue()
     
     @staticmethod
-    def to_json(data, data_type):
-        """导出为JSON"""
-        if not data:
-            return None
-        
-        # 创建临时文件
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'{data_type}_{timestamp}.json'
-        filepath = os.path.join('data', filename)
-        
-        # 处理日期时间
-        def json_serial(obj):
-            if isinstance(obj, datetime):
-                return obj.isoformat()
-            raise TypeError(f"Type {type(obj)} not serializable")
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2, default=json_serial)
-        
-        return filepath
+    def iter_ndjson(rows, data_type):
+        """导出为NDJSON（每行一个JSON对象）"""
+        chunk = []
+        for row in rows:
+            chunk.append(json.dumps(row, ensure_ascii=False, default=ExportService._json_serial))
+            if len(chunk) >= ExportService.FLUSH_ROWS:
+                yield '\n'.join(chunk) + '\n'
+                chunk = []
+        if chunk:
+            yield '\n'.join(chunk) + '\n'
+    
+    @staticmethod
+    def iter_json(rows, data_type):
+        """导出为JSON数组"""
+        yield '['
+        separator = '\n'
+        chunk = []
+        for row in rows:
+            chunk.append(separator + json.dumps(row, ensure_ascii=False, default=ExportService._json_serial))
+            separator = ',\n'
+            if len(chunk) >= ExportService.FLUSH_ROWS:
+                yield ''.join(chunk)
+                chunk = []
+        chunk.append('\n]\n')
+        yield ''.join(chunk)
 
 class StatisticsService:
     """统计服务"""
@@ -148,27 +198,23 @@ class StatisticsService:
         """获取每日统计"""
         from database.db import Database
         
-        # 最近7天的消息统计
+        # 最近7天的消息统计（读取按天汇总表）
         query = '''
-            SELECT DATE(message_date) as date, COUNT(*) as count
-            FROM messages
-            WHERE message_date >= datetime('now', '-7 days')
-            GROUP BY DATE(message_date)
+            SELECT date, SUM(count) as count
+            FROM stats_daily
+            WHERE date >= DATE('now', '-7 days')
+            GROUP BY date
             ORDER BY date
         '''
         
         results = Database.fetchall(query)
+        counts = {row['date']: row['count'] for row in results}
         
         # 填充缺失的日期
         stats = []
         for i in range(7):
             date = (datetime.now() - timedelta(days=6-i)).strftime('%Y-%m-%d')
-            count = 0
-            for row in results:
-                if row['date'] == date:
-                    count = row['count']
-                    break
-            stats.append({'date': date, 'count': count})
+            stats.append({'date': date, 'count': counts.get(date, 0)})
         
         return stats
     
@@ -178,10 +224,9 @@ class StatisticsService:
         from database.db import Database
         
         query = '''
-            SELECT g.title, COUNT(m.id) as message_count
+            SELECT g.title, COALESCE(t.count, 0) as message_count
             FROM groups g
-            LEFT JOIN messages m ON g.id = m.group_id
-            GROUP BY g.id
+            LEFT JOIN stats_group_totals t ON g.id = t.group_id
             ORDER BY message_count DESC
             LIMIT 10
         '''
@@ -194,9 +239,9 @@ class StatisticsService:
         from database.db import Database
         
         query = '''
-            SELECT media_type, COUNT(*) as count
-            FROM messages
-            GROUP BY media_type
+            SELECT media_type, count
+            FROM stats_media_types
+            WHERE count > 0
             ORDER BY count DESC
         '''
         
@@ -0,0 +1,113 @@
+import threading
+from telethon.tl.types import Channel, Chat, InputPeerUser, InputPeerChannel, InputPeerChat
+from telethon.errors import (
+    UsernameNotOccupiedError, UsernameInvalidError, InviteHashExpiredError, InviteHashInvalidError
+)
+from config import Config
+from database.models import ResolvedEntity
+from services.link_extractor import parse_link
+
+# 说明链接/用户名不存在的错误，结果做负缓存
+NOT_FOUND_ERRORS = (
+    UsernameNotOccupiedError, UsernameInvalidError, InviteHashExpiredError, InviteHashInvalidError
+)
+
+def is_not_found(error):
+    """
+    是否为链接/用户名不存在的错误
+    get_entity 的 ValueError 还用于未加入的私有频道、会话缓存中没有的实体等有效目标，只认用户名不存在的那种
+    """
+    if isinstance(error, NOT_FOUND_ERRORS):
+        return True
+    return isinstance(error, ValueError) and str(error).startswith('No user has ')
+
+class EntityCache:
+    """
+    实体解析缓存 - 用户名/链接 → (id, access_hash, 类型, 标题)，持久化到数据库
+    access_hash 只对获取它的账号有效，因此按账号分别缓存；不存在的链接按较短的TTL负缓存
+    """
+    
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def normalize(target):
+        """规范化缓存key：username:小写用户名 或 invite:hash（hash区分大小写）"""
+        parsed = parse_link(target)
+        if parsed:
+            return f'{parsed[0]}:{parsed[1]}'
+        return f'username:{target.strip().lstrip("@").lower()}'
+    
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+    
+    def get(self, account_id, target):
+        """
+        查询缓存：命中返回记录（resolved=0 表示链接不存在），未命中返回None
+        """
+        record = ResolvedEntity.get(account_id, self.normalize(target))
+        if record is None:
+            self._count('misses')
+        elif record['resolved']:
+            self._count('hits')
+        else:
+            self._count('negative_hits')
+        return record
+    
+    def store(self, account_id, target, entity):
+        """缓存解析结果，返回与缓存记录同格式的dict"""
+        if isinstance(entity, Channel):
+            entity_type = 'channel'
+        elif isinstance(entity, Chat):
+            entity_type = 'chat'
+        else:
+            entity_type = 'user'
+        
+        record = {
+            'resolved': True,
+            'entity_id': entity.id,
+            'access_hash': getattr(entity, 'access_hash', None),
+            'entity_type': entity_type,
+            'title': getattr(entity, 'title', None) or getattr(entity, 'first_name', None),
+            'username': getattr(entity, 'username', None),
+            'member_count': getattr(entity, 'participants_count', None),
+            # 频道/超级群 left=False 表示已是成员；普通群组能解析到即为成员
+            'joined': not getattr(entity, 'left', entity_type == 'user')
+        }
+        ResolvedEntity.save(account_id, self.normalize(target), Config.ENTITY_CACHE_TTL, **record)
+        return record
+    
+    def store_missing(self, account_id, target, error):
+        """负缓存不存在/已失效的链接"""
+        ResolvedEntity.save(
+            account_id, self.normalize(target), Config.ENTITY_CACHE_NEGATIVE_TTL,
+            resolved=False, error=str(error)
+        )
+    
+    @staticmethod
+    def mark_joined(account_id, entity_id):
+        """记录账号已加入该群组/频道，之后不再重复加入"""
+        ResolvedEntity.set_joined(account_id, entity_id)
+    
+    @staticmethod
+    def input_peer(record):
+        """由缓存记录构造InputPeer，可直接传给Telethon的各个方法而不再解析"""
+        if record['entity_type'] == 'channel':
+            return InputPeerChannel(record['entity_id'], record['access_hash'])
+        if record['entity_type'] == 'chat':
+            return InputPeerChat(record['entity_id'])
+        return InputPeerUser(record['entity_id'], record['access_hash'])
+    
+    def stats(self):
+        """命中/未命中计数"""
+        lookups = self.hits + self.misses + self.negative_hits
+        return {
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0
+        }
@@ -0,0 +1,309 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from config import Config
+from database.models import Message
+from services.outbox import outbox_dispatcher
+
+class BufferedWriter:
+    """缓冲写入器 - 累积记录，按条数或时间阈值批量写入数据库"""
+    
+    def __init__(self, write_many, on_flush=None, batch_size=None, flush_interval=None):
+        """
+        write_many: 批量写入函数（如 Message.create_many），返回与输入一一对应的新记录ID
+        on_flush: 每次写入后以 [(记录, 新ID), ...] 调用，只包含新插入的记录
+        """
+        self.write_many = write_many
+        self.on_flush = on_flush
+        self.batch_size = batch_size or Config.INGEST_BATCH_SIZE
+        self.flush_interval = Config.INGEST_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self._items = []
+        self._lock = threading.RLock()
+        self._timer = None
+    
+    def add(self, item):
+        """添加一条记录，达到条数阈值时立即写入并返回新插入的记录"""
+        with self._lock:
+            self._items.append(item)
+            full = len(self._items) >= self.batch_size
+            if not full and self._timer is None and self.flush_interval:
+                # 首条记录进入缓冲时开始计时，超时后由定时线程写入
+                self._timer = threading.Timer(self.flush_interval, self._flush_on_timer)
+                self._timer.daemon = True
+                self._timer.start()
+        
+        if full:
+            return self.flush()
+        return []
+    
+    def flush(self):
+        """写入缓冲中的全部记录，返回 [(记录, 新ID), ...]"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            
+            items, self._items = self._items, []
+            if not items:
+                return []
+            
+            try:
+                ids = self.write_many(items)
+            except Exception:
+                # 写入失败时放回缓冲，等待下次重试
+                self._items = items + self._items
+                raise
+        
+        inserted = [(item, new_id) for item, new_id in zip(items, ids) if new_id]
+        if self.on_flush and inserted:
+            self.on_flush(inserted)
+        return inserted
+    
+    def _flush_on_timer(self):
+        """定时写入"""
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"批量写入失败: {str(e)}")
+    
+    def __len__(self):
+        return len(self._items)
+
+class IngestPipeline:
+    """
+    实时消息入库/推送管道 - 监听回调只负责入队，不在Telethon的event loop上做阻塞操作
+    
+    入库队列（有界）→ 入库协程批量写库，配置了API的新消息在同一事务中写入推送发件箱（由 outbox_dispatcher 推送）
+    入库队列满时按 backpressure 策略处理：block（等待）、drop_oldest（丢弃最旧）、spill（溢出到磁盘）
+    写库失败时按 INGEST_RETRY_DELAY 重试，仍失败的批次写入溢出文件，稍后重新入库
+    """
+    
+    POLICIES = ('block', 'drop_oldest', 'spill')
+    
+    def __init__(self, maxsize=None, backpressure=None, spill_path=None):
+        self.maxsize = maxsize or Config.INGEST_QUEUE_SIZE
+        self.backpressure = backpressure or Config.INGEST_BACKPRESSURE
+        if self.backpressure not in self.POLICIES:
+            raise ValueError(f'未知的背压策略: {self.backpressure}')
+        self.spill_path = spill_path or Config.INGEST_SPILL_PATH
+        
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._executor = None
+        self._store_queue = None
+        self._spill_offset = 0  # 溢出文件中下一条待读取记录的位置
+        self._spilled = 0  # 溢出文件中待处理的记录数
+        self._stats = {
+            'enqueued': 0,
+            'stored': 0,
+            'duplicates': 0,
+            'queued_for_push': 0,
+            'dropped': 0,
+            'spilled': 0,
+            'errors': 0,
+            'store_retries': 0,
+            'last_lag': 0.0,
+            'max_lag': 0.0
+        }
+    
+    def start(self):
+        """启动管道（只启动一次），应用启动时调用以读回上次运行遗留的溢出记录"""
+        self._ensure_started()
+    
+    def _ensure_started(self):
+        """启动管道的event loop线程和工作协程（未调用 start 时在首次提交消息时启动）"""
+        with self._lock:
+            if self._loop is not None:
+                return self._loop
+            
+            self._recover_spill()
+            loop = asyncio.new_event_loop()
+            started = threading.Event()
+            
+            def run():
+                asyncio.set_event_loop(loop)
+                self._store_queue = asyncio.Queue(maxsize=self.maxsize)
+                # 线程池用于写库（推送由 outbox_dispatcher 在推送线程上完成）
+                self._executor = ThreadPoolExecutor(
+                    max_workers=1,
+                    thread_name_prefix='ingest'
+                )
+                loop.create_task(self._store_worker())
+                loop.call_soon(started.set)
+                loop.run_forever()
+            
+            self._thread = threading.Thread(target=run, name='ingest-pipeline', daemon=True)
+            self._thread.start()
+            started.wait()
+            self._loop = loop
+            return loop
+    
+    async def submit(self, task_id, group_id, msg, api_config=None):
+        """提交一条消息（可在任意event loop中调用），按背压策略可能等待"""
+        item = {
+            'task_id': task_id,
+            'group_id': group_id,
+            'api_config': api_config,
+            'msg': msg,
+            'enqueued_at': time.time()
+        }
+        loop = self._ensure_started()
+        future = asyncio.run_coroutine_threadsafe(self._enqueue(item), loop)
+        await asyncio.wrap_future(future)
+    
+    async def _enqueue(self, item):
+        """在管道loop上按背压策略入队"""
+        self._stats['enqueued'] += 1
+        queue = self._store_queue
+        
+        if self.backpressure == 'spill':
+            # 已有溢出记录时继续写入溢出文件，保持先后顺序
+            if self._spilled or queue.full():
+                self._spill(item)
+                return
+            queue.put_nowait(item)
+        elif self.backpressure == 'drop_oldest':
+            if queue.full():
+                queue.get_nowait()
+                queue.task_done()
+                self._stats['dropped'] += 1
+            queue.put_nowait(item)
+        else:
+            await queue.put(item)
+    
+    def _recover_spill(self):
+        """启动时接管上次运行遗留的溢出文件：统计待读回的记录数，截掉写了一半的末行"""
+        if not os.path.exists(self.spill_path):
+            return
+        
+        with open(self.spill_path, 'rb+') as f:
+            data = f.read()
+            complete = data.rfind(b'\n') + 1
+            if complete < len(data):
+                f.truncate(complete)
+        self._spilled = data.count(b'\n', 0, complete)
+        self._spill_offset = 0
+        if self._spilled:
+            print(f"[入库管道] 读回上次遗留的 {self._spilled} 条溢出记录")
+        else:
+            os.remove(self.spill_path)
+    
+    def _spill(self, item):
+        """写入溢出文件"""
+        os.makedirs(os.path.dirname(self.spill_path) or '.', exist_ok=True)
+        with open(self.spill_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(item, ensure_ascii=False, default=_json_default) + '\n')
+        self._spilled += 1
+        self._stats['spilled'] += 1
+    
+    def _refill_from_spill(self):
+        """队列有空位时从溢出文件读回记录"""
+        room = self.maxsize - self._store_queue.qsize()
+        if not self._spilled or room <= 0:
+            return
+        
+        with open(self.spill_path, 'r', encoding='utf-8') as f:
+            f.seek(self._spill_offset)
+            while room > 0 and self._spilled > 0:
+                line = f.readline()
+                if not line:
+                    # 文件已读完（计数与文件不一致时以文件为准）
+                    self._spilled = 0
+                    break
+                self._spilled -= 1
+                try:
+                    self._store_queue.put_nowait(json.loads(line))
+                except ValueError:
+                    self._stats['errors'] += 1
+                    continue
+                room -= 1
+            self._spill_offset = f.tell()
+        
+        if not self._spilled:
+            # 全部读回后清空溢出文件
+            os.remove(self.spill_path)
+            self._spill_offset = 0
+    
+    async def _store_worker(self):
+        """入库协程：批量写库，新插入且配置了API的消息写入推送发件箱"""
+        loop = asyncio.get_running_loop()
+        while True:
+            if self._store_queue.empty():
+                self._refill_from_spill()
+            items = [await self._store_queue.get()]
+            while len(items) < Config.INGEST_BATCH_SIZE and not self._store_queue.empty():
+                items.append(self._store_queue.get_nowait())
+            
+            try:
+                ids = await self._store_batch(loop, items)
+            finally:
+                for _ in items:
+                    self._store_queue.task_done()
+            
+            if ids is None:
+                # 多次重试仍失败（如数据库持续锁定）：写入溢出文件，稍后重新入库，不计为重复消息
+                for item in items:
+                    self._spill(item)
+                print(f"[入库管道] {len(items)} 条实时消息入库失败，已写入溢出文件等待重试")
+                continue
+            
+            now = time.time()
+            queued_for_push = 0
+            for item, message_id in zip(items, ids):
+                lag = now - item['enqueued_at']
+                self._stats['last_lag'] = lag
+                self._stats['max_lag'] = max(self._stats['max_lag'], lag)
+                if not message_id:
+                    self._stats['duplicates'] += 1
+                    continue
+                self._stats['stored'] += 1
+                if item['api_config']:
+                    queued_for_push += 1
+            
+            if queued_for_push:
+                self._stats['queued_for_push'] += queued_for_push
+                outbox_dispatcher.notify()
+            
+            self._refill_from_spill()
+    
+    async def _store_batch(self, loop, items):
+        """写入一批消息，失败时按 INGEST_RETRY_DELAY 间隔重试，全部失败返回None"""
+        rows = [{**item['msg'], 'group_id': item['group_id']} for item in items]
+        # 配置了API的新消息在入库的同一事务中写入推送发件箱
+        push_task_ids = [item['task_id'] if item['api_config'] else None for item in items]
+        
+        for delay in [*Config.INGEST_RETRY_DELAY, None]:
+            try:
+                return await loop.run_in_executor(self._executor, Message.create_many, rows, push_task_ids)
+            except Exception as e:
+                print(f"实时消息入库失败: {str(e)}")
+                if delay is None:
+                    self._stats['errors'] += len(items)
+                    return None
+                self._stats['store_retries'] += 1
+                await asyncio.sleep(delay)
+    
+    def metrics(self):
+        """队列深度、延迟等运行指标"""
+        metrics = dict(self._stats)
+        metrics.update({
+            'backpressure': self.backpressure,
+            'maxsize': self.maxsize,
+            'store_queue_depth': self._store_queue.qsize() if self._store_queue else 0,
+            'spill_pending': self._spilled
+        })
+        return metrics
+
+def _json_default(obj):
+    """溢出文件序列化：日期时间转为ISO字符串"""
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Type {type(obj)} not serializable")
+
+# 全局实例
+ingest_pipeline = IngestPipeline()
@@ -0,0 +1,116 @@
+"""
+群组/频道链接提取 - 一次扫描完成 t.me 链接、邀请链接和 @用户名 的识别与规范化
+
+规范化结果：
+- 公开群组/频道：小写用户名（不带@），t.me/telegram.me/telegram.dog、t.me/s/ 预览页、消息链接都归为同一用户名
+- 邀请链接：https://t.me/+hash（hash 区分大小写，joinchat/hash 与 +hash 视为同一链接）
+"""
+
+import re
+
+# 合并后的单个模式：每个分支都以字面字符开头（t / telegram / @），正则引擎可以按首字符快速跳过无关文本；
+# 协议和 www. 前缀不参与匹配（规范化结果不需要），域名前一个字符的检查放在 _is_boundary 中做；
+# 域名不区分大小写（T.me、TELEGRAM.ME），路径和邀请hash区分
+LINK_PATTERN = re.compile(
+    r'(?i:t\.me|telegram\.(?:me|dog))/'
+    r'(?:(?:joinchat/|\+)(?P<invite>[A-Za-z0-9_-]+)|(?:s/)?(?P<path>[A-Za-z0-9_]+))'
+    r'|@(?<![\w@.]@)(?P<mention>[A-Za-z0-9_]{4,32})'
+)
+
+_PREFIX = re.compile(r'(?:https?://)?(?:www\.)?', re.IGNORECASE)
+
+_BARE_USERNAME = re.compile(r'@?([A-Za-z0-9_]+)')
+
+# t.me 下不是用户名的路径
+RESERVED_PATHS = frozenset({
+    'addemoji', 'addlist', 'addstickers', 'addtheme', 'bg', 'boost', 'c', 'confirmphone', 'contact',
+    'iv', 'joinchat', 'login', 'proxy', 'setlanguage', 'share', 'socks'
+})
+
+def _username(name):
+    """用户名规范化（Telegram用户名为5-32位，早期部分为4位）"""
+    name = name.lower()
+    if 4 <= len(name) <= 32 and name not in RESERVED_PATHS:
+        return name
+    return None
+
+def parse_link(value):
+    """
+    解析单个用户名或链接，返回 ('username', 小写用户名) 或 ('invite', hash)，无法识别时返回None
+    """
+    value = value.strip()
+    match = LINK_PATTERN.match(value, _PREFIX.match(value).end())
+    if match:
+        if match.group('invite'):
+            return 'invite', match.group('invite')
+        name = _username(match.group('path') or match.group('mention'))
+        return ('username', name) if name else None
+    
+    # 不带@的纯用户名
+    match = _BARE_USERNAME.fullmatch(value)
+    if match:
+        name = _username(match.group(1))
+        return ('username', name) if name else None
+    return None
+
+def _format(kind, value):
+    return f'https://t.me/+{value}' if kind == 'invite' else value
+
+def canonicalize(value):
+    """把用户名/链接规范化为统一写法，无法识别时返回None"""
+    parsed = parse_link(value)
+    return _format(*parsed) if parsed else None
+
+def _is_boundary(text, start):
+    """域名前不能紧跟单词字符或点号（排除 abct.me 之类），www. 前缀除外"""
+    if start == 0:
+        return True
+    previous = text[start - 1]
+    if previous == '.':
+        return text[max(0, start - 4):start].lower() == 'www.'
+    return not (previous.isalnum() or previous == '_')
+
+def scan(text, found):
+    """扫描一段文本，把规范化的链接加入 found（dict，按首次出现的顺序去重）"""
+    for match in LINK_PATTERN.finditer(text):
+        if match.group('mention') is None and not _is_boundary(text, match.start()):
+            continue
+        invite = match.group('invite')
+        if invite:
+            found.setdefault(f'https://t.me/+{invite}')
+            continue
+        name = _username(match.group('path') or match.group('mention'))
+        if name:
+            found.setdefault(name)
+
+def _message_sources(message):
+    """
+    消息中需要扫描的文本：纯文本（URL和@提及实体都在其中）、
+    文字超链接实体（MessageEntityTextUrl，链接不出现在文本里）和按钮链接
+    """
+    if isinstance(message, dict):
+        yield message.get('text') or ''
+        return
+    
+    # Telethon 的 message.text 带格式标记，raw_text 为纯文本
+    yield getattr(message, 'raw_text', None) or getattr(message, 'text', None) or ''
+    
+    for entity in getattr(message, 'entities', None) or ():
+        url = getattr(entity, 'url', None)
+        if url:
+            yield url
+    
+    for row in getattr(message, 'buttons', None) or ():
+        for button in row:
+            url = getattr(button, 'url', None)
+            if url:
+                yield url
+
+def extract_links(messages):
+    """从消息（Telethon消息对象或 {'text': ...} 字典）中提取去重后的规范化群组/频道链接"""
+    found = {}
+    for message in messages:
+        for text in _message_sources(message):
+            if text:
+                scan(text, found)
+    return list(found)
@@ -0,0 +1,205 @@
+import asyncio
+import json
+import random
+import threading
+from datetime import datetime, timedelta
+from config import Config
+from database.models import Outbox, Task
+from services.circuit_breaker import CIRCUIT_OPEN
+from services.push_client import push_client
+
+def backoff_delay(attempts):
+    """第 attempts 次失败后的重试间隔（秒）：指数增长，取其后一半区间内的随机值，避免大量消息同时重试"""
+    delay = min(Config.OUTBOX_BACKOFF_MAX, Config.OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+class OutboxDispatcher:
+    """
+    推送发件箱分发器 - 新消息先写入 push_outbox 表（持久化），后台协程在推送loop上投递
+    
+    每条消息只尝试一次，失败后按指数退避（带随机抖动）重新排期；入箱超过 OUTBOX_MAX_AGE 秒
+    仍未成功的移入死信表。采集只负责写入发件箱，不再等待推送，也不受推送地址是否可用的影响
+    
+    推送地址熔断期间不投递也不计入尝试次数，记录延后到熔断结束之后（同样受 OUTBOX_MAX_AGE 限制）
+    """
+    
+    def __init__(self):
+        self._started = False
+        self._lock = threading.Lock()
+        self._loop = None
+        self._wakeup = None
+        self._in_flight = 0
+        self._claimed = set()  # 已领取、结果尚未写回数据库的记录ID
+        self._delivered = []
+        self._retries = []
+        self._dead = []
+        self._flush_timer = None
+        self._stats = {'delivered': 0, 'retried': 0, 'deferred': 0, 'dead': 0}
+    
+    def start(self):
+        """启动分发协程（只启动一次），应用启动时调用以继续投递上次未完成的记录"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            self._loop = push_client.loop()
+        asyncio.run_coroutine_threadsafe(self._run(), self._loop)
+    
+    def enqueue(self, deliveries):
+        """把新消息 [(task_id, 消息dict, 消息ID)] 写入发件箱并唤醒分发协程（可在任意线程调用）"""
+        if not deliveries:
+            return
+        Outbox.enqueue_many(deliveries)
+        self.notify()
+    
+    def notify(self):
+        """发件箱有新记录（如 Message.create_many 在入库事务中写入）时唤醒分发协程"""
+        self.start()
+        self._loop.call_soon_threadsafe(self._wake)
+    
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+    
+    async def _run(self):
+        """领取到期记录并发投递；没有到期记录或投递数已满时等待唤醒或轮询间隔"""
+        loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        while True:
+            # 先清除唤醒标记再领取，领取期间的入箱/投递完成会让下面的等待立即返回
+            self._wakeup.clear()
+            room = Config.OUTBOX_MAX_IN_FLIGHT - self._in_flight
+            if room > 0:
+                try:
+                    rows = await loop.run_in_executor(None, Outbox.claim_due, room, Config.OUTBOX_LEASE)
+                    task_ids = {row['task_id'] for row in rows}
+                    configs = await loop.run_in_executor(None, self._load_configs, task_ids)
+                except Exception as e:
+                    print(f"[发件箱] 领取待推送记录失败: {str(e)}")
+                    rows = []
+                
+                for row in rows:
+                    # 排队等待并发名额的时间可能超过租约，到期后会被再次领取；
+                    # 这里只是延长了租约，不重复投递
+                    if row['id'] in self._claimed:
+                        continue
+                    self._claimed.add(row['id'])
+                    self._in_flight += 1
+                    asyncio.ensure_future(self._deliver(row, configs.get(row['task_id'])))
+            
+            # 领满时等投递完成一半（_deliver 唤醒）后继续领取
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), Config.OUTBOX_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+    
+    @staticmethod
+    def _load_configs(task_ids):
+        """读取各任务当前的推送配置（任务已删除时为None）"""
+        configs = {}
+        for task_id in task_ids:
+            task = Task.get_by_id(task_id)
+            configs[task_id] = task['api_config'] if task else None
+        return configs
+    
+    async def _deliver(self, row, api_config):
+        """投递一条记录并记录结果"""
+        attempts = row['attempts'] + 1
+        try:
+            if not api_config or not api_config.get('url'):
+                self._record_dead(row['id'], attempts, None, '任务不存在或未配置推送地址')
+                return
+            
+            try:
+                push_client.codec(row['task_id'], api_config)
+            except ValueError as e:
+                # 配置错误重试也不会成功，直接移入死信表（修正配置后可重放）
+                self._record_dead(row['id'], attempts, None, f'推送配置错误: {str(e)}')
+                return
+            
+            breaker = push_client.breaker(api_config['url'])
+            if breaker.retry_after() > 0:
+                self._defer(row, breaker.retry_after())
+                return
+            
+            success, status_code, response = await push_client.deliver(
+                json.loads(row['payload']), api_config, row['task_id'], row['message_id'],
+                idempotency_key=row['idempotency_key'], max_retries=1
+            )
+            if success:
+                self._delivered.append(row['id'])
+                self._stats['delivered'] += 1
+                self._schedule_flush()
+            elif status_code is None and response == CIRCUIT_OPEN:
+                self._defer(row, breaker.retry_after())
+            else:
+                self._record_failure(row, attempts, status_code, response)
+        except Exception as e:
+            self._record_failure(row, attempts, None, str(e))
+        finally:
+            self._in_flight -= 1
+            if self._in_flight == Config.OUTBOX_MAX_IN_FLIGHT // 2:
+                self._wake()
+    
+    def _record_failure(self, row, attempts, status_code, error):
+        """失败：未超过最长重试时间时按退避重新排期，否则移入死信表"""
+        now = datetime.now()
+        deadline = datetime.fromisoformat(row['created_at']) + timedelta(seconds=Config.OUTBOX_MAX_AGE)
+        next_attempt_at = now + timedelta(seconds=backoff_delay(attempts))
+        if next_attempt_at > deadline:
+            self._record_dead(row['id'], attempts, status_code, error)
+            return
+        self._retries.append((row['id'], attempts, next_attempt_at, status_code, error))
+        self._stats['retried'] += 1
+        self._schedule_flush()
+    
+    def _defer(self, row, wait):
+        """推送地址熔断中：不计入尝试次数，延后到熔断结束之后（分散在半个熔断时长内，避免同时涌入）"""
+        delay = wait + random.uniform(1, max(1, Config.CIRCUIT_OPEN_SECONDS / 2))
+        next_attempt_at = datetime.now() + timedelta(seconds=delay)
+        deadline = datetime.fromisoformat(row['created_at']) + timedelta(seconds=Config.OUTBOX_MAX_AGE)
+        if next_attempt_at > deadline:
+            self._record_dead(row['id'], row['attempts'], None, CIRCUIT_OPEN)
+            return
+        self._retries.append((row['id'], row['attempts'], next_attempt_at, row['last_status'], row['last_error']))
+        self._stats['deferred'] += 1
+        self._schedule_flush()
+    
+    def _record_dead(self, outbox_id, attempts, status_code, error):
+        self._dead.append((outbox_id, attempts, status_code, error))
+        self._stats['dead'] += 1
+        self._schedule_flush()
+    
+    def _schedule_flush(self):
+        """投递结果按条数或时间阈值批量写回数据库"""
+        pending = len(self._delivered) + len(self._retries) + len(self._dead)
+        if pending >= Config.INGEST_BATCH_SIZE:
+            self._flush()
+        elif self._flush_timer is None:
+            self._flush_timer = self._loop.call_later(Config.INGEST_FLUSH_INTERVAL, self._flush)
+    
+    def _flush(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        delivered, retries, dead = self._delivered, self._retries, self._dead
+        self._delivered, self._retries, self._dead = [], [], []
+        ids = delivered + [retry[0] for retry in retries] + [row[0] for row in dead]
+        future = self._loop.run_in_executor(None, self._write_results, delivered, retries, dead)
+        # 结果写回后才允许再次领取（写入失败时等租约到期后重新投递）
+        future.add_done_callback(lambda _: self._claimed.difference_update(ids))
+    
+    @staticmethod
+    def _write_results(delivered, retries, dead):
+        try:
+            Outbox.finish_many(delivered, retries, dead)
+        except Exception as e:
+            # 写入失败时租约到期后会重新投递（接收方可按幂等键去重）
+            print(f"[发件箱] 记录投递结果失败: {str(e)}")
+    
+    def stats(self):
+        """发件箱积压情况和本次运行以来的投递/重试/延后/死信数"""
+        return {**Outbox.stats(), **self._stats, 'in_flight': self._in_flight}
+
+# 全局实例
+outbox_dispatcher = OutboxDispatcher()
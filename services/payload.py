@@ -0,0 +1,191 @@
+"""
+推送数据转换 - 把任务的参数映射预先整理为转换函数（每个任务只整理一次），并按配置编码请求体
+
+param_mapping 格式：
+- {"消息字段": "目标字段"}：目标字段必须是字符串，为 null 或空字符串时不推送该字段
+- "$const": {"目标字段": 常量}：每条推送都带上的固定字段
+未覆盖的默认字段（content、sender_id、sender_name、message_date、media_type）按原名推送
+api_config.nested_targets 为 true 时（仅POST）目标字段中的 . 表示嵌套对象，如 "data.text"；
+默认不启用，"user.name" 仍是一个字段名，已有任务的推送格式不变
+
+请求体（仅POST）：encoding 为 json（默认）或 msgpack（需安装 msgpack），
+compression 为 gzip 时压缩超过 API_GZIP_MIN_BYTES 的请求体，分别通过 Content-Type / Content-Encoding 请求头声明
+"""
+
+import copy
+import gzip
+import json
+from config import Config
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+DEFAULT_MAPPING = {
+    'content': 'content',
+    'sender_id': 'sender_id',
+    'sender_name': 'sender_name',
+    'message_date': 'message_date',
+    'media_type': 'media_type'
+}
+
+CONST_KEY = '$const'
+
+# 批量推送的请求体格式：JSON数组 或 NDJSON（每行一条JSON）
+BATCH_FORMATS = {
+    'array': 'application/json; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8'
+}
+
+CONTENT_TYPES = {
+    'json': 'application/json; charset=utf-8',
+    'msgpack': 'application/msgpack'
+}
+
+COMPRESSIONS = ('gzip',)
+
+# 不需要检查 isoformat 的常见类型（其余类型带 isoformat 方法的按日期时间处理）
+_PLAIN_TYPES = frozenset({str, int, float, bool, type(None), list, dict})
+
+# 紧凑JSON、中文不转义（json.dumps 带参数时每次都会新建编码器，这里复用一个）
+_dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+def _check_constant(target, value):
+    try:
+        json.dumps(value, allow_nan=False)
+    except (TypeError, ValueError):
+        raise ValueError(f'常量 {target} 不是有效的JSON值')
+
+def compile_transform(param_mapping, nested=False):
+    """
+    把参数映射预先整理为字段列表，返回转换函数 transform(消息dict) -> 请求数据dict
+    每条消息不再合并映射，常见类型也不再探测 isoformat
+    nested 为True时目标字段中的 . 表示嵌套对象，否则按原样作为字段名
+    """
+    param_mapping = dict(param_mapping or {})
+    constants = param_mapping.pop(CONST_KEY, None) or {}
+    if not isinstance(constants, dict):
+        raise ValueError(f'{CONST_KEY} 必须是对象')
+    
+    containers = {(): 0}  # 嵌套对象路径 -> 编号（0 为请求数据本身）
+    container_specs = []  # [(父对象编号, 字段名)]，按创建顺序
+    leaves = {}  # 目标路径 -> 'field' / 'const'
+    
+    def locate(target, kind):
+        """登记目标路径，返回 (所在对象编号, 字段名)"""
+        parts = target.split('.') if nested else [target]
+        if not all(parts):
+            raise ValueError(f'无效的目标字段: {target}')
+        parent = ()
+        for part in parts[:-1]:
+            path = parent + (part,)
+            if path in leaves:
+                raise ValueError(f'目标字段冲突: {target}')
+            if path not in containers:
+                containers[path] = len(containers)
+                container_specs.append((containers[parent], part))
+            parent = path
+        path = tuple(parts)
+        # 同一目标被多个消息字段映射时后者覆盖（与原实现一致），其余重复均视为冲突
+        if path in containers or leaves.get(path, kind) != kind or (kind == 'const' and path in leaves):
+            raise ValueError(f'目标字段冲突: {target}')
+        leaves[path] = kind
+        return containers[parent], parts[-1]
+    
+    fields = []  # [(消息字段, 所在对象编号, 字段名)]
+    for source, target in {**DEFAULT_MAPPING, **param_mapping}.items():
+        if target is None or target == '':
+            continue
+        if not isinstance(target, str):
+            raise ValueError(f'字段 {source} 的目标必须是字符串')
+        fields.append((source, *locate(target, 'field')))
+    
+    const_fields = []  # [(所在对象编号, 字段名, 常量, 是否需要复制)]
+    for target, value in constants.items():
+        _check_constant(target, value)
+        const_fields.append((*locate(target, 'const'), value, isinstance(value, (dict, list))))
+    
+    if not container_specs and not any(mutable for _, _, _, mutable in const_fields):
+        # 不嵌套时（已有任务都是这种情况）直接写入一个dict
+        base = {key: value for _, key, value, _ in const_fields}
+        flat_fields = [(source, key) for source, _, key in fields]
+        
+        def transform(message):
+            data = base.copy()
+            for source, key in flat_fields:
+                if source in message:
+                    value = message[source]
+                    if value.__class__ not in _PLAIN_TYPES and hasattr(value, 'isoformat'):
+                        value = value.isoformat()
+                    data[key] = value
+            return data
+        
+        return transform
+    
+    def transform(message):
+        nodes = [{}]
+        for parent, key in container_specs:
+            node = nodes[parent][key] = {}
+            nodes.append(node)
+        for parent, key, value, mutable in const_fields:
+            nodes[parent][key] = copy.deepcopy(value) if mutable else value
+        for source, parent, key in fields:
+            if source in message:
+                value = message[source]
+                if value.__class__ not in _PLAIN_TYPES and hasattr(value, 'isoformat'):
+                    value = value.isoformat()
+                nodes[parent][key] = value
+        return nodes[0]
+    
+    return transform
+
+class PayloadCodec:
+    """编译后的推送配置：消息转换函数和请求体编码（按任务缓存，见 PushClient.codec）"""
+    
+    def __init__(self, api_config):
+        self.method = api_config.get('method', 'POST').upper()
+        self.encoding = api_config.get('encoding') or 'json'
+        self.compression = api_config.get('compression') or None
+        if self.encoding not in CONTENT_TYPES:
+            raise ValueError(f'未知的请求体格式: {self.encoding}')
+        if self.compression is not None and self.compression not in COMPRESSIONS:
+            raise ValueError(f'未知的压缩方式: {self.compression}')
+        if self.encoding == 'msgpack' and msgpack is None:
+            raise ValueError('msgpack 格式需要先安装 msgpack（pip install msgpack）')
+        if self.method == 'GET' and (self.encoding != 'json' or self.compression):
+            raise ValueError('GET请求的参数在URL中，不支持请求体格式和压缩')
+        if self.encoding == 'msgpack' and api_config.get('batch_format') == 'ndjson':
+            raise ValueError('msgpack 格式的批量推送只支持数组')
+        nested = bool(api_config.get('nested_targets'))
+        if self.method == 'GET' and nested:
+            raise ValueError('GET请求不支持嵌套的目标字段')
+        
+        self.transform = compile_transform(api_config.get('param_mapping'), nested=nested)
+    
+    def encode(self, record):
+        """编码单条请求数据，返回 (请求体, 请求头)"""
+        if self.encoding == 'msgpack':
+            return self._finish(msgpack.packb(record), self.encoding)
+        return self._finish(_dumps(record).encode('utf-8'), self.encoding)
+    
+    def encode_batch(self, records, batch_format):
+        """编码一批请求数据，返回 (请求体, 请求头)"""
+        if self.encoding == 'msgpack':
+            return self._finish(msgpack.packb(records), self.encoding)
+        if batch_format == 'ndjson':
+            body = ''.join(_dumps(record) + '\n' for record in records)
+            return self._finish(body.encode('utf-8'), batch_format)
+        return self._finish(_dumps(records).encode('utf-8'), batch_format)
+    
+    def _finish(self, body, body_format):
+        content_type = BATCH_FORMATS.get(body_format) or CONTENT_TYPES[body_format]
+        headers = {'Content-Type': content_type}
+        if self.compression == 'gzip' and len(body) >= Config.API_GZIP_MIN_BYTES:
+            body = gzip.compress(body, compresslevel=Config.API_GZIP_LEVEL, mtime=0)
+            headers['Content-Encoding'] = 'gzip'
+        return body, headers
+
+def compile_payload(api_config):
+    """校验并编译推送配置，配置无效时抛出 ValueError"""
+    return PayloadCodec(api_config)
@@ -0,0 +1,252 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from database.models import APILog
+from services.api_service import APIService
+from services.circuit_breaker import CIRCUIT_OPEN, CircuitBreaker
+from services.concurrency import KeyedConcurrencyLimiter
+from services.payload import BATCH_FORMATS, compile_payload
+
+class PushClient:
+    """
+    非阻塞API推送客户端 - 推送在专用event loop线程上完成（由发件箱分发器调用 deliver）
+    
+    所有请求共用 APIService 的连接池（keep-alive），每个推送地址同时进行的请求数受限；
+    HTTP请求在线程池中执行，重试间隔用 asyncio.sleep 等待，不占用线程；
+    API日志按条数或时间阈值批量写入（单独的写线程，避免多个推送线程争用数据库）
+    
+    api_config 中 batch_size > 1 时（仅POST）按 (任务, 推送地址) 凑批：凑满 batch_size 条或
+    第一条等待 linger_ms 毫秒后合并为一个请求发送（batch_format: array 或 ndjson），
+    批次的结果作为其中每条消息的结果，并逐条记录API日志
+    
+    参数映射和请求体编码按任务编译一次（见 services.payload），配置变化时重新编译
+    
+    每个推送地址有一个熔断器（见 CircuitBreaker）：熔断期间请求不发送、不重试，
+    直接返回 (False, None, CIRCUIT_OPEN)，由发件箱延后投递；该地址的并发上限也随响应情况自动增减
+    """
+    
+    def __init__(self, per_endpoint=None, total=None):
+        self.per_endpoint = per_endpoint or Config.API_CONCURRENCY_PER_ENDPOINT
+        self.total = total or Config.API_CONCURRENCY_TOTAL
+        self.limiter = KeyedConcurrencyLimiter(self.per_endpoint, self.total)
+        
+        self._loop = None
+        self._executor = None
+        self._log_executor = None
+        self._logs = []
+        self._log_timer = None
+        self._breakers = {}  # {url: CircuitBreaker}
+        self._codecs = {}  # {task_id: (api_config, PayloadCodec)}
+        self._batches = {}  # {(task_id, url, batch_format, max_retries): {'codec', 'records', 'keys', 'future', 'timer'}} 正在凑的批次
+        self._lock = threading.Lock()
+        self._stats = {
+            'succeeded': 0, 'failed': 0, 'retried': 0, 'batches': 0, 'batched_messages': 0, 'rejected': 0
+        }
+    
+    def _ensure_started(self):
+        """启动推送event loop线程（懒加载）"""
+        with self._lock:
+            if self._loop is not None:
+                return self._loop
+            
+            loop = asyncio.new_event_loop()
+            self._executor = ThreadPoolExecutor(max_workers=self.total, thread_name_prefix='push')
+            self._log_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='push-log')
+            thread = threading.Thread(target=loop.run_forever, name='push-client', daemon=True)
+            thread.start()
+            self._loop = loop
+            return loop
+    
+    def loop(self):
+        """推送event loop（懒启动），发件箱分发器也运行在这个loop上"""
+        return self._ensure_started()
+    
+    def breaker(self, url):
+        """获取推送地址的熔断器（不存在时创建）"""
+        breaker = self._breakers.get(url)
+        if breaker is None:
+            breaker = self._breakers[url] = CircuitBreaker(self.limiter.get(url), self.per_endpoint)
+        return breaker
+    
+    def codec(self, task_id, api_config):
+        """获取任务编译好的推送配置（配置与上次编译时不同则重新编译）"""
+        cached = self._codecs.get(task_id)
+        if cached is None or cached[0] != api_config:
+            cached = self._codecs[task_id] = (api_config, compile_payload(api_config))
+        return cached[1]
+    
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                self._stats[name] += delta
+    
+    async def deliver(self, message, api_config, task_id, message_id=None, idempotency_key=None,
+                      max_retries=None):
+        """
+        在推送loop上推送一条消息并记录API日志，返回 (是否成功, 状态码, 响应内容)
+        idempotency_key 通过 Idempotency-Key 请求头发送（批量时为逗号分隔、与请求体顺序一致的多个键）
+        推送地址熔断中时不发送，返回 (False, None, CIRCUIT_OPEN)，不记录API日志
+        """
+        url = api_config['url']
+        codec = self.codec(task_id, api_config)
+        method = codec.method
+        request_data = codec.transform(message)
+        
+        if int(api_config.get('batch_size') or 1) > 1 and method == 'POST':
+            success, status_code, response = await self._add_to_batch(
+                task_id, api_config, codec, request_data, idempotency_key, max_retries
+            )
+        else:
+            # POST请求体在这里编码（GET的参数由requests拼到URL中）
+            if method == 'POST':
+                body, headers = codec.encode(request_data)
+            else:
+                body, headers = request_data, {}
+            if idempotency_key:
+                headers['Idempotency-Key'] = idempotency_key
+            success, status_code, response = await self._send_with_retry(
+                url, method, body, headers=headers or None, max_retries=max_retries
+            )
+        
+        if status_code is None and response == CIRCUIT_OPEN:
+            self._count(rejected=1)
+            return success, status_code, response
+        
+        self._log({
+            'task_id': task_id,
+            'message_id': message_id,
+            'url': url,
+            'method': method,
+            'request_data': request_data,
+            'status_code': status_code,
+            'response': response,
+            'success': success
+        })
+        self._count(**{'succeeded' if success else 'failed': 1})
+        return success, status_code, response
+    
+    async def _add_to_batch(self, task_id, api_config, codec, request_data, idempotency_key=None,
+                            max_retries=None):
+        """把一条请求数据加入 (任务, 推送地址) 的批次，等待该批次发送完成并返回批次的发送结果"""
+        batch_format = api_config.get('batch_format') or 'array'
+        if batch_format not in BATCH_FORMATS:
+            raise ValueError(f'未知的批量格式: {batch_format}')
+        
+        key = (task_id, api_config['url'], batch_format, max_retries)
+        batch = self._batches.get(key)
+        if batch is None:
+            loop = asyncio.get_running_loop()
+            linger = api_config.get('linger_ms', Config.API_BATCH_LINGER_MS) / 1000
+            batch = self._batches[key] = {
+                'codec': codec,
+                'records': [],
+                'keys': [],
+                'future': loop.create_future(),
+                'timer': loop.call_later(linger, self._flush_batch, key)
+            }
+        batch['records'].append(request_data)
+        batch['keys'].append(idempotency_key)
+        future = batch['future']
+        if len(batch['records']) >= int(api_config['batch_size']):
+            self._flush_batch(key)
+        return await future
+    
+    def _flush_batch(self, key):
+        """发送凑好的批次（凑满或等待超时时调用）"""
+        batch = self._batches.pop(key, None)
+        if batch is None:
+            return
+        batch['timer'].cancel()
+        asyncio.ensure_future(self._send_batch(key[1], key[2], key[3], batch))
+    
+    async def _send_batch(self, url, batch_format, max_retries, batch):
+        records, future = batch['records'], batch['future']
+        try:
+            body, headers = batch['codec'].encode_batch(records, batch_format)
+            if all(batch['keys']):
+                headers['Idempotency-Key'] = ','.join(batch['keys'])
+            result = await self._send_with_retry(url, 'POST', body, headers=headers, max_retries=max_retries)
+            self._count(batches=1, batched_messages=len(records))
+            future.set_result(result)
+        except Exception as e:
+            future.set_exception(e)
+    
+    def _log(self, entry):
+        """缓冲一条API日志，达到条数阈值立即写入，否则最多等待 INGEST_FLUSH_INTERVAL 秒"""
+        self._logs.append(entry)
+        if len(self._logs) >= Config.INGEST_BATCH_SIZE:
+            self._flush_logs()
+        elif self._log_timer is None:
+            self._log_timer = self._loop.call_later(Config.INGEST_FLUSH_INTERVAL, self._flush_logs)
+    
+    def _flush_logs(self):
+        """在推送loop上调用：把缓冲的日志交给写线程"""
+        if self._log_timer is not None:
+            self._log_timer.cancel()
+            self._log_timer = None
+        logs, self._logs = self._logs, []
+        if not logs:
+            return
+        try:
+            self._log_executor.submit(self._write_logs, logs)
+        except RuntimeError:
+            # 解释器退出时线程池已关闭，直接写入
+            self._write_logs(logs)
+    
+    @staticmethod
+    def _write_logs(logs):
+        try:
+            APILog.create_many(logs)
+        except Exception as e:
+            print(f"API日志写入失败: {str(e)}")
+    
+    async def _send_with_retry(self, url, method, data, headers=None, max_retries=None):
+        """发送请求：同一推送地址的并发受限，失败后异步等待再重试；熔断中时不再发送"""
+        loop = asyncio.get_running_loop()
+        max_retries = max_retries or Config.API_MAX_RETRIES
+        retry_delays = Config.API_RETRY_DELAY
+        breaker = self.breaker(url)
+        
+        for attempt in range(max_retries):
+            if breaker.retry_after() > 0:
+                return False, None, CIRCUIT_OPEN
+            async with self.limiter.slot(url):
+                # 排队等待名额期间可能已经熔断，拿到名额后再判断一次
+                if not breaker.allow():
+                    return False, None, CIRCUIT_OPEN
+                started = time.monotonic()
+                try:
+                    result = await loop.run_in_executor(
+                        self._executor, APIService._send_once, url, method, data, headers
+                    )
+                except asyncio.CancelledError:
+                    # 取消不是推送地址的问题，不计入熔断统计，但要归还试探名额
+                    breaker.release_probe(started)
+                    raise
+                except Exception as e:
+                    breaker.record(started, None, time.monotonic() - started, str(e))
+                    raise
+            breaker.record(started, result[1], time.monotonic() - started, result[2])
+            if result[0] or attempt == max_retries - 1:
+                return result
+            self._count(retried=1)
+            await asyncio.sleep(retry_delays[attempt])
+        
+        return False, None, 'Max retries exceeded'
+    
+    def circuit_stats(self):
+        """各推送地址的熔断状态、当前并发上限和最近的异常比例"""
+        return {url: breaker.stats() for url, breaker in list(self._breakers.items())}
+    
+    def stats(self):
+        """成功/失败数及各推送地址的并发占用和熔断状态"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['endpoints'] = self.limiter.stats()
+        stats['circuits'] = self.circuit_stats()
+        return stats
+
+# 全局实例
+push_client = PushClient()
@@ -0,0 +1,124 @@
+import asyncio
+import time
+from telethon.errors import FloodWaitError
+from config import Config
+
+class AdaptiveTokenBucket:
+    """
+    自适应令牌桶 - 遇到FloodWait时按服务器要求暂停并把速率减半，
+    之后每连续成功 probe_after 次把速率提高 base_rate 的一成，逐步回到配置速率
+    （客户端保留Telethon默认的 flood_sleep_threshold，较短的FloodWait由Telethon自动等待，这里只处理更长的）
+    只在账号专用的event loop中使用（单线程访问，无需加锁）
+    """
+    
+    def __init__(self, rate, burst=1, min_rate=None, probe_after=None):
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.min_rate = min_rate or rate / 16
+        self.probe_after = probe_after or Config.TELEGRAM_RATE_PROBE_AFTER
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+        self.successes = 0
+        self.flood_waits = 0
+        self.waited = 0.0
+    
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    async def acquire(self):
+        """取一个令牌，不足或处于FloodWait暂停期时等待（醒来后重新检查，期间可能又遇到FloodWait）"""
+        while True:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                delay = self.blocked_until - now
+            else:
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            self.waited += delay
+            await asyncio.sleep(delay)
+    
+    def on_success(self):
+        """请求成功：连续成功足够次数后试探提高速率"""
+        self.successes += 1
+        if self.rate < self.base_rate and self.successes >= self.probe_after:
+            self.rate = min(self.base_rate, self.rate + self.base_rate / 10)
+            self.successes = 0
+    
+    def on_flood_wait(self, seconds):
+        """遇到FloodWait：暂停到服务器要求的时间之后，并降低速率"""
+        now = time.monotonic()
+        self._refill(now)
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = 0
+        self.successes = 0
+        self.flood_waits += 1
+    
+    def stats(self):
+        return {
+            'rate': round(self.rate, 4),
+            'base_rate': self.base_rate,
+            'blocked_for': round(max(0.0, self.blocked_until - time.monotonic()), 1),
+            'flood_waits': self.flood_waits,
+            'waited': round(self.waited, 1)
+        }
+
+class TelegramRateLimiter:
+    """Telegram调用限速器 - 每个账号的每类方法（resolve/join/history/send/click）一个令牌桶"""
+    
+    def __init__(self, limits=None):
+        self.limits = limits or Config.TELEGRAM_RATE_LIMITS
+        self._buckets = {}  # {(account_id, method): bucket}
+    
+    def bucket(self, account_id, method):
+        """获取令牌桶（不存在时按配置创建）"""
+        key = (account_id, method)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            rate, burst = self.limits[method]
+            bucket = self._buckets[key] = AdaptiveTokenBucket(rate, burst)
+        return bucket
+    
+    async def call(self, account_id, method, func, max_retries=None):
+        """
+        限速执行 func()（返回协程），遇到FloodWait时等待后重试
+        等待时间超过 TELEGRAM_FLOOD_WAIT_MAX 或重试次数用完时抛出 FloodWaitError
+        """
+        bucket = self.bucket(account_id, method)
+        if max_retries is None:
+            max_retries = Config.TELEGRAM_FLOOD_RETRIES
+        
+        attempt = 0
+        while True:
+            await bucket.acquire()
+            try:
+                result = await func()
+            except FloodWaitError as e:
+                bucket.on_flood_wait(e.seconds)
+                attempt += 1
+                if e.seconds > Config.TELEGRAM_FLOOD_WAIT_MAX or attempt > max_retries:
+                    raise
+                print(f"[限速] 账号{account_id} {method} 触发FloodWait，等待 {e.seconds} 秒后重试")
+                continue
+            bucket.on_success()
+            return result
+    
+    def blocked_for(self, account_id, method):
+        """账号某类方法因FloodWait还需暂停的秒数"""
+        bucket = self._buckets.get((account_id, method))
+        if bucket is None:
+            return 0.0
+        return max(0.0, bucket.blocked_until - time.monotonic())
+    
+    def stats(self):
+        """各账号各类方法的当前速率和FloodWait统计"""
+        stats = {}
+        for (account_id, method), bucket in list(self._buckets.items()):
+            stats.setdefault(account_id, {})[method] = bucket.stats()
+        return stats
@@ -2,9 +2,13 @@ import re
 import asyncio
 import threading
 from datetime import datetime
-from database.models import Task, Group, Message
+from database.models import Task, Group, GroupLink, Message, SyncCheckpoint
 from services.telegram_service import telegram_service
-from services.api_service import APIService
+from services.outbox import outbox_dispatcher
+from services.ingest_service import BufferedWriter, ingest_pipeline
+from services.concurrency import KeyedConcurrencyLimiter
+from services.account_pool import AccountPool
+from services.bot_pool import BotPool, parse_bots
 from config import Config
 
 class TaskService:
@@ -13,10 +17,21 @@ class TaskService:
     def __init__(self):
         self.running_tasks = {}
         self.task_threads = {}
+        self.task_listeners = {}  # {task_id: [(telegram_group_id, account_id)]} 实时监听订阅
+        self.task_jobs = {}  # {task_id: (loop, [future])} 正在并发采集的群组
+        self.task_results = {}  # {task_id: {link: result}} 每个群组的采集结果
+        self.task_pools = {}  # {task_id: AccountPool} 任务使用的账号池
+        self.task_bots = {}  # {task_id: BotPool} 机器人搜索任务各机器人的结果
+        # 群组采集并发限制：每个账号一个信号量，所有任务共享一个总上限
+        self.collect_limiter = KeyedConcurrencyLimiter(
+            Config.COLLECT_CONCURRENCY_PER_ACCOUNT,
+            Config.COLLECT_CONCURRENCY_TOTAL
+        )
     
     def create_task(self, account_id, name, task_type='bot_search', bot_username=None,
                    search_keywords=None, target_groups=None, group_regex=None, message_regex=None, 
-                   collect_mode='both', history_limit=1000, pagination_config=None, api_config=None):
+                   collect_mode='both', history_limit=1000, pagination_config=None, api_config=None,
+                   multi_account=False, bot_concurrency=1):
         """创建任务"""
         return Task.create(
             account_id=account_id,
@@ -30,7 +45,9 @@ class TaskService:
             collect_mode=collect_mode,
             history_limit=history_limit,
             pagination_config=pagination_config,
-            api_config=api_config
+            api_config=api_config,
+            multi_account=multi_account,
+            bot_concurrency=bot_concurrency
         )
     
     def start_task(self, task_id):
@@ -69,6 +86,22 @@ class TaskService:
         if task_id in self.running_tasks:
             self.running_tasks[task_id] = False
         
+        # 取消正在采集的群组
+        loop, jobs = self.task_jobs.pop(task_id, (None, []))
+        try:
+            for job in jobs:
+                loop.call_soon_threadsafe(job.cancel)
+        except RuntimeError:
+            # 账号已释放（event loop已关闭），采集协程已随之结束
+            pass
+        
+        # 取消实时监听订阅
+        for telegram_group_id, account_id in self.task_listeners.pop(task_id, []):
+            telegram_service.submit(
+                account_id,
+                telegram_service.stop_listener(telegram_group_id, account_id=account_id, task_id=task_id)
+            )
+        
         # 更新数据库状态
         Task.update(task_id, status='stopped')
         
@@ -80,11 +113,24 @@ class TaskService:
         if not task:
             return None
         
+        results = list(self.task_results.get(task_id, {}).values())
+        pool = self.task_pools.get(task_id)
+        bots = self.task_bots.get(task_id)
+        summary = {}
+        for result in results:
+            summary[result['status']] = summary.get(result['status'], 0) + 1
+        
         return {
             'id': task['id'],
             'name': task['name'],
             'status': task['status'],
-            'is_running': task_id in self.running_tasks
+            'is_running': task_id in self.running_tasks,
+            'groups': {
+                'summary': summary,
+                'results': results
+            },
+            'accounts': pool.stats() if pool else {},
+            'bots': bots.stats() if bots else {}
         }
     
     def _run_task_thread(self, task_id):
@@ -118,13 +164,19 @@ class TaskService:
             return
         
         try:
-            # 检查账号登录状态
-            if not await telegram_service.is_logged_in(account_id):
+            # 检查账号登录状态（多账号模式使用所有已登录账号）
+            pool = await AccountPool.create(account_id, bool(task.get('multi_account')))
+            if not pool.account_ids:
+                print(f"[任务{task_id}] 错误: 没有已登录的账号")
+                Task.update(task_id, status='failed')
+                return
+            if not task.get('multi_account') and not await telegram_service.is_logged_in(account_id):
                 print(f"[任务{task_id}] 错误: 账号{account_id}未登录")
                 Task.update(task_id, status='failed')
                 return
             
-            print(f"[任务{task_id}] 使用账号ID: {account_id}")
+            self.task_pools[task_id] = pool
+            print(f"[任务{task_id}] 使用账号ID: {', '.join(str(a) for a in pool.account_ids)}")
             
             # 根据任务类型执行不同逻辑
             task_type = task.get('task_type', 'bot_search')
@@ -142,35 +194,34 @@ class TaskService:
                 search_keywords = search_keywords or []
                 print(f"[任务{task_id}] 搜索关键词数: {len(search_keywords)}")
                 
-                all_links = []
+                # 支持多个机器人（逗号分隔），每个机器人都搜索全部关键词
+                bots = parse_bots(task['bot_username'])
+                bot_pool = self.task_bots[task_id] = BotPool(bots)
+                bot_concurrency = max(1, task.get('bot_concurrency') or 1)
+                print(f"[任务{task_id}] 搜索机器人: {', '.join(bots)}（每个机器人并发 {bot_concurrency}）")
                 
-                # 遍历每个关键词进行搜索
-                for keyword in search_keywords:
-                    if not self.running_tasks.get(task_id):
-                        break
+                async def search_on(bot):
+                    def skip_disabled(keyword):
+                        if bot_pool.is_disabled(bot):
+                            bot_pool.record_skipped(bot)
+                            return '机器人已失效，跳过'
+                        return None
                     
-                    print(f"[任务{task_id}] 搜索关键词: {keyword}")
-                    
-                    # 1. 发送关键词给机器人
-                    response_message = await telegram_service.send_message_to_bot(
-                        task['bot_username'], 
-                        keyword,
-                        account_id=account_id
+                    return await self._run_sharded(
+                        task, pool, search_keywords,
+                        lambda keyword, account: self._search_keyword(task, bot_pool, bot, keyword, account),
+                        per_account=1,
+                        method='send',
+                        max_concurrency=bot_concurrency,
+                        skip=skip_disabled
                     )
-                    
-                    # 2. 提取群组链接
-                    links = []
-                    if response_message and response_message.text:
-                        links = telegram_service.extract_group_links([{'text': response_message.text}])
-                    print(f"[任务{task_id}] 关键词 '{keyword}' 找到 {len(links)} 个链接")
-                    
-                    # 4. 处理翻页（如果配置了）
-                    if task['pagination_config'] and task['pagination_config'].get('next_button_text'):
-                        print(f"[任务{task_id}] 处理翻页...")
-                        page_links = await self._process_pagination(task, account_id)
-                        links.extend(page_links)
-                    
-                    all_links.extend(links)
+                
+                # 1-4. 各机器人并行、各账号分摊关键词：发送关键词给机器人、提取链接、翻页（同一账号与同一机器人的对话串行）
+                bot_results = await asyncio.gather(*(search_on(bot) for bot in bots))
+                all_links = []
+                for keyword_results in bot_results:
+                    for result in keyword_results.values():
+                        all_links.extend(result.get('links', []))
                 
                 # 去重
                 links = list(set(all_links))
@@ -182,34 +233,61 @@ class TaskService:
                     links = self._filter_by_regex(links, task['group_regex'])
                     print(f"[任务{task_id}] 过滤后剩余 {len(links)} 个群组/频道")
                 
-                # 5. 只保存群组信息，不采集消息
+                # 6. 按规范化链接去重，跳过已入库且信息未过期的群组（不发起网络请求）
+                canonical = {}
                 for link in links:
-                    if not self.running_tasks.get(task_id):
-                        break
+                    canonical.setdefault(telegram_service.entity_cache.normalize(link), link)
+                known = GroupLink.get_known(canonical, Config.GROUP_REFRESH_AGE)
+                pending = [link for key, link in canonical.items() if key not in known or known[key]['stale']]
+                print(f"[任务{task_id}] {len(canonical) - len(pending)} 个群组已入库，{len(pending)} 个需要获取信息")
+                
+                # 7. 只保存群组信息，不采集消息（批量写入）
+                group_buffer = BufferedWriter(
+                    self._save_groups,
+                    on_flush=lambda saved: print(f"[任务{task_id}] 已保存 {len(saved)} 个新群组"),
+                    batch_size=50
+                )
+                
+                async def fetch_group_info(link, account):
+                    key = telegram_service.entity_cache.normalize(link)
+                    print(f"[任务{task_id}] 获取群组信息: {link}")
+                    # 已入库但信息过期的群组跳过解析缓存，重新获取
+                    group_info = await telegram_service.join_group(link, account_id=account, refresh=key in known)
                     
-                    try:
-                        print(f"[任务{task_id}] 获取群组信息: {link}")
-                        group_info = await telegram_service.join_group(link, account_id=account_id)
-                        
-                        # 保存群组信息
-                        Group.create(
-                            task_id=task['id'],
-                            telegram_id=group_info['telegram_id'],
-                            title=group_info['title'],
-                            username=group_info['username'],
-                            description=group_info['description'],
-                            member_count=group_info['member_count']
-                        )
-                        print(f"[任务{task_id}] 群组信息已保存: {group_info['title']}")
-                        
-                    except Exception as e:
-                        print(f"[任务{task_id}] 获取群组信息失败 {link}: {str(e)}")
-                        continue
+                    # 保存群组信息
+                    group_buffer.add({
+                        'task_id': task['id'],
+                        'telegram_id': group_info['telegram_id'],
+                        'title': group_info['title'],
+                        'username': group_info['username'],
+                        'description': group_info['description'],
+                        'member_count': group_info['member_count'],
+                        'link': link
+                    })
+                    print(f"[任务{task_id}] 群组信息已获取: {group_info['title']}")
+                    return {'title': group_info['title']}
                 
-                # 任务完成
-                Task.update(task_id, status='completed')
-                print(f"[任务{task_id}] 群组搜索完成")
+                results = self.task_results[task_id] = await self._run_sharded(
+                    task, pool, pending,
+                    fetch_group_info,
+                    per_account=Config.COLLECT_CONCURRENCY_PER_ACCOUNT,
+                    method='resolve'
+                )
+                group_buffer.flush()
+                for key, record in known.items():
+                    if not record['stale']:
+                        results[canonical[key]] = {
+                            'item': canonical[key],
+                            'status': 'known',
+                            'group_id': record['group_id'],
+                            'title': record['title']
+                        }
                 
+                # 任务完成
+                if self.running_tasks.get(task_id):
+                    Task.update(task_id, status='completed')
+                    print(f"[任务{task_id}] 群组搜索完成")
+            
             else:
                 # ========== 模式2: 直接采集 - 采集指定群组的消息 ==========
                 print(f"[任务{task_id}] 模式: 直接采集消息")
@@ -222,92 +300,17 @@ class TaskService:
                 links = target_groups or []
                 print(f"[任务{task_id}] 目标群组数: {len(links)}")
                 
-                # 遍历每个群组并采集消息
-                for link in links:
-                    if not self.running_tasks.get(task_id):
-                        print(f"[任务{task_id}] 任务已停止")
-                        break
-                    
-                    try:
-                        # 加入群组
-                        print(f"[任务{task_id}] 加入群组: {link}")
-                        group_info = await telegram_service.join_group(link, account_id=account_id)
-                        
-                        # 保存群组信息
-                        group_id = Group.create(
-                            task_id=task['id'],
-                            telegram_id=group_info['telegram_id'],
-                            title=group_info['title'],
-                            username=group_info['username'],
-                            description=group_info['description'],
-                            member_count=group_info['member_count']
-                        )
-                        
-                        if not group_id:
-                            # 群组已存在，获取ID
-                            existing_group = Group.get_by_telegram_id(group_info['telegram_id'])
-                            group_id = existing_group['id'] if existing_group else None
-                        
-                        if not group_id:
-                            continue
-                        
-                        # 获取采集模式
-                        collect_mode = task.get('collect_mode', 'both')
-                        history_limit = task.get('history_limit', 1000)
-                        
-                        # 6. 采集历史消息（如果需要）
-                        if collect_mode in ['both', 'history_only']:
-                            print(f"[任务{task_id}] 采集历史消息（最多{history_limit}条）...")
-                            history = await telegram_service.get_history(
-                                group_info['telegram_id'],
-                                limit=history_limit,
-                                account_id=account_id
-                            )
-                            
-                            # 7. 过滤并保存消息
-                            for msg in history:
-                                if not self.running_tasks.get(task_id):
-                                    break
-                                
-                                # 正则过滤消息内容
-                                if task['message_regex']:
-                                    if not re.search(task['message_regex'], msg['content']):
-                                        continue
-                                
-                                # 保存消息
-                                message_id = Message.create(
-                                    group_id=group_id,
-                                    telegram_message_id=msg['telegram_message_id'],
-                                    sender_id=msg['sender_id'],
-                                    sender_name=msg['sender_name'],
-                                    content=msg['content'],
-                                    media_type=msg['media_type'],
-                                    message_date=msg['message_date']
-                                )
-                                
-                                # 8. 推送到API
-                                if task['api_config'] and message_id:
-                                    APIService.push_data(
-                                        msg,
-                                        task['api_config'],
-                                        task['id'],
-                                        message_id
-                                    )
-                        
-                        # 9. 启动实时监听（如果需要）
-                        if collect_mode in ['both', 'realtime_only']:
-                            print(f"[任务{task_id}] 启动实时监听...")
-                            await self._start_realtime_listener(
-                                task,
-                                group_id,
-                                group_info['telegram_id'],
-                                account_id
-                            )
-                        
-                    except Exception as e:
-                        print(f"[任务{task_id}] 处理群组失败 {link}: {str(e)}")
-                        continue
-            
+                # 并发采集各群组（分摊到账号池，受账号和全局并发上限约束）
+                results = self.task_results[task_id] = await self._run_sharded(
+                    task, pool, links,
+                    lambda link, account: self._collect_group(task, link, account),
+                    per_account=Config.COLLECT_CONCURRENCY_PER_ACCOUNT,
+                    method='join'
+                )
+                succeeded = sum(1 for result in results.values() if result['status'] == 'success')
+                failed = sum(1 for result in results.values() if result['status'] == 'failed')
+                print(f"[任务{task_id}] 群组处理完成: {succeeded} 成功, {failed} 失败")
+                
                 # 任务完成
                 if self.running_tasks.get(task_id):
                     collect_mode = task.get('collect_mode', 'both')
@@ -319,13 +322,299 @@ class TaskService:
                     else:
                         Task.update(task_id, status='completed')
                         print(f"[任务{task_id}] 采集完成，实时监听中...")
-            
+        
         except Exception as e:
             print(f"[任务{task_id}] 执行失败: {str(e)}")
             Task.update(task_id, status='failed')
     
-    async def _process_pagination(self, task, account_id):
-        """处理翻页 - 点击下一页按钮"""
+    async def _run_sharded(self, task, pool, items, handler, per_account, method,
+                           max_concurrency=None, skip=None):
+        """
+        在账号池上分摊执行 handler(item, account_id)，返回 {item: result}
+        每个账号 per_account 个工作协程从共享队列领取工作，FloodWait中或健康度低的账号延后领取；
+        账号级错误（限流、断线）时把该项放回队列交给其他账号重试；停止任务时取消进行中的工作
+        max_concurrency 限制同时执行的总数；skip(item) 返回原因时不执行该项，记为 skipped
+        """
+        task_id = task['id']
+        results = {item: {'item': item, 'status': 'pending'} for item in items}
+        queue = asyncio.Queue()
+        for item in results:
+            queue.put_nowait((item, set()))
+        unfinished = len(results)
+        finished = asyncio.Event()
+        if not unfinished:
+            finished.set()
+        
+        async def worker(account_id):
+            nonlocal unfinished
+            while self.running_tasks.get(task_id) and unfinished:
+                wait = pool.wait_time(account_id, method)
+                if wait is None:
+                    return
+                if wait:
+                    await asyncio.sleep(min(wait, 5))
+                    continue
+                
+                try:
+                    item, tried = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    # 其他账号的工作可能失败后放回队列，等全部完成再退出
+                    await asyncio.sleep(0.2)
+                    continue
+                if account_id in tried and len(tried) < len(pool.active):
+                    # 留给还没试过的账号
+                    queue.put_nowait((item, tried))
+                    await asyncio.sleep(0.2)
+                    continue
+                
+                result = results[item]
+                reason = skip(item) if skip else None
+                if reason:
+                    result.update(status='skipped', error=reason)
+                    unfinished -= 1
+                    if not unfinished:
+                        finished.set()
+                    continue
+                
+                result.update(status='running', account_id=account_id)
+                try:
+                    async with slots, self.collect_limiter.slot(account_id):
+                        result.update(await handler(item, account_id))
+                    result['status'] = 'success'
+                    pool.record_success(account_id)
+                except asyncio.CancelledError:
+                    result['status'] = 'cancelled'
+                    raise
+                except Exception as e:
+                    tried.add(account_id)
+                    if pool.record_failure(account_id, e) and len(tried) < min(len(pool.active), 3):
+                        print(f"[任务{task_id}] 账号{account_id}处理失败，转交其他账号 {item}: {str(e)}")
+                        result['status'] = 'pending'
+                        queue.put_nowait((item, tried))
+                        continue
+                    print(f"[任务{task_id}] 处理失败 {item}: {str(e)}")
+                    result.update(status='failed', error=str(e))
+                unfinished -= 1
+                if not unfinished:
+                    finished.set()
+        
+        slots = asyncio.Semaphore(max_concurrency or len(pool.account_ids) * per_account)
+        workers = [
+            asyncio.ensure_future(worker(account_id))
+            for account_id in pool.account_ids
+            for _ in range(per_account)
+        ]
+        # 同一任务可能同时有多组工作（如多个机器人并行搜索）
+        _, jobs = self.task_jobs.setdefault(task_id, (asyncio.get_running_loop(), []))
+        jobs.extend(workers)
+        all_done = asyncio.ensure_future(finished.wait())
+        try:
+            # 全部完成，或工作协程全部退出/被停止任务取消
+            await asyncio.wait(
+                [all_done, asyncio.gather(*workers, return_exceptions=True)],
+                return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            all_done.cancel()
+            for job in workers:
+                job.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            for job in workers:
+                if job in jobs:
+                    jobs.remove(job)
+            if not jobs:
+                self.task_jobs.pop(task_id, None)
+        
+        for result in results.values():
+            if result['status'] in ('pending', 'running'):
+                if self.running_tasks.get(task_id):
+                    result.update(status='failed', error='没有可用账号')
+                else:
+                    result['status'] = 'cancelled'
+        return results
+    
+    async def _search_keyword(self, task, bots, bot, keyword, account_id):
+        """用指定账号向机器人搜索一个关键词，返回找到的链接；结果和响应时间计入该机器人"""
+        task_id = task['id']
+        await bots.pace(bot, account_id)
+        print(f"[任务{task_id}] 搜索关键词: {keyword}（{bot}，账号{account_id}）")
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        
+        try:
+            # 1. 发送关键词给机器人
+            response_message = await telegram_service.send_message_to_bot(
+                bot,
+                keyword,
+                account_id=account_id
+            )
+            if not response_message:
+                raise Exception("机器人无回复")
+            
+            # 2. 提取群组链接
+            links = telegram_service.extract_group_links(response_message.messages)
+            
+            # 3. 处理翻页（如果配置了）
+            if task['pagination_config'] and task['pagination_config'].get('next_button_text'):
+                print(f"[任务{task_id}] 处理翻页...")
+                page_links = await self._process_pagination(task, bot, account_id, response_message, links)
+                links.extend(page_links)
+        except Exception as e:
+            bots.record_failure(bot, e)
+            raise
+        
+        new_links = bots.record_success(bot, links, loop.time() - started)
+        print(f"[任务{task_id}] {bot} 关键词 '{keyword}' 找到 {len(links)} 个链接（新 {new_links} 个）")
+        return {'links': links, 'bot': bot}
+    
+    async def _collect_group(self, task, link, account_id):
+        """加入单个群组并采集消息，返回采集结果"""
+        task_id = task['id']
+        
+        # 加入群组
+        print(f"[任务{task_id}] 加入群组: {link}")
+        group_info = await telegram_service.join_group(link, account_id=account_id)
+        
+        # 保存群组信息
+        group_id = Group.create(
+            task_id=task['id'],
+            telegram_id=group_info['telegram_id'],
+            title=group_info['title'],
+            username=group_info['username'],
+            description=group_info['description'],
+            member_count=group_info['member_count']
+        )
+        
+        if not group_id:
+            # 群组已存在，获取ID
+            existing_group = Group.get_by_telegram_id(group_info['telegram_id'])
+            group_id = existing_group['id'] if existing_group else None
+        
+        if not group_id:
+            raise Exception("保存群组信息失败")
+        GroupLink.save_many(self._group_link_keys(link, group_info))
+        
+        result = {'group_id': group_id, 'title': group_info['title'], 'messages': 0}
+        
+        # 获取采集模式
+        collect_mode = task.get('collect_mode', 'both')
+        history_limit = task.get('history_limit', 1000)
+        
+        # 6. 采集历史消息（如果需要）
+        if collect_mode in ['both', 'history_only']:
+            result['messages'] = await self._collect_history(
+                task,
+                group_id,
+                group_info['telegram_id'],
+                account_id,
+                history_limit
+            )
+        
+        # 9. 启动实时监听（如果需要）
+        if collect_mode in ['both', 'realtime_only'] and self.running_tasks.get(task_id):
+            print(f"[任务{task_id}] 启动实时监听...")
+            await self._start_realtime_listener(
+                task,
+                group_id,
+                group_info['telegram_id'],
+                account_id
+            )
+        
+        return result
+    
+    async def _collect_history(self, task, group_id, telegram_group_id, account_id, history_limit):
+        """
+        采集历史消息（按群组检查点增量同步）
+        首次采集从最新消息向前回填最多 history_limit 条，中断后从 backfill_offset_id 继续；
+        回填完成后每次只从高水位 last_message_id 往后（从旧到新）获取新消息。
+        消息随翻页分批到达，每批过滤、入库、推送后立即保存检查点。返回新入库的消息数
+        """
+        task_id = task['id']
+        checkpoint = SyncCheckpoint.get(group_id) or {
+            'last_message_id': 0,
+            'backfill_offset_id': 0,
+            'backfill_count': 0,
+            'backfill_done': False
+        }
+        incremental = bool(checkpoint['backfill_done'])
+        last_message_id = checkpoint['last_message_id']
+        backfill_offset_id = checkpoint['backfill_offset_id']
+        backfill_count = checkpoint['backfill_count']
+        
+        if incremental:
+            print(f"[任务{task_id}] 增量采集新消息（ID > {last_message_id}，最多{history_limit}条）...")
+            limit = history_limit
+            batches = telegram_service.iter_history(
+                telegram_group_id,
+                limit=limit,
+                account_id=account_id,
+                min_id=last_message_id,
+                reverse=True
+            )
+        else:
+            limit = max(history_limit - backfill_count, 0)
+            if backfill_offset_id:
+                print(f"[任务{task_id}] 继续回填历史消息（从ID {backfill_offset_id} 之前，剩余{limit}条）...")
+            else:
+                print(f"[任务{task_id}] 采集历史消息（最多{history_limit}条）...")
+            batches = telegram_service.iter_history(
+                telegram_group_id,
+                limit=limit,
+                account_id=account_id,
+                offset_id=backfill_offset_id
+            )
+        
+        completed = True
+        inserted_count = 0
+        if limit:
+            async for batch, batch_last_id, scanned in batches:
+                if not self.running_tasks.get(task_id):
+                    # 任务已停止：本批未处理，检查点停在上一批
+                    completed = False
+                    break
+                
+                # 过滤前的最大消息ID（首次回填的高水位不能受正则过滤影响，否则下次增量会重新扫描被过滤的消息）
+                newest_id = max([batch_last_id] + [msg['telegram_message_id'] for msg in batch])
+                
+                # 7. 正则过滤，批量保存，8. 只推送新插入的消息到API
+                if task['message_regex']:
+                    batch = [msg for msg in batch if re.search(task['message_regex'], msg['content'])]
+                if batch:
+                    # 入库和推送是阻塞操作，放到线程中执行，不阻塞其他群组的采集
+                    inserted_count += await asyncio.to_thread(self._store_batch, task, group_id, batch)
+                
+                # 保存检查点（增量按从旧到新，最后ID即新的高水位；回填按从新到旧，最后ID即断点）
+                if incremental:
+                    last_message_id = max(last_message_id, batch_last_id)
+                else:
+                    if not backfill_count and not backfill_offset_id:
+                        # 首次回填的第一条即最新消息，作为高水位
+                        last_message_id = max(last_message_id, newest_id)
+                    backfill_offset_id = batch_last_id
+                    backfill_count += scanned
+                SyncCheckpoint.save(group_id, last_message_id, backfill_offset_id, backfill_count, incremental)
+        
+        if completed and not incremental:
+            # 达到条数上限或已到最早的消息，回填完成
+            SyncCheckpoint.save(group_id, last_message_id, 0, backfill_count, True)
+        
+        return inserted_count
+    
+    def _store_batch(self, task, group_id, batch):
+        """批量保存一批消息（配置了API时新消息在同一事务中写入推送发件箱），返回新插入的条数"""
+        messages = [{**msg, 'group_id': group_id} for msg in batch]
+        push_task_ids = [task['id']] * len(messages) if task['api_config'] else None
+        ids = Message.create_many(messages, push_task_ids)
+        inserted = sum(1 for new_id in ids if new_id)
+        if inserted and push_task_ids:
+            outbox_dispatcher.notify()
+        return inserted
+    
+    async def _process_pagination(self, task, bot, account_id, first_reply=None, first_links=()):
+        """
+        处理翻页 - 点击下一页按钮，每页在机器人编辑消息后立即处理
+        某页的链接集合与已见过的页（包括第一页）相同时，说明机器人在重复返回，停止翻页
+        """
         links = []
         pagination_config = task['pagination_config']
         max_pages = pagination_config.get('max_pages', Config.MAX_PAGINATION_PAGES)
@@ -334,42 +623,57 @@ class TaskService:
         # 支持多个下一页按钮文字，用逗号分隔
         next_button_texts = [text.strip() for text in next_button_text.split(',') if text.strip()]
         
-        for page in range(max_pages):
-            success = False
-            
-            # 尝试每个下一页按钮文字
-            for button_text in next_button_texts:
-                try:
-                    print(f"尝试点击按钮: {button_text}")
-                    # 点击下一页按钮
-                    response_message = await telegram_service.click_bot_button(
-                        task['bot_username'],
-                        button_text,
-                        account_id=account_id
-                    )
-                    
-                    if response_message and response_message.text:
-                        # 提取链接
-                        page_links = telegram_service.extract_group_links([{'text': response_message.text}])
-                        if page_links:
-                            links.extend(page_links)
-                            success = True
-                            print(f"翻页成功，使用按钮: {button_text}，找到 {len(page_links)} 个链接")
-                            break
-                        
-                except Exception as e:
-                    print(f"点击按钮失败 (按钮: {button_text}): {str(e)}")
-                    continue
-            
-            if not success:
-                print("所有翻页按钮都失败，停止翻页")
-                break
-            
-            # 等待一下避免频率限制
-            await asyncio.sleep(2)
+        seen_pages = {hash(frozenset(first_links))} if first_links else set()
+        page = 0
+        try:
+            async for reply in telegram_service.iter_bot_pages(
+                bot,
+                next_button_texts,
+                max_pages,
+                account_id=account_id,
+                message=first_reply.message if first_reply else None
+            ):
+                page += 1
+                # 提取链接（文本、文字超链接和按钮链接）
+                page_links = telegram_service.extract_group_links(reply.messages)
+                if not page_links:
+                    print(f"第{page}页没有链接，停止翻页")
+                    break
+                
+                page_hash = hash(frozenset(page_links))
+                if page_hash in seen_pages:
+                    print(f"第{page}页与之前的页相同，停止翻页")
+                    break
+                seen_pages.add(page_hash)
+                
+                links.extend(page_links)
+                print(f"翻页成功，第{page}页找到 {len(page_links)} 个链接")
+        
+        except Exception as e:
+            print(f"翻页出错，保留已获取的 {len(links)} 个链接: {str(e)}")
         
         return links
     
+    def _save_groups(self, groups):
+        """保存群组（已存在的更新信息）并记录链接索引，返回与输入对应的新群组ID"""
+        ids = Group.create_many(groups)
+        Group.update_metadata_many([group for group, new_id in zip(groups, ids) if not new_id])
+        pairs = []
+        for group in groups:
+            pairs.extend(self._group_link_keys(group.get('link'), group))
+        GroupLink.save_many(pairs)
+        return ids
+    
+    @staticmethod
+    def _group_link_keys(link, group):
+        """群组的索引key：来源链接和用户名（两种写法都能命中）"""
+        keys = set()
+        if link:
+            keys.add(telegram_service.entity_cache.normalize(link))
+        if group.get('username'):
+            keys.add(telegram_service.entity_cache.normalize(group['username']))
+        return [(key, group['telegram_id']) for key in keys]
+    
     def _filter_by_regex(self, items, pattern):
         """正则过滤"""
         if not pattern:
@@ -385,37 +689,21 @@ class TaskService:
     async def _start_realtime_listener(self, task, group_id, telegram_group_id, account_id):
         """启动实时监听"""
         async def message_callback(msg):
-            """消息回调函数"""
+            """消息回调函数 - 只做过滤和入队，入库和推送由入库管道异步完成"""
             # 正则过滤
             if task['message_regex']:
                 if not re.search(task['message_regex'], msg['content']):
                     return
             
-            # 保存消息
-            message_id = Message.create(
-                group_id=group_id,
-                telegram_message_id=msg['telegram_message_id'],
-                sender_id=msg['sender_id'],
-                sender_name=msg['sender_name'],
-                content=msg['content'],
-                media_type=msg['media_type'],
-                message_date=msg['message_date']
-            )
-            
-            # 推送到API
-            if task['api_config'] and message_id:
-                APIService.push_data(
-                    msg,
-                    task['api_config'],
-                    task['id'],
-                    message_id
-                )
+            await ingest_pipeline.submit(task['id'], group_id, msg, task['api_config'])
         
         await telegram_service.start_listener(
             telegram_group_id, 
             message_callback,
-            account_id=account_id
+            account_id=account_id,
+            task_id=task['id']
         )
+        self.task_listeners.setdefault(task['id'], []).append((telegram_group_id, account_id))
 
 # 全局实例
 task_service = TaskService()
@@ -1,23 +1,193 @@
 import os
-import re
+import glob
 import asyncio
+import functools
+import inspect
+import threading
 from telethon import TelegramClient, events
-from telethon.tl.types import User, Channel, Chat
+from telethon.utils import get_peer_id
+from telethon.tl.types import User, Chat
 from telethon.tl.functions.channels import JoinChannelRequest
-from telethon.errors import SessionPasswordNeededError
+from telethon.errors import SessionPasswordNeededError, FloodWaitError
 from config import Config
 from database.models import Account
+from services.rate_limiter import TelegramRateLimiter
+from services.entity_cache import EntityCache, is_not_found
+from services.link_extractor import extract_links
+
+def _bind_account(signature, args, kwargs):
+    """绑定调用参数，未指定账号时填入活跃账号ID（没有活跃账号时返回None）"""
+    bound = signature.bind(*args, **kwargs)
+    account_id = bound.arguments.get('account_id')
+    if not account_id:
+        account = Account.get_active()
+        if account:
+            account_id = bound.arguments['account_id'] = account['id']
+    return bound, account_id
+
+def account_bound(func):
+    """装饰器：协程总是在账号专用的event loop上执行，从其他线程/loop调用时自动调度过去"""
+    signature = inspect.signature(func)
+    
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        bound, account_id = _bind_account(signature, (self,) + args, kwargs)
+        if not account_id:
+            return await func(*bound.args, **bound.kwargs)
+        
+        loop = self._get_loop(account_id)
+        coro = func(*bound.args, **bound.kwargs)
+        if asyncio.get_running_loop() is loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+    
+    return wrapper
+
+_END = object()
+
+async def _anext_or_end(agen):
+    """取异步生成器的下一项，结束时返回 _END（StopAsyncIteration 不能经 Future 传递）"""
+    try:
+        return await agen.__anext__()
+    except StopAsyncIteration:
+        return _END
+
+def account_bound_generator(func):
+    """装饰器：异步生成器在账号专用的event loop上迭代，每一项转发给调用方所在的loop"""
+    signature = inspect.signature(func)
+    
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        bound, account_id = _bind_account(signature, (self,) + args, kwargs)
+        agen = func(*bound.args, **bound.kwargs)
+        loop = self._get_loop(account_id) if account_id else None
+        if loop is None or asyncio.get_running_loop() is loop:
+            async for item in agen:
+                yield item
+            return
+        
+        def call(coro):
+            return asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+        
+        try:
+            while True:
+                item = await call(_anext_or_end(agen))
+                if item is _END:
+                    break
+                yield item
+        finally:
+            # 调用方提前停止迭代时，在账号loop上关闭生成器
+            await call(agen.aclose())
+    
+    return wrapper
+
+class BotReply:
+    """机器人回复 - 可能由多条消息或对同一条消息的多次编辑组成"""
+    
+    def __init__(self, messages):
+        self.messages = messages  # 按消息ID排序
+    
+    @property
+    def message(self):
+        """最新的一条消息（通常带翻页按钮）"""
+        return self.messages[-1] if self.messages else None
+    
+    @property
+    def text(self):
+        """全部消息的文本"""
+        return '\n'.join(m.text for m in self.messages if m.text)
+    
+    @property
+    def buttons(self):
+        return self.message.buttons if self.message else None
 
 class TelegramService:
-    """Telegram客户端服务 - 支持多账号"""
+    """Telegram客户端服务 - 支持多账号，每个账号一个常驻客户端和专用event loop线程"""
     
     def __init__(self):
         self.clients = {}  # {account_id: client}
         self.session_names = {}  # {account_id: session_name}
-        self.listeners = {}  # {account_id: {group_id: handler}}
+        self.listeners = {}  # {account_id: {group_id: {task_id: callback}}} 实时监听订阅
+        self._dispatchers = {}  # {account_id: (client, handler)} 每个客户端唯一的消息分发处理器
         self._loops = {}  # {account_id: loop} 每个账号的专用event loop
         self._loop_threads = {}  # {account_id: thread} 每个账号的loop线程
+        self._lock = threading.Lock()
+        self._sessions_cleaned = False
+        self.rate_limiter = TelegramRateLimiter()  # 每个账号每类方法一个令牌桶
+        self.entity_cache = EntityCache()  # 用户名/链接解析缓存
+    
+    def _get_loop(self, account_id):
+        """获取账号专用的event loop，不存在时创建并在后台线程中常驻运行"""
+        with self._lock:
+            loop = self._loops.get(account_id)
+            if loop is None or loop.is_closed():
+                if not self._sessions_cleaned:
+                    self._cleanup_thread_sessions()
+                    self._sessions_cleaned = True
+                
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=self._run_loop,
+                    args=(loop,),
+                    name=f'telegram-account-{account_id}',
+                    daemon=True
+                )
+                thread.start()
+                self._loops[account_id] = loop
+                self._loop_threads[account_id] = thread
+            return loop
+    
+    @staticmethod
+    def _run_loop(loop):
+        """loop线程入口"""
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_forever()
+        finally:
+            loop.close()
+    
+    @staticmethod
+    def _cleanup_thread_sessions():
+        """清理旧版本按线程复制的会话文件（session_*_thread_*.session）"""
+        pattern = os.path.join(Config.SESSION_DIR, 'session_*_thread_*.session*')
+        for path in glob.glob(pattern):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
     
+    def submit(self, account_id, coro):
+        """线程安全：把协程提交到账号的event loop，返回 concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self._get_loop(account_id))
+    
+    def run(self, account_id, coro, timeout=None):
+        """线程安全：在账号的event loop上执行协程并阻塞等待结果（供同步代码如路由使用）"""
+        return self.submit(account_id, coro).result(timeout)
+    
+    def release(self, account_id):
+        """断开账号客户端并停止其event loop线程"""
+        with self._lock:
+            loop = self._loops.pop(account_id, None)
+            thread = self._loop_threads.pop(account_id, None)
+        if loop is None:
+            return
+        
+        client = self.clients.pop(account_id, None)
+        self.session_names.pop(account_id, None)
+        self.listeners.pop(account_id, None)
+        self._dispatchers.pop(account_id, None)
+        if client and not loop.is_closed():
+            try:
+                asyncio.run_coroutine_threadsafe(client.disconnect(), loop).result(10)
+            except Exception:
+                pass
+        
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(loop.stop)
+        if thread and thread is not threading.current_thread():
+            thread.join(10)
+    
+    @account_bound
     async def login(self, account_id, api_id, api_hash, phone):
         """登录Telegram"""
         import logging
@@ -31,6 +201,11 @@ class TelegramService:
             self.session_names[account_id] = session_name
             logger.info(f"会话文件: {session_name}")
             
+            # 断开该账号已有的客户端
+            old_client = self.clients.pop(account_id, None)
+            if old_client:
+                await old_client.disconnect()
+            
             # 删除旧的会话文件（如果存在）
             session_file = session_name + '.session'
             if os.path.exists(session_file):
@@ -70,13 +245,14 @@ class TelegramService:
                 'message': '验证码已发送到您的Telegram',
                 'phone_code_hash': sent_code.phone_code_hash if hasattr(sent_code, 'phone_code_hash') else None
             }
-            
+        
         except Exception as e:
             logger.error(f"登录失败: {type(e).__name__}: {str(e)}")
             import traceback
             logger.error(traceback.format_exc())
             return {'status': 'error', 'message': f'{type(e).__name__}: {str(e)}'}
     
+    @account_bound
     async def verify_code(self, account_id, phone, code):
         """验证登录码"""
         import logging
@@ -105,7 +281,7 @@ class TelegramService:
             Account.update_session(account_id, session_path)
             
             return {'status': 'success', 'message': '登录成功'}
-            
+        
         except SessionPasswordNeededError as e:
             # 需要两步验证密码，但client仍然保持连接
             logger.info("需要两步验证密码")
@@ -116,6 +292,7 @@ class TelegramService:
             logger.error(traceback.format_exc())
             return {'status': 'error', 'message': f'{type(e).__name__}: {str(e)}'}
     
+    @account_bound
     async def verify_password(self, account_id, password):
         """验证两步验证密码"""
         import logging
@@ -150,6 +327,7 @@ class TelegramService:
             logger.error(traceback.format_exc())
             return {'status': 'error', 'message': f'密码验证失败: {type(e).__name__}: {str(e)}'}
     
+    @account_bound
     async def is_logged_in(self, account_id):
         """检查指定账号是否已登录"""
         client = self.clients.get(account_id)
@@ -170,9 +348,12 @@ class TelegramService:
                     self.session_names[account_id] = session_path
         
         if client:
+            if not client.is_connected():
+                await client.connect()
             return await client.is_user_authorized()
         return False
     
+    @account_bound
     async def logout(self, account_id):
         """登出指定账号"""
         client = self.clients.get(account_id)
@@ -181,11 +362,10 @@ class TelegramService:
             del self.clients[account_id]
             if account_id in self.session_names:
                 del self.session_names[account_id]
-            if account_id in self._loops:
-                del self._loops[account_id]
     
+    @account_bound
     async def get_client(self, account_id=None):
-        """获取客户端实例，如果不存在则创建（线程安全）"""
+        """获取账号的常驻客户端实例，如果不存在则创建"""
         if not account_id:
             # 如果没有指定account_id，使用活跃账号
             account = Account.get_active()
@@ -194,46 +374,27 @@ class TelegramService:
             else:
                 return None
         
-        # 获取当前线程ID
-        import threading
-        import shutil
-        thread_id = threading.current_thread().ident
-        client_key = f"{account_id}_{thread_id}"
-        
-        # 如果client已存在且已连接，直接返回
-        if client_key in self.clients:
-            client = self.clients[client_key]
+        # 每个账号只保持一个客户端，运行在账号专用的event loop上
+        client = self.clients.get(account_id)
+        if client:
             try:
-                if client.is_connected():
-                    return client
-            except:
+                if not client.is_connected():
+                    await client.connect()
+                return client
+            except Exception:
                 pass
         
-        # 否则，从session文件重新创建client
+        # 否则，从session文件创建client
         account = Account.get_by_id(account_id)
         if not account or not account['session_file']:
             return None
         
-        original_session = account['session_file'].replace('.session', '')
         if not os.path.exists(account['session_file']):
             return None
         
-        # 为当前线程创建独立的session文件副本
-        thread_session = f"{original_session}_thread_{thread_id}"
-        thread_session_file = f"{thread_session}.session"
-        
-        # 如果线程session文件不存在，复制原始session
-        if not os.path.exists(thread_session_file):
-            try:
-                shutil.copy2(account['session_file'], thread_session_file)
-            except Exception as e:
-                print(f"复制session文件失败: {e}")
-                # 如果复制失败，直接使用原始session
-                thread_session = original_session
-        
-        # 为当前线程创建新的client实例
+        session_name = account['session_file'].replace('.session', '')
         client = TelegramClient(
-            thread_session,
+            session_name,
             account['api_id'],
             account['api_hash']
         )
@@ -246,12 +407,16 @@ class TelegramService:
             await client.disconnect()
             return None
         
-        # 保存client（使用线程ID作为key）
-        self.clients[client_key] = client
-        self.session_names[client_key] = thread_session
+        self.clients[account_id] = client
+        self.session_names[account_id] = session_name
+        
+        # 客户端重建后恢复已有订阅的分发处理器
+        if self.listeners.get(account_id):
+            self._ensure_dispatcher(account_id, client)
         
         return client
     
+    @account_bound
     async def search_bot_messages(self, bot_username, keyword=None, limit=100, account_id=None):
         """搜索机器人消息"""
         try:
@@ -260,11 +425,11 @@ class TelegramService:
                 raise Exception("客户端未初始化")
             
             # 获取机器人实体
-            bot = await client.get_entity(bot_username)
+            bot = await self._resolve_peer(account_id, client, bot_username)
             
             # 获取对话消息
             messages = []
-            async for message in client.iter_messages(bot, limit=limit):
+            async for message in self._iter_messages(account_id, client, bot, limit=limit):
                 if message.text:
                     if keyword is None or keyword in message.text:
                         messages.append({
@@ -274,12 +439,14 @@ class TelegramService:
                         })
             
             return messages
-            
+        
         except Exception as e:
             raise Exception(f"搜索机器人消息失败: {str(e)}")
     
-    async def send_message_to_bot(self, bot_username, message, account_id=None):
-        """向机器人发送消息"""
+    @account_bound
+    async def send_message_to_bot(self, bot_username, message, account_id=None,
+                                  timeout=None, quiet_period=None):
+        """向机器人发送消息，返回机器人回复（BotReply），超时无回复时返回None"""
         try:
             # 确保在正确的 event loop 中运行
             client = await self.get_client(account_id)
@@ -290,25 +457,25 @@ class TelegramService:
             if not client.is_connected():
                 await client.connect()
             
-            bot = await client.get_entity(bot_username)
-            await client.send_message(bot, message)
-            
-            # 等待响应
-            await asyncio.sleep(2)
-            
-            # 获取最新消息
-            messages = await client.get_messages(bot, limit=1)
-            if messages:
-                return messages[0]
-            return None
+            bot = await self._resolve_peer(account_id, client, bot_username)
             
+            # 发送并等待机器人回复（事件驱动）
+            return await self._await_bot_reply(
+                client, bot,
+                lambda: self._limited(account_id, 'send', lambda: client.send_message(bot, message)),
+                timeout=timeout,
+                quiet_period=quiet_period
+            )
+        
         except Exception as e:
             import traceback
             traceback.print_exc()
             raise Exception(f"发送消息失败: {str(e)}")
     
-    async def click_bot_button(self, bot_username, button_text, account_id=None):
-        """点击机器人的按钮"""
+    @account_bound
+    async def click_bot_button(self, bot_username, button_text, account_id=None,
+                               timeout=None, quiet_period=None):
+        """点击机器人的按钮，返回机器人回复（BotReply），超时无回复时返回None"""
         try:
             client = await self.get_client(account_id)
             if not client:
@@ -317,10 +484,10 @@ class TelegramService:
             if not client.is_connected():
                 await client.connect()
             
-            bot = await client.get_entity(bot_username)
+            bot = await self._resolve_peer(account_id, client, bot_username)
             
             # 获取最新的消息（包含按钮）
-            messages = await client.get_messages(bot, limit=1)
+            messages = await self._limited(account_id, 'history', lambda: client.get_messages(bot, limit=1))
             if not messages:
                 raise Exception("没有找到机器人消息")
             
@@ -334,183 +501,349 @@ class TelegramService:
             for row in message.buttons:
                 for button in row:
                     if button.text == button_text:
-                        # 点击按钮
-                        await button.click()
-                        # 等待响应
-                        await asyncio.sleep(2)
-                        # 获取新消息
-                        new_messages = await client.get_messages(bot, limit=1)
-                        if new_messages:
-                            return new_messages[0]
-                        return None
+                        # 点击按钮并等待机器人新发或编辑消息
+                        return await self._await_bot_reply(
+                            client, bot,
+                            lambda: self._limited(account_id, 'click', button.click),
+                            timeout=timeout,
+                            quiet_period=quiet_period
+                        )
             
             raise Exception(f"没有找到按钮: {button_text}")
-            
+        
         except Exception as e:
             import traceback
             traceback.print_exc()
             raise Exception(f"点击按钮失败: {str(e)}")
     
+    @account_bound_generator
+    async def iter_bot_pages(self, bot_username, button_texts, max_pages, account_id=None,
+                             message=None, page_timeout=None):
+        """
+        连续点击机器人的翻页按钮（异步生成器），每翻一页产出一个 BotReply
+        机器人原地编辑带按钮的消息时，收到该消息的编辑事件即产出，不等待静默期；
+        message 为带按钮的当前页消息（省略时取机器人最新一条消息），找不到按钮或单页超时无回复时结束
+        """
+        if page_timeout is None:
+            page_timeout = Config.BOT_PAGE_TIMEOUT
+        try:
+            client = await self.get_client(account_id)
+            if not client:
+                raise Exception("客户端未初始化")
+            
+            bot = await self._resolve_peer(account_id, client, bot_username)
+            if message is None or not message.buttons:
+                messages = await self._limited(account_id, 'history', lambda: client.get_messages(bot, limit=1))
+                message = messages[0] if messages else None
+            
+            for page in range(max_pages):
+                button = self._find_button(message, button_texts)
+                if button is None:
+                    print(f"第{page + 1}页：没有找到翻页按钮 {button_texts}，停止翻页")
+                    return
+                
+                reply = await self._await_bot_reply(
+                    client, bot,
+                    lambda: self._limited(account_id, 'click', button.click),
+                    timeout=page_timeout,
+                    edit_of=message.id
+                )
+                if reply is None:
+                    print(f"第{page + 1}页：{page_timeout} 秒内机器人无回复，停止翻页")
+                    return
+                
+                yield reply
+                # 下一页的按钮在被编辑的消息上，机器人改为发新消息时取最新一条带按钮的消息
+                message = next((m for m in reversed(reply.messages) if m.buttons), None)
+        
+        except Exception as e:
+            raise Exception(f"翻页失败: {str(e)}")
+    
+    @staticmethod
+    def _find_button(message, button_texts):
+        """在消息的按钮中查找文字匹配任一 button_texts 的按钮"""
+        if message is None or not message.buttons:
+            return None
+        for text in button_texts:
+            for row in message.buttons:
+                for button in row:
+                    if button.text.strip() == text:
+                        return button
+        return None
+    
+    async def _await_bot_reply(self, client, bot, action, timeout=None, quiet_period=None, edit_of=None):
+        """
+        执行 action（发送消息/点击按钮）并通过 NewMessage/MessageEdited 事件等待机器人回复
+        收到首条回复后，在 quiet_period 秒内没有新消息或编辑即视为回复完成；总等待不超过 timeout 秒
+        指定 edit_of 时，收到该消息的编辑即视为回复完成（翻页时机器人原地编辑消息）
+        """
+        if timeout is None:
+            timeout = Config.BOT_REPLY_TIMEOUT
+        if quiet_period is None:
+            quiet_period = Config.BOT_REPLY_QUIET_PERIOD
+        
+        replies = {}  # {message_id: message} 同一消息多次编辑只保留最新版本
+        updated = asyncio.Event()
+        edited = asyncio.Event()
+        
+        async def on_reply(event):
+            replies[event.message.id] = event.message
+            if event.message.id == edit_of:
+                edited.set()
+            updated.set()
+        
+        # 先注册事件再执行动作，避免错过很快到达的回复
+        new_event = events.NewMessage(chats=bot, incoming=True)
+        edit_event = events.MessageEdited(chats=bot, incoming=True)
+        client.add_event_handler(on_reply, new_event)
+        client.add_event_handler(on_reply, edit_event)
+        
+        try:
+            await action()
+            
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            while True:
+                remaining = deadline - loop.time()
+                wait = min(quiet_period, remaining) if replies else remaining
+                if wait <= 0 or edited.is_set():
+                    break
+                updated.clear()
+                try:
+                    await asyncio.wait_for(updated.wait(), wait)
+                except asyncio.TimeoutError:
+                    # 已有回复时表示静默期结束，否则表示总超时
+                    break
+        finally:
+            client.remove_event_handler(on_reply, new_event)
+            client.remove_event_handler(on_reply, edit_event)
+        
+        if not replies:
+            return None
+        return BotReply(sorted(replies.values(), key=lambda m: m.id))
+    
     def extract_group_links(self, messages):
-        """从消息中提取群组/频道链接"""
-        links = []
-        patterns = [
-            r'https?://t\.me/([a-zA-Z0-9_]+)',
-            r'@([a-zA-Z0-9_]+)',
-            r't\.me/joinchat/([a-zA-Z0-9_-]+)'
-        ]
-        
-        for msg in messages:
-            text = msg.get('text', '')
-            for pattern in patterns:
-                matches = re.findall(pattern, text)
-                for match in matches:
-                    if match not in links:
-                        links.append(match)
-        
-        return links
-    
-    async def join_group(self, link, account_id=None):
-        """加入群组/频道"""
+        """从消息（Telethon消息或 {'text': ...}）中提取规范化、去重后的群组/频道链接，包括文字超链接和按钮链接"""
+        return extract_links(messages)
+    
+    @account_bound
+    async def join_group(self, link, account_id=None, refresh=False):
+        """加入群组/频道，refresh=True 时不使用解析缓存，重新获取群组信息"""
         try:
             client = await self.get_client(account_id)
             if not client:
                 raise Exception("客户端未初始化")
             
             # 处理不同格式的链接
-            if link.startswith('http'):
-                entity = await client.get_entity(link)
-            elif link.startswith('@'):
-                entity = await client.get_entity(link)
+            if link.startswith('http') or link.startswith('@') or 't.me/' in link:
+                target = link
             else:
-                entity = await client.get_entity(f'@{link}')
+                target = f'@{link}'
+            record = await self._resolve(account_id, client, target, refresh=refresh)
             
-            # 尝试加入
-            if isinstance(entity, Channel):
-                if not entity.left:
-                    # 已经是成员
-                    pass
-                else:
-                    await client(JoinChannelRequest(entity))
+            # 尝试加入（已是成员时跳过）
+            if record['entity_type'] == 'channel' and not record['joined']:
+                peer = self.entity_cache.input_peer(record)
+                await self._limited(account_id, 'join', lambda: client(JoinChannelRequest(peer)))
+                self.entity_cache.mark_joined(account_id, record['entity_id'])
             
             # 获取群组信息
             group_info = {
-                'telegram_id': entity.id,
-                'title': entity.title if hasattr(entity, 'title') else link,
-                'username': entity.username if hasattr(entity, 'username') else None,
-                'description': entity.about if hasattr(entity, 'about') else None,
-                'member_count': entity.participants_count if hasattr(entity, 'participants_count') else 0
+                'telegram_id': record['entity_id'],
+                'title': record['title'] or link,
+                'username': record['username'],
+                'description': None,
+                'member_count': record['member_count'] or 0
             }
             
             return group_info
-            
+        
         except Exception as e:
             raise Exception(f"加入群组失败 {link}: {str(e)}")
     
-    async def get_history(self, group_id, limit=1000, account_id=None):
-        """获取群组历史消息"""
+    @account_bound
+    async def get_history(self, group_id, limit=1000, account_id=None, min_id=0, offset_id=0, reverse=False):
+        """
+        获取群组历史消息（一次性返回列表，大量历史请使用 iter_history）
+        min_id: 只获取ID大于它的消息（增量同步）；offset_id: 从该ID之前继续获取（断点续传）
+        reverse: 为True时从旧到新返回
+        """
+        messages = []
+        async for batch, _, _ in self.iter_history(group_id, limit=limit, account_id=account_id,
+                                                   min_id=min_id, offset_id=offset_id, reverse=reverse):
+            messages.extend(batch)
+        return messages
+    
+    @account_bound_generator
+    async def iter_history(self, group_id, limit=1000, account_id=None, min_id=0, offset_id=0,
+                           reverse=False, batch_size=None):
+        """
+        分批获取群组历史消息（异步生成器），随Telethon翻页每凑满 batch_size 条产出一批
+        每批是 (消息列表, 本批最后一条消息ID, 本批扫描条数)：后两项包含被跳过的服务消息，用于记录断点
+        """
+        batch_size = batch_size or Config.INGEST_BATCH_SIZE
         try:
             client = await self.get_client(account_id)
             if not client:
                 raise Exception("客户端未初始化")
             
-            messages = []
-            async for message in client.iter_messages(group_id, limit=limit):
+            batch = []
+            count = 0
+            async for message in self._iter_messages(account_id, client, group_id, limit=limit, min_id=min_id,
+                                                     offset_id=offset_id, reverse=reverse):
                 if message.text or message.media:
-                    msg_data = {
-                        'telegram_message_id': message.id,
-                        'sender_id': message.sender_id,
-                        'sender_name': '',
-                        'content': message.text or '',
-                        'media_type': 'text',
-                        'message_date': message.date
-                    }
-                    
-                    # 获取发送者名称
-                    if message.sender:
-                        if isinstance(message.sender, User):
-                            msg_data['sender_name'] = message.sender.first_name or ''
-                            if message.sender.last_name:
-                                msg_data['sender_name'] += ' ' + message.sender.last_name
-                    
-                    # 检测媒体类型
-                    if message.media:
-                        if message.photo:
-                            msg_data['media_type'] = 'photo'
-                        elif message.video:
-                            msg_data['media_type'] = 'video'
-                        elif message.document:
-                            msg_data['media_type'] = 'document'
-                        elif message.audio:
-                            msg_data['media_type'] = 'audio'
-                        else:
-                            msg_data['media_type'] = 'other'
-                    
-                    messages.append(msg_data)
-            
-            return messages
-            
+                    batch.append(self._message_to_dict(message, message.sender))
+                count += 1
+                if count % batch_size == 0:
+                    yield batch, message.id, batch_size
+                    batch = []
+            
+            if count % batch_size:
+                yield batch, message.id, count % batch_size
+        
         except Exception as e:
             raise Exception(f"获取历史消息失败: {str(e)}")
     
-    async def start_listener(self, group_id, callback, account_id=None):
-        """启动实时监听"""
+    async def _resolve(self, account_id, client, target, refresh=False):
+        """解析用户名/链接为实体记录：优先查缓存，命中时不发起网络请求；不存在的链接也会被缓存"""
+        record = None if refresh else self.entity_cache.get(account_id, target)
+        if record is not None:
+            if not record['resolved']:
+                raise ValueError(f"链接不存在或已失效（缓存）: {record['error']}")
+            return record
+        
+        try:
+            entity = await self._limited(account_id, 'resolve', lambda: client.get_entity(target))
+        except Exception as e:
+            if is_not_found(e):
+                self.entity_cache.store_missing(account_id, target, e)
+            raise
+        return self.entity_cache.store(account_id, target, entity)
+    
+    async def _resolve_peer(self, account_id, client, target):
+        """解析用户名/链接为InputPeer（经缓存）"""
+        return self.entity_cache.input_peer(await self._resolve(account_id, client, target))
+    
+    async def _limited(self, account_id, method, func):
+        """经限速器执行一次Telegram调用，FloodWait时按服务器要求等待后重试"""
+        return await self.rate_limiter.call(account_id, method, func)
+    
+    async def _iter_messages(self, account_id, client, entity, limit=None, **kwargs):
+        """限速遍历消息：每页（100条）取一个history令牌，中途遇到FloodWait时等待后从最后一条消息继续"""
+        bucket = self.rate_limiter.bucket(account_id, 'history')
+        count = 0
+        retries = 0
+        while True:
+            try:
+                await bucket.acquire()
+                remaining = None if limit is None else limit - count
+                async for message in client.iter_messages(entity, limit=remaining, **kwargs):
+                    count += 1
+                    kwargs['offset_id'] = message.id
+                    yield message
+                    if count % 100 == 0:
+                        bucket.on_success()
+                        retries = 0
+                        await bucket.acquire()
+                bucket.on_success()
+                return
+            except FloodWaitError as e:
+                bucket.on_flood_wait(e.seconds)
+                retries += 1
+                if e.seconds > Config.TELEGRAM_FLOOD_WAIT_MAX or retries > Config.TELEGRAM_FLOOD_RETRIES:
+                    raise
+                print(f"[限速] 账号{account_id} history 触发FloodWait，等待 {e.seconds} 秒后继续")
+    
+    @staticmethod
+    def _message_to_dict(message, sender):
+        """把Telethon消息转换为入库格式"""
+        msg_data = {
+            'telegram_message_id': message.id,
+            'sender_id': message.sender_id,
+            'sender_name': '',
+            'content': message.text or '',
+            'media_type': 'text',
+            'message_date': message.date
+        }
+        
+        # 获取发送者名称
+        if isinstance(sender, User):
+            msg_data['sender_name'] = sender.first_name or ''
+            if sender.last_name:
+                msg_data['sender_name'] += ' ' + sender.last_name
+        
+        # 检测媒体类型
+        if message.media:
+            if message.photo:
+                msg_data['media_type'] = 'photo'
+            elif message.video:
+                msg_data['media_type'] = 'video'
+            elif message.document:
+                msg_data['media_type'] = 'document'
+            elif message.audio:
+                msg_data['media_type'] = 'audio'
+            else:
+                msg_data['media_type'] = 'other'
+        
+        return msg_data
+    
+    def _route_update(self, account_id, event):
+        """根据消息所在会话查找订阅该群组的各任务回调（O(1)），未订阅时返回None"""
+        subscriptions = self.listeners.get(account_id)
+        if not subscriptions:
+            return None
+        return subscriptions.get(get_peer_id(event.message.peer_id, add_mark=False))
+    
+    def _ensure_dispatcher(self, account_id, client):
+        """每个客户端只注册一个 NewMessage 处理器，按会话ID分发到各群组的回调"""
+        registered = self._dispatchers.get(account_id)
+        if registered and registered[0] is client:
+            return
+        
+        async def dispatcher(event):
+            callbacks = self._route_update(account_id, event)
+            if not callbacks:
+                return
+            sender = await event.get_sender()
+            msg = self._message_to_dict(event.message, sender)
+            # 同一群组可能被多个任务监听，逐个分发（一个任务的回调出错不影响其他任务）
+            for task_id, callback in list(callbacks.items()):
+                try:
+                    await callback(dict(msg))
+                except Exception as e:
+                    print(f"[监听] 任务{task_id}处理消息失败: {str(e)}")
+        
+        client.add_event_handler(dispatcher, events.NewMessage())
+        self._dispatchers[account_id] = (client, dispatcher)
+    
+    @account_bound
+    async def start_listener(self, group_id, callback, account_id=None, task_id=None):
+        """启动实时监听（按任务订阅群组，多个任务可同时监听同一群组；同一任务重复订阅时替换回调）"""
         try:
             client = await self.get_client(account_id)
             if not client:
                 raise Exception("客户端未初始化")
             
-            @client.on(events.NewMessage(chats=group_id))
-            async def handler(event):
-                msg_data = {
-                    'telegram_message_id': event.message.id,
-                    'sender_id': event.sender_id,
-                    'sender_name': '',
-                    'content': event.message.text or '',
-                    'media_type': 'text',
-                    'message_date': event.message.date
-                }
-                
-                # 获取发送者名称
-                sender = await event.get_sender()
-                if isinstance(sender, User):
-                    msg_data['sender_name'] = sender.first_name or ''
-                    if sender.last_name:
-                        msg_data['sender_name'] += ' ' + sender.last_name
-                
-                # 检测媒体类型
-                if event.message.media:
-                    if event.message.photo:
-                        msg_data['media_type'] = 'photo'
-                    elif event.message.video:
-                        msg_data['media_type'] = 'video'
-                    elif event.message.document:
-                        msg_data['media_type'] = 'document'
-                    elif event.message.audio:
-                        msg_data['media_type'] = 'audio'
-                    else:
-                        msg_data['media_type'] = 'other'
-                
-                # 调用回调函数
-                await callback(msg_data)
-            
-            # 保存监听器
-            if account_id not in self.listeners:
-                self.listeners[account_id] = {}
-            self.listeners[account_id][group_id] = handler
+            self._ensure_dispatcher(account_id, client)
             
+            # 保存订阅
+            subscriptions = self.listeners.setdefault(account_id, {})
+            subscriptions.setdefault(group_id, {})[task_id] = callback
+        
         except Exception as e:
             raise Exception(f"启动监听失败: {str(e)}")
     
-    async def stop_listener(self, group_id, account_id=None):
-        """停止监听"""
-        if account_id and account_id in self.listeners:
-            if group_id in self.listeners[account_id]:
-                client = await self.get_client(account_id)
-                if client:
-                    client.remove_event_handler(self.listeners[account_id][group_id])
-                del self.listeners[account_id][group_id]
+    @account_bound
+    async def stop_listener(self, group_id, account_id=None, task_id=None):
+        """停止监听（只取消该任务的订阅，没有任务订阅的群组随之移除）"""
+        subscriptions = self.listeners.get(account_id)
+        if not subscriptions or group_id not in subscriptions:
+            return
+        subscriptions[group_id].pop(task_id, None)
+        if not subscriptions[group_id]:
+            del subscriptions[group_id]
     
+    @account_bound
     async def run_until_disconnected(self, account_id=None):
         """保持客户端运行"""
         client = await self.get_client(account_id)
@@ -173,7 +173,8 @@ function renderMessages(messages) {
     }
     
     messages.forEach(msg => {
-        const content = msg.content ? truncate(msg.content, 50) : '-';
+        // 关键词搜索时显示带高亮的摘要
+        const content = msg.snippet || (msg.content ? truncate(msg.content, 50) : '-');
         const mediaType = getMediaTypeBadge(msg.media_type);
         
         const row = `
@@ -331,7 +332,7 @@ function renderCharts() {
 function exportData(type, format) {
     const keyword = type === 'groups' ? $('#groupSearch').val() : $('#messageSearch').val();
     
-    let url = `/api/data/export?type=${type}&format=${format}`;
+    let url = `/api/data/export?type=${type}&format=${format}&gzip=1`;
     if (keyword) url += `&keyword=${encodeURIComponent(keyword)}`;
     
     if (type === 'messages') {
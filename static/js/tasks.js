@@ -229,6 +229,7 @@ function saveTask() {
         name: $('#taskName').val(),
         account_id: parseInt(accountId),
         task_type: taskType,
+        multi_account: $('#multiAccount').is(':checked'),
         api_config: null
     };
     
@@ -236,6 +237,7 @@ function saveTask() {
     if (taskType === 'bot_search') {
         // 机器人搜索：只搜索群组，不采集消息
         taskData.bot_username = $('#botUsername').val();
+        taskData.bot_concurrency = parseInt($('#botConcurrency').val()) || 1;
         taskData.search_keywords = $('#searchKeywords').val().split('\n').filter(k => k.trim());
         taskData.target_groups = null;
         taskData.group_regex = $('#groupRegex').val() || null;
@@ -266,6 +268,25 @@ function saveTask() {
             param_mapping: {}
         };
         
+        // 批量推送
+        const batchSize = parseInt($('#apiBatchSize').val()) || 1;
+        if (batchSize > 1) {
+            taskData.api_config.batch_size = batchSize;
+            taskData.api_config.linger_ms = parseInt($('#apiLingerMs').val()) || 0;
+            taskData.api_config.batch_format = $('#apiBatchFormat').val();
+        }
+        
+        // 请求体格式和压缩
+        if ($('#apiEncoding').val() !== 'json') {
+            taskData.api_config.encoding = $('#apiEncoding').val();
+        }
+        if ($('#apiCompression').val()) {
+            taskData.api_config.compression = $('#apiCompression').val();
+        }
+        if ($('#apiNestedTargets').is(':checked')) {
+            taskData.api_config.nested_targets = true;
+        }
+        
         // 解析参数映射
         const paramMapping = $('#apiParamMapping').val();
         if (paramMapping) {
@@ -394,6 +415,7 @@ function editTask(taskId) {
             setTimeout(() => {
                 $('#accountId').val(task.account_id);
             }, 500);
+            $('#multiAccount').prop('checked', !!task.multi_account);
             
             // 设置任务类型
             $('#taskType').val(task.task_type || 'bot_search').trigger('change');
@@ -401,6 +423,7 @@ function editTask(taskId) {
             // 根据任务类型设置不同的字段
             if (task.task_type === 'bot_search') {
                 $('#botUsername').val(task.bot_username || '');
+                $('#botConcurrency').val(task.bot_concurrency || 1);
                 $('#groupRegex').val(task.group_regex || '');
                 
                 // 处理搜索关键词（JSON数组转换为多行文本）
@@ -451,10 +474,22 @@ function editTask(taskId) {
                 $('#apiUrl').val(task.api_config.url || '');
                 $('#apiMethod').val(task.api_config.method || 'POST');
                 $('#apiParamMapping').val(JSON.stringify(task.api_config.param_mapping || {}, null, 2));
+                $('#apiBatchSize').val(task.api_config.batch_size || 1);
+                $('#apiLingerMs').val(task.api_config.linger_ms != null ? task.api_config.linger_ms : 200);
+                $('#apiBatchFormat').val(task.api_config.batch_format || 'array');
+                $('#apiEncoding').val(task.api_config.encoding || 'json');
+                $('#apiCompression').val(task.api_config.compression || '');
+                $('#apiNestedTargets').prop('checked', !!task.api_config.nested_targets);
             } else {
                 $('#apiUrl').val('');
                 $('#apiMethod').val('POST');
                 $('#apiParamMapping').val('');
+                $('#apiBatchSize').val(1);
+                $('#apiLingerMs').val(200);
+                $('#apiBatchFormat').val('array');
+                $('#apiEncoding').val('json');
+                $('#apiCompression').val('');
+                $('#apiNestedTargets').prop('checked', false);
             }
             
             $('#taskModal').modal('show');